@@ -0,0 +1,123 @@
+-- Indexes on foreign key columns and commonly filtered columns. SQLite doesn't
+-- index foreign keys automatically, so without these every lookup of a
+-- person's (or event's, etc.) associated records is a full table scan.
+--
+-- Foreign keys that are already the leading column of a unique constraint
+-- don't need their own index, since the constraint's automatic index covers
+-- them:
+--   people_aliases.person_id (unique(person_id, alias))
+--   people_email_addresses.person_id and primary_email
+--       (unique(person_id, primary_email))
+--   people_other_contact_info.other_contact_info_type_id
+--       (unique(other_contact_info_type_id, contact_info))
+--   event_types_default_door_fees.event_type_id
+--       (unique(event_type_id, membership_type_id))
+--   events_door_fees.event_id (unique(event_id, membership_type_id))
+--   new_guest_info_sheets_data.info_sheet_id
+--       (unique(info_sheet_id, field_name))
+--   people_incident_reports_involvement.report_id
+--       (unique(report_id, involved_person_id))
+
+
+create index people_phone_numbers_person_id
+on people_phone_numbers (person_id);
+
+create index people_other_contact_info_person_id
+on people_other_contact_info (person_id);
+
+create index membership_type_pricing_options_membership_type_id
+on membership_type_pricing_options (membership_type_id);
+
+create index people_memberships_person_id
+on people_memberships (person_id);
+
+-- Covers the active membership count in Database.get_membership_types()
+create index people_memberships_membership_type_id_dates
+on people_memberships (membership_type_id, begin_date, end_date);
+
+create index event_types_default_door_fees_membership_type_id
+on event_types_default_door_fees (membership_type_id);
+
+create index events_event_type_id
+on events (event_type_id);
+
+create index events_begin_date_time
+on events (begin_date_time);
+
+create index events_door_fees_membership_type_id
+on events_door_fees (membership_type_id);
+
+create index people_payments_person_id
+on people_payments (person_id);
+
+create index people_payments_at_event_id
+on people_payments (at_event_id);
+
+create index payments_items_payment_id
+on payments_items (payment_id);
+
+create index memberships_dues_payments_membership_id
+on memberships_dues_payments (membership_id);
+
+create index memberships_dues_payments_payment_item_id
+on memberships_dues_payments (payment_item_id);
+
+create index events_door_fee_payments_event_id
+on events_door_fee_payments (event_id);
+
+create index events_door_fee_payments_payment_item_id
+on events_door_fee_payments (payment_item_id);
+
+create index people_event_attendance_person_id
+on people_event_attendance (person_id);
+
+create index people_event_attendance_event_id
+on people_event_attendance (event_id);
+
+create index people_event_attendance_guest_of_member_person_id
+on people_event_attendance (guest_of_member_person_id);
+
+create index events_new_guest_info_sheets_event_id
+on events_new_guest_info_sheets (event_id);
+
+create index events_new_guest_info_sheets_person_id
+on events_new_guest_info_sheets (person_id);
+
+create index people_membership_approval_person_id
+on people_membership_approval (person_id);
+
+create index people_event_rsvps_person_id
+on people_event_rsvps (person_id);
+
+create index people_event_rsvps_event_id
+on people_event_rsvps (event_id);
+
+create index people_event_rsvps_guest_of_member_person_id
+on people_event_rsvps (guest_of_member_person_id);
+
+create index people_legal_documents_person_id
+on people_legal_documents (person_id);
+
+create index people_legal_documents_document_type_id
+on people_legal_documents (document_type_id);
+
+create index people_incident_reports_reporter_person_id
+on people_incident_reports (reporter_person_id);
+
+create index people_incident_reports_involvement_involved_person_id
+on people_incident_reports_involvement (involved_person_id);
+
+create index people_warnings_person_id
+on people_warnings (person_id);
+
+create index people_sanctions_person_id
+on people_sanctions (person_id);
+
+create index people_sanctions_dates
+on people_sanctions (begin_date, end_date);
+
+create index people_bans_person_id
+on people_bans (person_id);
+
+create index people_bans_dates
+on people_bans (begin_date, end_date);
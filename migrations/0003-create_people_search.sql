@@ -0,0 +1,314 @@
+-- Full-text search index for finding people by name, alias, email address,
+-- other contact info, or notes. The rowid of each row is the id of the person
+-- that it indexes. Kept up to date by the triggers below.
+create virtual table people_search using fts5(
+    first_name_or_nickname
+    , aliases
+    , email_addresses
+    , other_contact_info
+    , notes
+    , tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- The text to index for each person
+create view people_search_source as
+select p.id as id
+    , p.first_name_or_nickname as first_name_or_nickname
+    , (
+        select group_concat(a.alias, ' ')
+        from people_aliases a
+        where a.person_id = p.id
+    ) as aliases
+    , (
+        select group_concat(e.email_address, ' ')
+        from people_email_addresses e
+        where e.person_id = p.id
+    ) as email_addresses
+    , (
+        select group_concat(o.contact_info, ' ')
+        from people_other_contact_info o
+        where o.person_id = p.id
+    ) as other_contact_info
+    , p.notes as notes
+from people p;
+
+insert into people_search (
+    rowid
+    , first_name_or_nickname
+    , aliases
+    , email_addresses
+    , other_contact_info
+    , notes
+)
+select id
+    , first_name_or_nickname
+    , aliases
+    , email_addresses
+    , other_contact_info
+    , notes
+from people_search_source;
+
+-- Triggers on the people table
+
+create trigger people_search_people_insert
+after insert on people
+begin
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = new.id;
+end;
+
+create trigger people_search_people_update
+after update of id, first_name_or_nickname, notes on people
+begin
+    delete from people_search
+    where rowid in (old.id, new.id);
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id in (old.id, new.id);
+end;
+
+create trigger people_search_people_delete
+after delete on people
+begin
+    delete from people_search
+    where rowid = old.id;
+end;
+
+-- Triggers on the tables of things associated with a person. Any change
+-- re-indexes the whole person, since their aliases (etc.) are indexed
+-- together.
+
+create trigger people_search_aliases_insert
+after insert on people_aliases
+begin
+    delete from people_search
+    where rowid = new.person_id;
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = new.person_id;
+end;
+
+create trigger people_search_aliases_update
+after update of person_id, alias on people_aliases
+begin
+    delete from people_search
+    where rowid in (old.person_id, new.person_id);
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id in (old.person_id, new.person_id);
+end;
+
+create trigger people_search_aliases_delete
+after delete on people_aliases
+begin
+    delete from people_search
+    where rowid = old.person_id;
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = old.person_id;
+end;
+
+create trigger people_search_email_addresses_insert
+after insert on people_email_addresses
+begin
+    delete from people_search
+    where rowid = new.person_id;
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = new.person_id;
+end;
+
+-- Changing which address is primary doesn't affect the index
+create trigger people_search_email_addresses_update
+after update of person_id, email_address on people_email_addresses
+begin
+    delete from people_search
+    where rowid in (old.person_id, new.person_id);
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id in (old.person_id, new.person_id);
+end;
+
+create trigger people_search_email_addresses_delete
+after delete on people_email_addresses
+begin
+    delete from people_search
+    where rowid = old.person_id;
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = old.person_id;
+end;
+
+create trigger people_search_other_contact_info_insert
+after insert on people_other_contact_info
+begin
+    delete from people_search
+    where rowid = new.person_id;
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = new.person_id;
+end;
+
+create trigger people_search_other_contact_info_update
+after update of person_id, contact_info on people_other_contact_info
+begin
+    delete from people_search
+    where rowid in (old.person_id, new.person_id);
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id in (old.person_id, new.person_id);
+end;
+
+create trigger people_search_other_contact_info_delete
+after delete on people_other_contact_info
+begin
+    delete from people_search
+    where rowid = old.person_id;
+    insert into people_search (
+        rowid
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    )
+    select id
+        , first_name_or_nickname
+        , aliases
+        , email_addresses
+        , other_contact_info
+        , notes
+    from people_search_source
+    where id = old.person_id;
+end;
@@ -0,0 +1,565 @@
+"""
+Benchmark suite for the Database class. Generates small, medium, and large
+synthetic datasets, calls every public Database method against each of them
+over and over, and reports throughput and latency percentiles. Results can be
+saved as JSON and compared against a saved baseline, so that changes which
+make queries slower are caught. Doesn't need Qt.
+
+Run from the base project directory with:
+
+    python -m rksmanager.benchmarks [--sizes small medium large]
+        [--output results.json] [--baseline benchmarks/baseline.json]
+
+benchmarks/baseline.json holds reference results for the default seed and
+end date. Timings depend on the machine, so a baseline is most useful when it
+was made on the same machine, such as by running with --output on the commit
+being compared against.
+
+"""
+import sys
+import re
+import json
+import time
+import shutil
+import pathlib
+import platform
+import argparse
+import datetime
+import itertools
+import random
+import sqlite3
+import tempfile
+from decimal import Decimal
+
+from .database import Database
+from .generator import DatasetGenerator
+
+# Dataset sizes, as numbers of people and events
+DATASETS = {
+    "small": (1000, 100),
+    "medium": (10000, 1000),
+    "large": (100000, 5000),
+}
+# Default end date of the generated datasets. Fixed rather than today, so
+# that the same seed always generates the same data, and results from
+# different days can be compared.
+END_DATE = datetime.date(2026, 10, 16)
+
+# Public methods that don't touch the database, or that can't be called
+# repeatedly
+IGNORED_METHODS = {
+    "close",
+    "apply_migrations",
+    "set_trace_callback",
+    "pop_changes",
+    "invalidate_caches",
+    "get_sql_cache_stats",
+    "get_lookup_cache_stats",
+    "enable_instrumentation",
+    "disable_instrumentation",
+    "stats",
+}
+
+
+def _person_id(c):
+    return c["random"].randint(1, c["people"])
+
+
+def _event_id(c):
+    return c["random"].randint(1, c["events"])
+
+
+def _person(c):
+    number = next(c["counter"])
+    name = "Bench{}".format(number)
+    return {
+        "first_name_or_nickname": name,
+        "pronouns": "they/them",
+        "notes": None,
+        "aliases": [name + "_alias"],
+        "email_addresses": [name.lower() + "@example.com"],
+        "other_contact_info": [(c["contact_info_type_ids"][0],
+                                name.lower())],
+    }
+
+
+def _event(c):
+    begin = datetime.datetime(2020, 1, 1, 19, 0) + datetime.timedelta(
+        days=c["random"].randint(0, 3650),
+    )
+    return {
+        "name": "Benchmark Event",
+        "event_type_id": c["random"].choice(c["event_type_ids"]),
+        "begin_date_time": begin,
+        "end_date_time": begin + datetime.timedelta(hours=2),
+        "nonmember_door_fee": None,
+    }
+
+
+def _door_transaction(c):
+    membership = c["membership"]
+    new_end_date = datetime.date(2100, 1, 1) + datetime.timedelta(
+        days=next(c["counter"]),
+    )
+    return (_event_id(c), membership["person_id"], Decimal("10.00"),
+            [{"membership_id": membership["id"],
+              "amount": Decimal("20.00"),
+              "new_end_date": new_end_date}])
+
+
+# Arguments for a door transaction for a person whose attendance has already
+# been recorded, such as at another station
+def _checked_in_door_transaction(c):
+    args = _door_transaction(c)
+    c["db"].record_attendance(args[0], args[1])
+    return args
+
+
+def _search_query(c):
+    return (c["random"].choice(("al", "sam", "raven", "jessica gmail",
+                                "fox", "michael9", "fetlife rope")),)
+
+
+# Benchmarks to run, in order, as (name, method, get_args) tuples. get_args is
+# a function that takes a context dictionary (see _make_context()) and returns
+# the arguments to call the method with. It's called before every call, so
+# that different rows are used each time. Writes come last, so that they
+# don't change the data that the reads are measured against.
+BENCHMARKS = (
+    ("get_person", "get_person", lambda c: (_person_id(c),)),
+    ("get_people_details[100]", "get_people_details",
+     lambda c: ([_person_id(c) for _ in range(100)],)),
+    ("get_active_restrictions", "get_active_restrictions", lambda c: ()),
+    ("get_restrictions[all]", "get_restrictions", lambda c: ()),
+    ("get_restrictions[changed]", "get_restrictions",
+     lambda c: ([1], [])),
+    ("get_people[all]", "get_people", lambda c: ()),
+    ("get_people[page]", "get_people",
+     lambda c: ("first_name_or_nickname", False, None, 100)),
+    ("search_people", "search_people", _search_query),
+    ("get_people_search_terms[all]", "get_people_search_terms",
+     lambda c: ()),
+    ("get_people_search_terms[100]", "get_people_search_terms",
+     lambda c: ([_person_id(c) for _ in range(100)],)),
+    ("get_other_contact_info_types", "get_other_contact_info_types",
+     lambda c: ()),
+    ("get_other_contact_info_types_usage",
+     "get_other_contact_info_types_usage", lambda c: ()),
+    ("count_email_addresses", "count_email_addresses", lambda c: ()),
+    ("count_phone_numbers", "count_phone_numbers", lambda c: ()),
+    ("get_membership_types", "get_membership_types", lambda c: ()),
+    ("get_membership_type", "get_membership_type",
+     lambda c: (c["random"].choice(c["membership_type_ids"]),)),
+    ("get_membership_type_pricing_options",
+     "get_membership_type_pricing_options",
+     lambda c: (c["random"].choice(c["membership_type_ids"]),)),
+    ("get_membership_type_pricing_option",
+     "get_membership_type_pricing_option",
+     lambda c: (c["random"].choice(c["pricing_option_ids"]),)),
+    ("get_event_types", "get_event_types", lambda c: ()),
+    ("get_event_type", "get_event_type",
+     lambda c: (c["random"].choice(c["event_type_ids"]),)),
+    ("get_events[all]", "get_events", lambda c: ()),
+    ("get_events[page]", "get_events",
+     lambda c: ("begin_date_time", True, None, 100)),
+    ("get_event", "get_event", lambda c: (_event_id(c),)),
+    ("get_event_attendance", "get_event_attendance",
+     lambda c: (_event_id(c),)),
+    ("get_event_door_fees", "get_event_door_fees",
+     lambda c: (_event_id(c),)),
+    ("get_person_memberships", "get_person_memberships",
+     lambda c: (_person_id(c),)),
+    ("get_sqlite_user_version", "get_sqlite_user_version", lambda c: ()),
+    ("get_sqlite_schema_version", "get_sqlite_schema_version",
+     lambda c: ()),
+    ("poll_external_changes", "poll_external_changes", lambda c: ()),
+    ("checkpoint", "checkpoint", lambda c: ()),
+    ("save_person[insert]", "save_person", lambda c: (_person(c),)),
+    ("save_person[update]", "save_person",
+     lambda c: (_person(c), _person_id(c))),
+    ("save_people[100]", "save_people",
+     lambda c: ([_person(c) for _ in range(100)],)),
+    ("bulk_insert[1000]", "bulk_insert",
+     lambda c: ([("people_warnings",
+                  [{"person_id": _person_id(c),
+                    "warning_date": datetime.date(2020, 1, 1),
+                    "notes": None} for _ in range(1000)])],)),
+    ("create_other_contact_info_type", "create_other_contact_info_type",
+     lambda c: ("Benchmark {}".format(next(c["counter"])),)),
+    ("create_membership_type", "create_membership_type",
+     lambda c: ("Benchmark {}".format(next(c["counter"])),)),
+    ("save_membership_type_pricing_option",
+     "save_membership_type_pricing_option",
+     lambda c: ({"length_months": 1, "price": Decimal("15.00")},
+                c["pricing_option_ids"][0])),
+    ("save_event_type", "save_event_type",
+     lambda c: (dict(c["event_type"]), c["event_type"]["id"])),
+    ("save_event[insert]", "save_event", lambda c: (_event(c),)),
+    ("save_event[update]", "save_event",
+     lambda c: (_event(c), _event_id(c))),
+    ("record_attendance", "record_attendance",
+     lambda c: (_event_id(c), _person_id(c))),
+    ("remove_attendance", "remove_attendance",
+     lambda c: (_event_id(c), _person_id(c))),
+    ("record_door_transaction", "record_door_transaction", _door_transaction),
+    ("remove_door_transaction", "remove_door_transaction",
+     lambda c: (c["db"].record_door_transaction(*_door_transaction(c)),)),
+    ("record_door_transaction[checked in]", "record_door_transaction",
+     _checked_in_door_transaction),
+    ("remove_door_transaction[checked in]", "remove_door_transaction",
+     lambda c: (c["db"].record_door_transaction(
+         *_checked_in_door_transaction(c)
+     ),)),
+)
+
+
+# Gather the IDs and other values that the benchmarks' get_args functions
+# need.
+#
+# Args:
+#   db: The Database object being benchmarked.
+#   people: Number of people in the dataset.
+#   events: Number of events in the dataset.
+#   seed: Seed for the random number generator.
+#
+# Returns:
+#   The context dictionary.
+def _make_context(db, people, events, seed):
+    membership_type_ids = [row["id"] for row in db.get_membership_types()]
+    pricing_option_ids = [
+        row["id"]
+        for membership_type_id in membership_type_ids
+        for row in db.get_membership_type_pricing_options(membership_type_id)
+    ]
+    event_types = db.get_event_types()
+    membership = next({"id": row["id"], "person_id": person_id}
+                      for person_id in range(1, people + 1)
+                      for row in db.get_person_memberships(person_id)
+                      if row["end_date"] is not None)
+    return {
+        # For get_args functions that need to write something for the
+        # benchmarked method to work on, which isn't counted in its time
+        "db": db,
+        "people": people,
+        "events": events,
+        "random": random.Random(seed),
+        "counter": itertools.count(),
+        "contact_info_type_ids": [
+            row["id"] for row in db.get_other_contact_info_types()
+        ],
+        "membership_type_ids": membership_type_ids,
+        "pricing_option_ids": pricing_option_ids,
+        "event_type_ids": [row["id"] for row in event_types],
+        # Saved over itself by the save_event_type benchmark
+        "event_type": dict(event_types[0]),
+        # A membership that expires, which the record_door_transaction
+        # benchmarks pay dues on
+        "membership": membership,
+    }
+
+
+# Get a percentile of a sorted list of samples, using the nearest-rank
+# method.
+def _percentile(samples, percent):
+    rank = max(int(len(samples) * percent / 100 + 0.5), 1)
+    return samples[min(rank, len(samples)) - 1]
+
+
+def run_benchmark(db, context, method, get_args, min_time=1.0, min_calls=5,
+                  max_calls=1000):
+    """
+    Call a Database method over and over and measure how long it takes.
+
+    Args:
+        db: The Database object.
+        context: Context dictionary to pass to get_args.
+        method: Name of the method.
+        get_args: Function that takes the context and returns the arguments
+            for one call.
+        min_time: Optional number of seconds to keep calling the method for,
+            unless max_calls is reached first. Defaults to 1.
+        min_calls: Optional number of calls to make no matter how long they
+            take. Defaults to 5.
+        max_calls: Optional maximum number of calls to make. Defaults to
+            1000.
+
+    Returns:
+        A dictionary in the format returned by summarize_latencies(). The
+        time spent preparing arguments isn't counted.
+
+    """
+    function = getattr(db, method)
+    # Warm up the caches, so that the first call isn't counted
+    function(*get_args(context))
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_calls and (
+            len(latencies) < min_calls
+            or time.perf_counter() - started < min_time):
+        args = get_args(context)
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+
+def summarize_latencies(latencies):
+    """
+    Work out the throughput and latency percentiles of a benchmark.
+
+    Args:
+        latencies: List of the number of seconds that each call took.
+
+    Returns:
+        A dictionary with the following keys:
+            calls: Number of calls made.
+            ops_per_second: Calls per second.
+            mean_ms, p50_ms, p95_ms, p99_ms, max_ms: Latencies in
+                milliseconds.
+
+    """
+    total = sum(latencies)
+    latencies = sorted(latencies)
+    return {
+        "calls": len(latencies),
+        "ops_per_second": len(latencies) / total,
+        "mean_ms": total / len(latencies) * 1000,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def get_dataset(size, seed, end_date, data_dir):
+    """
+    Get a database file containing a generated dataset, generating it if it
+    doesn't exist yet.
+
+    Args:
+        size: Name of the dataset size. See DATASETS.
+        seed: Seed for the generator.
+        end_date: End date for the generator.
+        data_dir: Directory to keep the generated database files in.
+
+    Returns:
+        The pathlib.Path of the database file. Must not be modified, so that
+        it can be reused.
+
+    """
+    people, events = DATASETS[size]
+    path = pathlib.Path(data_dir) / "benchmark-{}-{}-{}.rksm".format(
+        size, seed, end_date.isoformat(),
+    )
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".tmp")
+        db = Database(str(temp_path))
+        try:
+            DatasetGenerator(db, people=people, events=events, seed=seed,
+                             end_date=end_date).generate()
+        finally:
+            db.close()
+        temp_path.rename(path)
+    return path
+
+
+def run_benchmarks(sizes, seed=0, end_date=END_DATE, data_dir=None,
+                   pattern=None, min_time=1.0, report=print):
+    """
+    Run the benchmarks against each dataset size. Each size gets a fresh copy
+    of its dataset, since the write benchmarks change it.
+
+    Args:
+        sizes: Sequence of dataset size names. See DATASETS.
+        seed: Optional seed for the generator and the benchmarks' random
+            arguments. Defaults to 0.
+        end_date: Optional end date for the generator. Defaults to
+            END_DATE.
+        data_dir: Optional directory to keep generated datasets in, so that
+            they don't have to be generated again next time. If unspecified,
+            they're generated in a temporary directory and thrown away.
+        pattern: Optional regular expression. Only benchmarks with names
+            that it matches are run.
+        min_time: Optional number of seconds to spend on each benchmark.
+            Defaults to 1.
+        report: Optional function to call with a line of text as each
+            benchmark finishes. Defaults to print.
+
+    Returns:
+        A dictionary mapping size names to dictionaries mapping benchmark
+        names to the results returned by run_benchmark().
+
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            dataset = get_dataset(size, seed, end_date, data_dir or temp_dir)
+            copy = pathlib.Path(temp_dir) / "benchmark.rksm"
+            shutil.copyfile(dataset, copy)
+            people, events = DATASETS[size]
+            db = Database(str(copy))
+            try:
+                context = _make_context(db, people, events, seed)
+                results[size] = {}
+                for name, method, get_args in BENCHMARKS:
+                    if pattern and not re.search(pattern, name):
+                        continue
+                    result = run_benchmark(db, context, method, get_args,
+                                           min_time=min_time)
+                    results[size][name] = result
+                    report(format_result(size, name, result))
+            finally:
+                db.close()
+            copy.unlink()
+    return results
+
+
+def format_result(size, name, result):
+    """
+    Describe the result of a benchmark in one line.
+
+    Args:
+        size: Name of the dataset size.
+        name: Name of the benchmark.
+        result: Dictionary returned by summarize_latencies().
+
+    Returns:
+        The description as a string.
+
+    """
+    return ("{:<6} {:<40} {:>10.1f}/s  p50 {:>9.3f} ms  p95 {:>9.3f} ms  "
+            "p99 {:>9.3f} ms".format(size, name, result["ops_per_second"],
+                                     result["p50_ms"], result["p95_ms"],
+                                     result["p99_ms"]))
+
+
+def get_uncovered_methods():
+    """
+    Get the public Database methods that aren't benchmarked or ignored.
+
+    Returns:
+        A sorted list of method names.
+
+    """
+    public_methods = {name for name in dir(Database)
+                      if not name.startswith("_")
+                      and callable(getattr(Database, name))}
+    benchmarked = {method for _, method, _ in BENCHMARKS}
+    return sorted(public_methods - benchmarked - IGNORED_METHODS)
+
+
+def compare_results(results, baseline, threshold=0.25, min_difference_ms=0.05):
+    """
+    Compare benchmark results against a baseline, by median latency.
+
+    Args:
+        results: Results in the format returned by run_benchmarks().
+        baseline: Earlier results in the same format. Benchmarks that aren't
+            in both are skipped.
+        threshold: Optional fraction that a benchmark's median latency has to
+            go up by to count as a regression. Defaults to 0.25.
+        min_difference_ms: Optional number of milliseconds that the median
+            latency has to go up by to count as a regression, so that noise
+            in very fast benchmarks is ignored. Defaults to 0.05.
+
+    Returns:
+        A list of regression descriptions as strings. An empty list means
+        that nothing got slower.
+
+    """
+    regressions = []
+    for size, size_results in results.items():
+        for name, result in size_results.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            old_ms = old["p50_ms"]
+            new_ms = result["p50_ms"]
+            if (new_ms > old_ms * (1 + threshold)
+                    and new_ms - old_ms >= min_difference_ms):
+                regressions.append(
+                    "{} {}: median {:.3f} ms -> {:.3f} ms ({:+.0%})".format(
+                        size, name, old_ms, new_ms, new_ms / old_ms - 1,
+                    )
+                )
+    return regressions
+
+
+def main(argv=None):
+    """
+    Run the benchmarks, print the results, and optionally save them and
+    compare them against a baseline.
+
+    Args:
+        argv: Optional list of command line arguments. Defaults to
+            sys.argv[1:].
+
+    Returns:
+        The exit status as an integer. 1 if any benchmarks regressed or any
+        methods aren't covered.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m rksmanager.benchmarks",
+        description="Benchmark the Database class.",
+    )
+    parser.add_argument("--sizes", nargs="+", choices=DATASETS,
+                        default=list(DATASETS),
+                        help="dataset sizes to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default: %(default)s)")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat,
+                        default=END_DATE,
+                        help="end date of the generated data, as YYYY-MM-DD"
+                             " (default: %(default)s)")
+    parser.add_argument("--data-dir",
+                        help="directory to keep generated datasets in")
+    parser.add_argument("--match", metavar="REGEX",
+                        help="only run benchmarks whose names match")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="seconds to spend on each benchmark"
+                             " (default: %(default)s)")
+    parser.add_argument("--output", help="file to save the results to")
+    parser.add_argument("--baseline",
+                        help="file of earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fraction that median latency has to go up by"
+                             " to count as a regression"
+                             " (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    problems = ["{}: not covered by the benchmarks".format(name)
+                for name in get_uncovered_methods()]
+    results = run_benchmarks(sizes=args.sizes,
+                             seed=args.seed,
+                             end_date=args.end_date,
+                             data_dir=args.data_dir,
+                             pattern=args.match,
+                             min_time=args.min_time)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "created": datetime.datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "seed": args.seed,
+                "end_date": args.end_date.isoformat(),
+                "results": results,
+            }, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            problems += compare_results(results,
+                                        json.load(baseline)["results"],
+                                        threshold=args.threshold)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print("{} problem(s) found.".format(len(problems)))
+        return 1
+    print("No regressions found.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
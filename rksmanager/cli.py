@@ -0,0 +1,176 @@
+"""
+Command line interface for working with database files without starting the
+GUI. Doesn't import Qt, so it starts quickly and works on machines without
+PySide2 installed.
+
+Run from the base project directory with:
+
+    python -m rksmanager.cli info FILE
+    python -m rksmanager.cli migrate FILE
+    python -m rksmanager.cli search FILE QUERY [--limit N]
+    python -m rksmanager.cli checkpoint FILE [--mode MODE]
+
+"""
+import os
+import sys
+import argparse
+
+from .database import Database
+
+
+def info(db, args):
+    """
+    Print the database's version and how it compares to the version this copy
+    of RKS Manager expects.
+
+    Args:
+        db: The Database object.
+        args: The parsed command line arguments.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    version = db.get_sqlite_user_version()
+    expected = db.expected_sqlite_user_version
+    print("Database version: {:d}".format(version))
+    print("Expected version: {:d}".format(expected))
+    if version < expected:
+        print("The database needs to be converted with the migrate command.")
+    elif version > expected:
+        print("The database was created by a newer version of RKS Manager.")
+    return 0
+
+
+def migrate(db, args):
+    """
+    Convert the database to the current version, if it's older.
+
+    Args:
+        db: The Database object.
+        args: The parsed command line arguments.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    version = db.get_sqlite_user_version()
+    expected = db.expected_sqlite_user_version
+    if version > expected:
+        print("The database was created by a newer version of RKS Manager.")
+        return 1
+    if version == expected:
+        print("The database is already at version {:d}.".format(version))
+        return 0
+    db.apply_migrations()
+    print("Converted the database from version {:d} to version {:d}."
+          .format(version, db.get_sqlite_user_version()))
+    return 0
+
+
+def search(db, args):
+    """
+    Search for people and print the matches, best matches first.
+
+    Args:
+        db: The Database object.
+        args: The parsed command line arguments.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    people = db.search_people(args.query, limit=args.limit)
+    for person in people:
+        print("{:>8}  {}  {}".format(person["id"],
+                                     person["first_name_or_nickname"],
+                                     person["email_address"] or ""))
+    if not people:
+        print("No matches.")
+    return 0
+
+
+def checkpoint(db, args):
+    """
+    Copy the changes in the database's write-ahead log back into the database
+    file.
+
+    Args:
+        db: The Database object.
+        args: The parsed command line arguments.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    busy, log, checkpointed = db.checkpoint(args.mode)
+    print("Copied {:d} of {:d} pages from the write-ahead log."
+          .format(checkpointed, log))
+    return 1 if busy else 0
+
+
+def main(argv=None):
+    """
+    Run the command given on the command line.
+
+    Args:
+        argv: Optional list of command line arguments. Defaults to
+            sys.argv[1:].
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m rksmanager.cli",
+        description="Work with RKS Manager database files.",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    # Convenience function for adding commands.
+    #
+    # Args:
+    #   function: Function that runs the command.
+    #   help: Description of the command.
+    #
+    # Returns:
+    #   The command's argument parser.
+    def add_command(function, help):
+        command = commands.add_parser(function.__name__, help=help)
+        command.add_argument("filename", help="database file")
+        command.set_defaults(function=function)
+        return command
+
+    add_command(info, "show the database's version")
+    add_command(migrate, "convert the database to the current version")
+    command = add_command(search, "search for people")
+    command.add_argument("query", help="words to search for")
+    command.add_argument("--limit", type=int, default=100,
+                         help="maximum number of matches to show"
+                              " (default: %(default)s)")
+    command = add_command(checkpoint,
+                          "copy the write-ahead log into the database file")
+    command.add_argument("--mode", default="truncate",
+                         choices=("passive", "full", "restart", "truncate"),
+                         help="SQLite checkpoint mode (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    # Opening a file that doesn't exist would create a new database, which
+    # none of the commands are meant to do
+    if not os.path.isfile(args.filename):
+        print("No such file: {}".format(args.filename))
+        return 1
+    try:
+        db = Database(args.filename)
+    except Exception as e:
+        print(e)
+        return 1
+    try:
+        return args.function(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,16 +9,34 @@ import datetime
 import pathlib
 import re
 import itertools
+import json
+import threading
+import contextlib
+
+from .instrumentation import Instrumentation
 
 
 class Database:
-    """Passes data to and from the database."""
+    """
+    Passes data to and from the database. Queries on small lookup tables, such
+    as event types and membership types, are cached until the tables are
+    changed.
+
+    """
     sqlite_application_id = 0x4ab3c62d
-    expected_sqlite_user_version = 1
+    expected_sqlite_user_version = 3
+    # Size of the connection's prepared statement cache. Needs to be big enough
+    # to hold all of our static queries plus every dynamic query in the SQL
+    # cache, so that none of them get prepared more than once.
+    cached_statements = 256
+    # Maximum number of idle read-only connections to keep open. More can be
+    # opened if more threads read at once, but they're closed when they're done
+    # rather than being kept around.
+    reader_pool_size = 4
 
     def __init__(self, db_filename):
         """
-        Set up the database connection.
+        Set up the database connections.
 
         Args:
             db_filename: Name of the sqlite3 database file to open. Will be
@@ -52,12 +70,50 @@ class Database:
         sqlite3.register_adapter(datetime.time, str)
         sqlite3.register_converter("timeofday_text", convert_timeofday)
 
-        connection = sqlite3.connect(
-            db_filename,
-            detect_types=sqlite3.PARSE_DECLTYPES,
-        )
+        # Text of the dynamic SQL statements we've built so far. See
+        # _get_sql().
+        self._sql_cache = {}
+        self._sql_cache_stats = {"hits": 0, "misses": 0,
+                                 "estimated_statement_reuses": 0}
+        # Snapshot of the table and column names in the database, used to
+        # check the names passed to dynamic queries. Loaded when first needed.
+        self._schema = None
+        # Idle read-only connections. See _reader().
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        if db_filename in ("", ":memory:"):
+            # Private databases can't be opened a second time by the
+            # read-only connections, so use a named in-memory database that
+            # all of our connections share instead
+            db_filename = ("file:rksmanager-{:d}?mode=memory&cache=shared"
+                           .format(next(_memory_database_numbers)))
+            self._reader_uri = db_filename
+            self._shared_cache = True
+        else:
+            # The filename is never treated as a URI, and as_uri()
+            # percent-encodes any characters that would be special in one
+            self._reader_uri = (pathlib.Path(db_filename).resolve().as_uri()
+                                + "?mode=ro")
+            self._shared_cache = False
+        self._trace_callback = None
+        # All writes go through the single writer connection, which may be used
+        # by more than one thread. See _writer().
+        self._write_lock = threading.RLock()
+        # Tables and row IDs changed by committed and uncommitted write
+        # transactions. See _record_change() and pop_changes().
+        self._changes = {}
+        self._uncommitted_changes = {}
+        # Results of queries on small lookup tables. See _get_cached().
+        self._lookup_cache = {}
+        self._lookup_cache_stats = {"hits": 0, "misses": 0}
+        # Incremented whenever cached results are invalidated
+        self._lookup_cache_generation = 0
+        self._lookup_cache_lock = threading.Lock()
+        # See enable_instrumentation()
+        self._instrumentation = None
+
+        connection = self._connect(db_filename, uri=self._shared_cache)
         self._connection = connection
-        connection.row_factory = Row
         # Enable foreign key enforcement
         connection.execute("pragma foreign_keys = on;")
 
@@ -74,14 +130,277 @@ class Database:
             self.close()
             raise Exception("Not an RKS Manager database")
 
+        # Reason that the database can't be queried yet, if it needs to be
+        # converted. See _check_version().
+        self._version_error = None
+        self._check_version()
+        # See poll_external_changes()
+        self._data_version = self._get_data_version()
+
+    # Check whether the database is at the version that our queries are
+    # written for. Databases that need to be converted are left as they are
+    # until apply_migrations() is called, and in the meantime _reader() and
+    # _writer() refuse to run queries on them, rather than letting them fail
+    # with confusing errors such as missing tables. Databases that are
+    # current are switched to write-ahead logging.
+    def _check_version(self):
+        version = self.get_sqlite_user_version()
+        expected_version = self.expected_sqlite_user_version
+        if version < expected_version:
+            self._version_error = (
+                "The database is at version {:d} and needs to be converted"
+                " to version {:d} with apply_migrations() before it can be"
+                " used.".format(version, expected_version)
+            )
+        elif version > expected_version:
+            self._version_error = (
+                "The database is at version {:d}, which was created by a"
+                " newer version of RKS Manager. This version only supports"
+                " up to version {:d}.".format(version, expected_version)
+            )
+        else:
+            self._version_error = None
+            self._enable_write_ahead_log()
+
+    # Switch the database to write-ahead logging, which lets the read-only
+    # connections read while the writer connection is writing, and vice
+    # versa. It's a persistent setting, but it's set every time a current
+    # database is opened so that databases created before we used it get
+    # switched over. That changes the file format, so it isn't done to
+    # databases that the user hasn't agreed to convert. In WAL mode,
+    # synchronous = normal is still safe from corruption, and only risks
+    # losing the most recent transactions if the power goes out.
+    def _enable_write_ahead_log(self):
+        self._connection.execute("pragma journal_mode = wal;")
+        self._connection.execute("pragma synchronous = normal;")
+
+    # Open a connection to the database with our usual settings. Connections
+    # aren't tied to the thread that opened them, since they can be used by
+    # the GUI's background thread. See _reader() and _writer() for how they're
+    # kept from being used by two threads at once.
+    #
+    # Args:
+    #   database: The filename or URI of the database.
+    #   uri: True if the database argument is a URI.
+    #   read_only: True if this is one of the read-only connections.
+    #
+    # Returns:
+    #   The sqlite3 connection object.
+    def _connect(self, database, uri=False, read_only=False):
+        connection = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            uri=uri,
+        )
+        connection.row_factory = Row
+        connection.set_trace_callback(self._trace_callback)
+        if read_only and self._shared_cache:
+            # Shared in-memory databases can't be opened read-only, so make
+            # the reader read-only this way instead. Reading uncommitted
+            # changes keeps its table locks from blocking the writer.
+            connection.execute("pragma query_only = on;")
+            connection.execute("pragma read_uncommitted = on;")
+        return connection
+
+    # Context manager for reading from the database. Borrows one of the
+    # read-only connections (opening a new one if none are idle) and begins a
+    # transaction on it, so that all of the queries run with it see the same
+    # snapshot of the database. Reads don't block writes or other reads.
+    #
+    # Yields:
+    #   The read-only sqlite3 connection object.
+    #
+    # Raises:
+    #   Exception: If the database needs to be converted first.
+    @contextlib.contextmanager
+    def _reader(self):
+        if self._version_error:
+            raise Exception(self._version_error)
+        with self._readers_lock:
+            if self._readers:
+                connection = self._readers.pop()
+            else:
+                connection = None
+        if connection is None:
+            connection = self._connect(self._reader_uri, uri=True,
+                                       read_only=True)
+        try:
+            connection.execute("begin")
+            yield connection
+        finally:
+            # Nothing was written, so this just ends the read transaction
+            connection.rollback()
+            with self._readers_lock:
+                if len(self._readers) < self.reader_pool_size:
+                    self._readers.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+
+    # Context manager for writing to the database. Holds the write lock and
+    # wraps the writer connection in a transaction, which is committed on
+    # success and rolled back if an exception is raised. Changes recorded with
+    # _record_change() during the transaction are kept for pop_changes() if it
+    # commits.
+    #
+    # Yields:
+    #   The writer sqlite3 connection object, which is also available as
+    #   self._connection.
+    #
+    # Raises:
+    #   Exception: If the database needs to be converted first.
+    @contextlib.contextmanager
+    def _writer(self):
+        if self._version_error:
+            raise Exception(self._version_error)
+        with self._write_lock:
+            self._uncommitted_changes = {}
+            try:
+                with self._connection:
+                    yield self._connection
+                merge_changes(self._changes, self._uncommitted_changes)
+                self.invalidate_caches(self._uncommitted_changes)
+            finally:
+                self._uncommitted_changes = {}
+
+    # Note that the current write transaction has changed rows of a table.
+    #
+    # Args:
+    #   table: Name of the table.
+    #   ids: Optional iterable of the IDs of the changed rows. If unspecified,
+    #       any row of the table may have changed.
+    def _record_change(self, table, ids=None):
+        if ids is not None:
+            ids = set(ids)
+        merge_changes(self._uncommitted_changes, {table: ids})
+
+    # Get the writer connection's data_version, which changes whenever
+    # another connection (including ones in other processes, but not this
+    # one) commits a change to the database.
+    #
+    # Returns:
+    #   The data_version as an integer.
+    def _get_data_version(self):
+        return self._connection.execute("pragma data_version;").fetchone()[0]
+
+    def poll_external_changes(self):
+        """
+        Check whether the database has been changed by another program (such
+        as another copy of RKS Manager) since the last time this was called.
+        If it has, cached query results are thrown away. Cheap enough to call
+        every second or so.
+
+        Returns:
+            A dictionary of changes in the format returned by pop_changes().
+            SQLite doesn't tell us what another program changed, so if
+            anything has changed, every table will be included with a value of
+            None. The dictionary is empty if nothing has changed.
+
+        """
+        # Don't wait if we're busy writing. We'll check again next time.
+        if not self._write_lock.acquire(blocking=False):
+            return {}
+        try:
+            data_version = self._get_data_version()
+            if data_version == self._data_version:
+                return {}
+            self._data_version = data_version
+            # The other program might have changed the schema too, or
+            # converted the database
+            self._schema = None
+            self._sql_cache.clear()
+            if self._version_error:
+                self._check_version()
+            schema = self._get_schema()
+        finally:
+            self._write_lock.release()
+        self.invalidate_caches()
+        return {table: None for table in schema}
+
+    def pop_changes(self):
+        """
+        Get the tables and rows that have been changed by this Database object
+        since the last time this was called.
+
+        Returns:
+            A dictionary mapping the names of changed tables to sets of the
+            IDs of the changed rows. A table's value is None if any of its rows
+            may have changed. The dictionary is empty if nothing has changed.
+
+        """
+        with self._write_lock:
+            changes = self._changes
+            self._changes = {}
+        return changes
+
+    def checkpoint(self, mode="passive"):
+        """
+        Copy the changes in the write-ahead log back into the database file.
+        SQLite does this by itself whenever the log gets big enough, but doing
+        it while the program is idle keeps the log small, which keeps reads
+        fast.
+
+        Args:
+            mode: Optional SQLite checkpoint mode. "passive" (the default)
+                copies as much as it can without waiting for readers or
+                writers. "truncate" waits for them, then copies everything
+                and empties the log.
+
+        Returns:
+            A (busy, log, checkpointed) tuple of integers, as returned by
+            SQLite. busy is 1 if the checkpoint couldn't finish, log is the
+            number of pages in the log, and checkpointed is the number of
+            pages copied.
+
+        Raises:
+            ValueError: If mode isn't a valid checkpoint mode.
+
+        """
+        if mode not in ("passive", "full", "restart", "truncate"):
+            raise ValueError("Invalid checkpoint mode: {!r}".format(mode))
+        with self._write_lock:
+            return tuple(self._connection.execute(
+                "pragma wal_checkpoint({});".format(mode)
+            ).fetchone())
+
+    def set_trace_callback(self, callback):
+        """
+        Register a function to be called with the text of every SQL statement
+        executed by any of this object's connections, as with the sqlite3
+        module's Connection.set_trace_callback().
+
+        Args:
+            callback: Function that takes a string, or None to unregister the
+                current one.
+
+        """
+        self._trace_callback = callback
+        with self._readers_lock:
+            for connection in (self._connection, *self._readers):
+                connection.set_trace_callback(callback)
+
     def close(self):
         """
-        Close the database connection. No other methods of this Database object
-        should be called after calling close().
+        Close the database connections. The write-ahead log is checkpointed and
+        emptied first. No other methods of this Database object should be
+        called after calling close(), and none should still be running in
+        other threads.
 
         """
-        self._connection.close()
-        del self._connection
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            del self._readers[:]
+        with self._write_lock:
+            try:
+                self._connection.execute("pragma wal_checkpoint(truncate);")
+            except sqlite3.DatabaseError:
+                # Not our database, or not in WAL mode yet
+                pass
+            self._connection.close()
+            del self._connection
 
     def get_sqlite_user_version(self):
         """
@@ -112,6 +431,18 @@ class Database:
         that haven't been run yet.
 
         """
+        with self._write_lock:
+            self._apply_migrations()
+
+    # Does the work of apply_migrations(). Must be called with the write lock
+    # held.
+    def _apply_migrations(self):
+        expected_version = self.expected_sqlite_user_version
+        current_version = self.get_sqlite_user_version()
+        if current_version >= expected_version:
+            # Nothing to do, so don't bother looking for the scripts
+            return
+
         migration_name_regex = re.compile(r"0*([0-9]+)-.*\.sql")
 
         # rks_manager/rksmanager/database.py
@@ -123,54 +454,68 @@ class Database:
         # rks_manager/migrations/
         migrations_dir = base_project_dir / "migrations"
 
-        expected_version = self.expected_sqlite_user_version
+        # iterdir() doesn't return files in any particular order, so sort the
+        # scripts by version number before running them
+        migration_files = []
+        for migration_file in migrations_dir.iterdir():
+            if not migration_file.is_file():
+                continue
+            match = migration_name_regex.fullmatch(migration_file.name)
+            if not match:
+                continue
+            script_version = int(match.group(1))
+            migration_files.append((script_version, migration_file))
+        migration_files.sort()
+
+        # All of the scripts that need to run are combined into one big script
+        # that runs them in a single transaction, so that nothing is committed
+        # unless they all succeed. Running it with executescript() is much
+        # faster than executing the statements one at a time.
+        script = ["begin transaction;"]
+        for script_version, migration_file in migration_files:
+            if script_version <= current_version:
+                continue
+            # Each script version should be exactly 1 greater than the
+            # previous, and none of them should be higher than what the
+            # software expects
+            too_high = (script_version > expected_version
+                        or script_version != current_version + 1)
+            if too_high:
+                raise Exception(
+                    "Migration script {} version higher than expected."
+                    .format(str(migration_file.resolve()))
+                )
+            script.append(migration_file.read_text())
+            # HACK: Normally we shouldn't use string formatting to pass
+            # parameters to the database, because that's how you get injection
+            # attacks. Pragma statements don't allow us to use proper
+            # parameterization though, so we don't have a choice. We at least
+            # specify the value should be an integer in the format string.
+            script.append("pragma user_version = {:d};"
+                          .format(script_version))
+            current_version = script_version
+        if current_version < expected_version:
+            raise Exception("SQLite user_version would be lower than expected"
+                            " after running migration scripts.")
+        script.append("commit;")
 
         try:
-            # Without an explicit begin transaction, python's sqlite3 driver
-            # will autocommit DDL statements
-            self._connection.execute("begin transaction")
-            for migration_file in migrations_dir.iterdir():
-                if not migration_file.is_file():
-                    continue
-                match = migration_name_regex.fullmatch(migration_file.name)
-                if not match:
-                    continue
-                script_version = int(match.group(1))
-                current_version = self.get_sqlite_user_version()
-                if script_version <= current_version:
-                    continue
-                # Each script version should be exactly 1 greater than the
-                # previous, and none of them should be higher than what the
-                # software expects
-                too_high = (script_version > expected_version
-                            or script_version != current_version + 1)
-                if too_high:
-                    raise Exception(
-                        "Migration script {} version higher than expected."
-                        .format(str(migration_file.resolve()))
-                    )
-                script = migration_file.read_text()
-                # We can't use executescript because it forces a commit, and we
-                # don't want to commit anything until all the migrations have
-                # run
-                for statement in script.split(";"):
-                    self._connection.execute(statement)
-                # HACK: Normally we shouldn't use string formatting to pass
-                # parameters to the database, because that's how you get
-                # injection attacks. Pragma statements don't allow us to use
-                # proper parameterization though, so we don't have a choice. We
-                # at least specify the value should be an integer in the format
-                # string.
-                self._connection.execute("pragma user_version = {:d};"
-                                         .format(script_version))
-            if self.get_sqlite_user_version() < expected_version:
-                raise Exception("SQLite user_version lower than expected after"
-                                " running migration scripts.")
+            self._connection.executescript("\n".join(script))
         except Exception:
-            self._connection.rollback()
+            # executescript() stops at the first error, which leaves the
+            # transaction open
+            if self._connection.in_transaction:
+                self._connection.rollback()
             raise
 
-        self._connection.commit()
+        # The database is current now, and the user has agreed to convert it
+        self._check_version()
+
+        # The schema has changed, so the snapshot used to check dynamic query
+        # names needs to be reloaded, and any statements built from it rebuilt
+        self._schema = None
+        self._sql_cache.clear()
+        self.invalidate_caches()
 
     def save_person(self, data, person_id=None):
         """
@@ -185,38 +530,81 @@ class Database:
             The id of the person as an integer.
 
         """
-        with self._connection:
+        with self._writer():
+            return self._save_people([(data, person_id)])[0]
+
+    def save_people(self, people):
+        """
+        Insert or update many people at once, in a single transaction. Much
+        faster than calling save_person() for each person when importing or
+        editing people in bulk.
+
+        Args:
+            people: A sequence of dictionaries of values to be
+                inserted/updated, in the same format that save_person() takes.
+                Dictionaries with an "id" value will update the corresponding
+                person, while the rest will be inserted as new people.
+
+        Returns:
+            A list of the ids of the people as integers, in the same order as
+            the people argument.
+
+        """
+        with self._writer():
+            return self._save_people([(data, data.get("id"))
+                                      for data in people])
+
+    def bulk_insert(self, tables):
+        """
+        Insert rows into any number of tables, in a single transaction, with
+        one executemany() call per table. Meant for importing or generating
+        large amounts of data. No checking is done beyond what the database's
+        constraints do. Foreign keys aren't checked until the end of the
+        transaction, so rows can be inserted before the rows they refer to.
+
+        Args:
+            tables: A sequence of (table, rows) tuples, inserted in that
+                order. table is the name of a table, and rows is a sequence of
+                dictionaries of column names and corresponding values, one per
+                row. All of the dictionaries for a table must have the same
+                keys.
+
+        Raises:
+            ValueError: If any of the table or column names don't exist.
+
+        """
+        with self._writer():
+            # The pragma only lasts until the end of the current transaction,
+            # so the transaction has to be started first. Normally the sqlite3
+            # module starts it implicitly at the first insert.
+            if not self._connection.in_transaction:
+                self._connection.execute("begin;")
+            self._connection.execute("pragma defer_foreign_keys = on;")
+            for table, rows in tables:
+                if rows:
+                    self._dynamic_insert(table=table, column_values=rows)
+
+    # Insert or update people and their aliases, email addresses, and other
+    # contact info. Must be called from within a transaction.
+    #
+    # Args:
+    #   people: A sequence of (data, person_id) tuples, where data is a
+    #       dictionary of values to be inserted/updated, and person_id is the
+    #       ID of the person to update, or None to insert a new person.
+    #
+    # Returns:
+    #   A list of the ids of the people as integers, in the same order as the
+    #   people argument.
+    def _save_people(self, people):
+        person_ids = []
+        updated_people = []
+        for data, person_id in people:
             if person_id:
                 data["id"] = person_id
-                self._connection.execute(
-                    """
-                    update people
-                    set first_name_or_nickname = :first_name_or_nickname
-                        , pronouns = :pronouns
-                        , notes = :notes
-                    where id = :id
-                    """,
-                    data,
-                )
-                old_aliases = self._get_collection(table="people_aliases",
-                                                   filter_column="person_id",
-                                                   get_column="alias",
-                                                   filter_value=person_id)
-                old_email_addresses = self._get_collection(
-                    table="people_email_addresses",
-                    filter_column="person_id",
-                    get_column="email_address",
-                    filter_value=person_id,
-                    order_by_column="primary_email",
-                    order_ascending=False,
-                )
-                old_other_contact_info = self._get_collection(
-                    table="people_other_contact_info",
-                    filter_column="person_id",
-                    get_column=("other_contact_info_type_id", "contact_info"),
-                    filter_value=person_id,
-                )
+                updated_people.append(data)
             else:
+                # executemany() can't give us the id of each new row, so new
+                # people have to be inserted one at a time
                 person_id = self._connection.execute(
                     """
                     insert into people (
@@ -231,60 +619,92 @@ class Database:
                     """,
                     data,
                 ).lastrowid
-                old_aliases = ()
-                old_email_addresses = ()
-                old_other_contact_info = ()
-
-            self._update_collection(table="people_aliases",
-                                    filter_column="person_id",
-                                    update_column="alias",
-                                    filter_value=person_id,
-                                    old_items=old_aliases,
-                                    new_items=data["aliases"])
-            new_email_addresses = data["email_addresses"]
-            self._update_collection(table="people_email_addresses",
-                                    filter_column="person_id",
-                                    update_column="email_address",
-                                    filter_value=person_id,
-                                    old_items=old_email_addresses,
-                                    new_items=new_email_addresses)
-            if new_email_addresses:
-                # If the person has any email addresses, set the first one as
-                # primary
-                if old_email_addresses:
-                    # But first clear any primary flags on email addresses that
-                    # they had before
-                    self._connection.execute(
-                        """
-                        update people_email_addresses
-                        set primary_email = null
-                        where person_id = ?
-                        """,
-                        (person_id,),
-                    )
-                self._connection.execute(
-                    """
-                    update people_email_addresses
-                    set primary_email = 1
-                    where person_id = :id
-                    and email_address = :email_address
-                    """,
-                    {"id": person_id, "email_address": new_email_addresses[0]},
-                )
-            self._update_collection(
-                table="people_other_contact_info",
-                filter_column="person_id",
-                update_column=("other_contact_info_type_id", "contact_info"),
-                filter_value=person_id,
-                old_items=old_other_contact_info,
-                new_items=data["other_contact_info"])
-            return person_id
-
-    # Update the items of a simple collection associated with a record, such as
-    # the aliases associated with a person.
+            person_ids.append(person_id)
+        self._record_change("people", person_ids)
+        if updated_people:
+            self._connection.executemany(
+                """
+                update people
+                set first_name_or_nickname = :first_name_or_nickname
+                    , pronouns = :pronouns
+                    , notes = :notes
+                where id = :id
+                """,
+                updated_people,
+            )
+
+        old_aliases, old_email_addresses, old_other_contact_info = (
+            self._get_people_collections(self._connection,
+                                         [data["id"]
+                                          for data in updated_people])
+        )
+
+        # (person_id, data) pairs
+        saved = list(zip(person_ids, (data for data, _ in people)))
+        self._update_collection(
+            table="people_aliases",
+            filter_column="person_id",
+            update_column="alias",
+            collections=[(person_id, old_aliases.get(person_id, ()),
+                          data["aliases"])
+                         for person_id, data in saved],
+        )
+        self._update_collection(
+            table="people_email_addresses",
+            filter_column="person_id",
+            update_column="email_address",
+            collections=[(person_id, old_email_addresses.get(person_id, ()),
+                          data["email_addresses"])
+                         for person_id, data in saved],
+        )
+        # If a person has any email addresses, set the first one as primary.
+        # But first clear any primary flags on email addresses that they had
+        # before.
+        clear_primary = [(person_id,) for person_id, data in saved
+                         if data["email_addresses"]
+                         and old_email_addresses.get(person_id)]
+        if clear_primary:
+            self._connection.executemany(
+                """
+                update people_email_addresses
+                set primary_email = null
+                where person_id = ?
+                """,
+                clear_primary,
+            )
+        set_primary = [{"id": person_id,
+                        "email_address": data["email_addresses"][0]}
+                       for person_id, data in saved
+                       if data["email_addresses"]]
+        if set_primary:
+            self._connection.executemany(
+                """
+                update people_email_addresses
+                set primary_email = 1
+                where person_id = :id
+                and email_address = :email_address
+                """,
+                set_primary,
+            )
+        if clear_primary or set_primary:
+            self._record_change("people_email_addresses")
+        self._update_collection(
+            table="people_other_contact_info",
+            filter_column="person_id",
+            update_column=("other_contact_info_type_id", "contact_info"),
+            collections=[(person_id, old_other_contact_info.get(person_id, ()),
+                          data["other_contact_info"])
+                         for person_id, data in saved],
+        )
+        return person_ids
+
+    # Update the items of simple collections associated with records, such as
+    # the aliases associated with people. The changes for all of the
+    # collections are applied with at most one batch each of delete, update,
+    # and insert statements.
     #
-    # This function uses dynamic queries. DO NOT pass any unsanitized data to
-    # it for the table, filter_column, or update_column arguments.
+    # This function uses dynamic queries. The table and column names are
+    # checked against the database schema before being used.
     #
     # Args:
     #   table: Name of the table to update, such as "people_aliases".
@@ -293,190 +713,511 @@ class Database:
     #       ("other_contact_info_type_id","contact_info"). If multiple columns
     #       are specified, the each item in old_items and new_items should be a
     #       tuple of the appropriate size.
-    #   filter_value: The value to filter for, such as the ID of a person.
-    #   old_items: A sequence consisting of the items currently in the
+    #   collections: A sequence of (filter_value, old_items, new_items) tuples,
+    #       one per collection. filter_value is the value to filter for, such
+    #       as the ID of a person. old_items is a sequence consisting of the
+    #       items currently in the collection. new_items is a sequence
+    #       consisting of the items that will be added to or kept in the
     #       collection.
-    #   new_items: A sequence consisting of the items that will be added to or
-    #       kept in the collection.
     def _update_collection(self, table, filter_column, update_column,
-                           filter_value, old_items, new_items):
+                           collections):
         if isinstance(update_column, str):
             update_columns = (update_column,)
-            new_tuples = [(new,) for new in new_items]
-            old_tuples = [(old,) for old in old_items]
         else:
             update_columns = update_column
-            new_tuples = new_items
-            old_tuples = old_items
-        old_tuples = set(old_tuples)
-        new_tuples = set(new_tuples)
-        remove_tuples = old_tuples - new_tuples
-        add_tuples = new_tuples - old_tuples
-        for old, new in itertools.zip_longest(remove_tuples, add_tuples):
-            if old is not None and new is not None:
-                # We have both new and old items left, so swap an old
-                # one for a new one
-                column_values = dict(zip(update_columns, new))
-                where_conditions = dict(zip(update_columns, old))
-                where_conditions[filter_column] = filter_value
-                self._dynamic_update(table=table,
-                                     column_values=column_values,
-                                     where_conditions=where_conditions)
-            elif old is not None:
-                # We've run out of new items and only have old ones
-                # left, so delete this one
-                where_conditions = dict(zip(update_columns, old))
-                where_conditions[filter_column] = filter_value
-                self._dynamic_delete(table=table,
-                                     where_conditions=where_conditions)
-            elif new is not None:
-                # We've run out of old items and only have new ones
-                # left, so insert this one
-                column_values = dict(zip(update_columns, new))
-                column_values[filter_column] = filter_value
-                self._dynamic_insert(table=table, column_values=column_values)
-
-    # Get the items of a simple collection associated with a record, such as
-    # the aliases associated with a person.
+        deletes = []
+        updates = []
+        inserts = []
+        for filter_value, old_items, new_items in collections:
+            if isinstance(update_column, str):
+                new_tuples = [(new,) for new in new_items]
+                old_tuples = [(old,) for old in old_items]
+            else:
+                new_tuples = new_items
+                old_tuples = old_items
+            old_tuples = set(old_tuples)
+            new_tuples = set(new_tuples)
+            remove_tuples = old_tuples - new_tuples
+            add_tuples = new_tuples - old_tuples
+            for old, new in itertools.zip_longest(remove_tuples, add_tuples):
+                if old is not None and new is not None:
+                    # We have both new and old items left, so swap an old
+                    # one for a new one
+                    column_values = dict(zip(update_columns, new))
+                    where_conditions = dict(zip(update_columns, old))
+                    where_conditions[filter_column] = filter_value
+                    updates.append((column_values, where_conditions))
+                elif old is not None:
+                    # We've run out of new items and only have old ones
+                    # left, so delete this one
+                    where_conditions = dict(zip(update_columns, old))
+                    where_conditions[filter_column] = filter_value
+                    deletes.append(where_conditions)
+                elif new is not None:
+                    # We've run out of old items and only have new ones
+                    # left, so insert this one
+                    column_values = dict(zip(update_columns, new))
+                    column_values[filter_column] = filter_value
+                    inserts.append(column_values)
+        # Deletes go first so that they can't cause unique constraint
+        # violations for the updates and inserts
+        if deletes:
+            self._dynamic_delete(table=table, where_conditions=deletes)
+        if updates:
+            self._dynamic_update(table=table, updates=updates)
+        if inserts:
+            self._dynamic_insert(table=table, column_values=inserts)
+
+    # Get the items of simple collections associated with records, such as
+    # the aliases associated with people. Uses a single query no matter how
+    # many records are requested.
     #
-    # This function uses dynamic queries. DO NOT pass any unsanitized data to
-    # it for the table, filter_column, get_column, or order_by_column
-    # arguments.
+    # This function uses dynamic queries. The table and column names are
+    # checked against the database schema before being used.
     #
     # Args:
+    #   connection: The sqlite3 connection to use.
     #   table: Name of the table to query, such as "people_aliases".
     #   filter_column: Column to filter by, such as "person_id".
     #   get_column: Column or tuple of columns to get data from, such
     #       as "alias" or ("other_contact_info_type_id","contact_info").
-    #   filter_value: The value to filter for, such as the ID of a person.
-    #   order_by_column: Optional column to order results by.
+    #   filter_values: A sequence of values to filter for, such as the IDs of
+    #       some people.
+    #   order_by_column: Optional column to order each collection's items by.
     #   order_ascending: Optional direction to order results by. Defaults to
     #       True. Has no effect if order_by_column is unspecified.
     #
     # Returns:
-    #   A list containing the collection's items. If multiple columns were
-    #   specified for the get_column argument, this will be a list of tuples.
-    #   Otherwise it will be a list of single values.
-    def _get_collection(self, table, filter_column, get_column, filter_value,
-                        order_by_column=None, order_ascending=True):
+    #   A dictionary mapping each filter value to a list containing its
+    #   collection's items. If multiple columns were specified for the
+    #   get_column argument, the lists will contain tuples. Otherwise they will
+    #   contain single values. Filter values with no items are left out.
+    def _get_collections(self, connection, table, filter_column, get_column,
+                         filter_values, order_by_column=None,
+                         order_ascending=True):
         if isinstance(get_column, str):
-            get_columns_sql = get_column
+            get_columns = (get_column,)
         else:
-            get_columns_sql = ",".join(get_column)
+            get_columns = tuple(get_column)
+
+        def build():
+            if order_by_column:
+                order_by_sql = "order by {order_by_column} {direction}".format(
+                    order_by_column=order_by_column,
+                    direction="asc" if order_ascending else "desc",
+                )
+            else:
+                order_by_sql = ""
+            return (
+                """
+                select {filter_column}, {get_columns_sql}
+                from {table}
+                where {filter_column} in (select value from json_each(?))
+                {order_by_sql}
+                """
+            ).format(table=table,
+                     filter_column=filter_column,
+                     get_columns_sql=",".join(get_columns),
+                     order_by_sql=order_by_sql)
+        columns = (filter_column,) + get_columns
         if order_by_column:
-            order_by_sql = "order by {order_by_column} {direction}".format(
-                order_by_column=order_by_column,
-                direction="asc" if order_ascending else "desc",
-            )
-        else:
-            order_by_sql = ""
-        query = (
-            """
-            select {get_columns_sql}
-            from {table}
-            where {filter_column} = ?
-            {order_by_sql}
-            """
-        ).format(table=table,
-                 filter_column=filter_column,
-                 get_columns_sql=get_columns_sql,
-                 order_by_sql=order_by_sql)
-        rows = self._connection.execute(query, (filter_value,)).fetchall()
-        if rows and len(rows[0]) > 1:
-            return [tuple(row) for row in rows]
-        else:
-            return [row[0] for row in rows]
+            columns += (order_by_column,)
+        query = self._get_sql(
+            key=("select", table, filter_column, get_columns,
+                 order_by_column, order_ascending),
+            table=table,
+            columns=columns,
+            build=build,
+        )
+        rows = connection.execute(
+            query,
+            (json.dumps(list(filter_values)),),
+        ).fetchall()
+        collections = {}
+        for filter_value, *items in rows:
+            if len(items) > 1:
+                item = tuple(items)
+            else:
+                item = items[0]
+            collections.setdefault(filter_value, []).append(item)
+        return collections
 
-    # Build and execute a dynamic SQL insert statement.
-    #
-    # DO NOT pass any unsanitized data for the table argument or any of the
-    # column names in the column_values dictionary.
+    # Build and execute a dynamic SQL insert statement for a batch of rows.
+    # The table and column names are checked against the database schema
+    # before being used.
     #
     # Args:
     #   table: Name of the table to insert into.
-    #   column_values: A dictionary of column names and corresponding values to
-    #       insert.
+    #   column_values: A sequence of dictionaries of column names and
+    #       corresponding values to insert, one per row. All of the
+    #       dictionaries must have the same keys.
     def _dynamic_insert(self, table, column_values):
-        column_names = column_values.keys()
-        column_names_sql = ",".join(column_names)
-        insert_params = [":{}".format(col) for col in column_names]
-        insert_params_sql = ",".join(insert_params)
-        query = (
-            """
-            insert into {table} (
-                {column_names_sql}
-            ) values (
-                {insert_params_sql}
-            )
-            """
-        ).format(table=table,
-                 column_names_sql=column_names_sql,
-                 insert_params_sql=insert_params_sql)
-        self._connection.execute(query, column_values)
+        column_names = tuple(column_values[0].keys())
 
-    # Build and execute a dynamic SQL delete statement.
-    #
-    # DO NOT pass any unsanitized data for the table argument or any of the
-    # column names in the where_conditions dictionary.
+        def build():
+            insert_params = [":{}".format(col) for col in column_names]
+            return (
+                """
+                insert into {table} (
+                    {column_names_sql}
+                ) values (
+                    {insert_params_sql}
+                )
+                """
+            ).format(table=table,
+                     column_names_sql=",".join(column_names),
+                     insert_params_sql=",".join(insert_params))
+        query = self._get_sql(key=("insert", table, column_names),
+                              table=table,
+                              columns=column_names,
+                              build=build,
+                              executions=len(column_values))
+        self._connection.executemany(query, column_values)
+        self._record_change(table)
+
+    # Build and execute a dynamic SQL delete statement for a batch of rows.
+    # The table and column names are checked against the database schema
+    # before being used.
     #
     # Args:
-    #   table: Name of the table to insert into.
-    #   where_conditions: A dictionary of column names and corresponding values
-    #       which must match in order for a row to be deleted.
+    #   table: Name of the table to delete from.
+    #   where_conditions: A sequence of dictionaries of column names and
+    #       corresponding values which must match in order for a row to be
+    #       deleted, one per row. All of the dictionaries must have the same
+    #       keys.
     def _dynamic_delete(self, table, where_conditions):
-        column_names = where_conditions.keys()
-        comparisons = ["{c}=:{c}".format(c=c) for c in column_names]
-        where_conditions_sql = " and ".join(comparisons)
-        query = (
-            """
-            delete from {table}
-            where {where_conditions_sql}
-            """
-        ).format(table=table,
-                 where_conditions_sql=where_conditions_sql)
-        self._connection.execute(query, where_conditions)
+        column_names = tuple(where_conditions[0].keys())
 
-    # Build and execute a dynamic SQL update statement.
+        def build():
+            comparisons = ["{c}=:{c}".format(c=c) for c in column_names]
+            return (
+                """
+                delete from {table}
+                where {where_conditions_sql}
+                """
+            ).format(table=table,
+                     where_conditions_sql=" and ".join(comparisons))
+        query = self._get_sql(key=("delete", table, column_names),
+                              table=table,
+                              columns=column_names,
+                              build=build,
+                              executions=len(where_conditions))
+        self._connection.executemany(query, where_conditions)
+        self._record_change(table)
+
+    # Build and execute a dynamic SQL update statement for a batch of rows.
+    # The table and column names are checked against the database schema
+    # before being used.
     #
-    # DO NOT pass any unsanitized data for the table argument or any of the
-    # column names in the column_values or where_conditions dictionaries.
+    # Args:
+    #   table: Name of the table to update.
+    #   updates: A sequence of (column_values, where_conditions) tuples, one
+    #       per row. column_values is a dictionary of column names and
+    #       corresponding values to set. where_conditions is a dictionary of
+    #       column names and corresponding values which must match in order
+    #       for the row to be updated. All of the tuples must have dictionaries
+    #       with the same keys.
+    def _dynamic_update(self, table, updates):
+        first_column_values, first_where_conditions = updates[0]
+        set_columns = tuple(first_column_values.keys())
+        where_columns = tuple(first_where_conditions.keys())
+
+        def build():
+            assignments = [
+                "{column_name}=:{column_name}_set".format(
+                    column_name=column_name
+                )
+                for column_name in set_columns
+            ]
+            conditions = [
+                "{column_name}=:{column_name}_where".format(
+                    column_name=column_name
+                )
+                for column_name in where_columns
+            ]
+            return (
+                """
+                update {table}
+                set {assignments_sql}
+                where {conditions_sql}
+                """
+            ).format(table=table,
+                     assignments_sql=",".join(assignments),
+                     conditions_sql=" and ".join(conditions))
+        query = self._get_sql(key=("update", table, set_columns,
+                                   where_columns),
+                              table=table,
+                              columns=set_columns + where_columns,
+                              build=build,
+                              executions=len(updates))
+        parameters = []
+        for column_values, where_conditions in updates:
+            row_parameters = {}
+            for column_name, set_value in column_values.items():
+                row_parameters[column_name + "_set"] = set_value
+            for column_name, where_value in where_conditions.items():
+                row_parameters[column_name + "_where"] = where_value
+            parameters.append(row_parameters)
+        self._connection.executemany(query, parameters)
+        self._record_change(table)
+
+    # Get the text of a dynamic SQL statement from the SQL cache, building it
+    # and adding it to the cache if it isn't there yet. The table and column
+    # names are checked against the database schema before the statement is
+    # built for the first time, so a statement only gets into the cache if
+    # all of its names are real.
     #
     # Args:
-    #   table: Name of the table to insert into.
-    #   column_values: A dictionary of column names and corresponding values to
-    #       set.
-    #   where_conditions: A dictionary of column names and corresponding values
-    #       which must match in order for a row to be updated.
-    def _dynamic_update(self, table, column_values, where_conditions):
-        parameters = {}
-        assignments = []
-        for column_name, set_value in column_values.items():
-            param = "{column_name}_set".format(column_name=column_name)
-            parameters[param] = set_value
-            assignments.append(
-                "{column_name}=:{param}".format(column_name=column_name,
-                                                param=param)
-            )
-        conditions = []
-        for column_name, where_value in where_conditions.items():
-            param = "{column_name}_where".format(column_name=column_name)
-            parameters[param] = where_value
-            conditions.append(
-                "{column_name}=:{param}".format(column_name=column_name,
-                                                param=param)
-            )
-        assignments_sql = ",".join(assignments)
-        conditions_sql = " and ".join(conditions)
-        query = (
-            """
-            update {table}
-            set {assignments_sql}
-            where {conditions_sql}
-            """
-        ).format(table=table,
-                 assignments_sql=assignments_sql,
-                 conditions_sql=conditions_sql)
-        self._connection.execute(query, parameters)
+    #   key: Hashable key identifying the statement, such as
+    #       ("insert", table, column_names).
+    #   table: Name of the table that the statement uses, or None if the
+    #       statement doesn't need checking because all of its names come from
+    #       this module.
+    #   columns: Sequence of names of the columns that the statement uses.
+    #   build: Function with no arguments that returns the statement text.
+    #   executions: Optional number of times the statement will be executed,
+    #       such as the number of rows passed to executemany(). Only used for
+    #       the estimated_statement_reuses statistic. Defaults to 1.
+    #
+    # Returns:
+    #   The statement text as a string.
+    def _get_sql(self, key, table, columns, build, executions=1):
+        stats = self._sql_cache_stats
+        query = self._sql_cache.get(key)
+        if query is None:
+            stats["misses"] += 1
+            if table is not None:
+                self._check_identifiers(table, columns)
+            query = build()
+            self._sql_cache[key] = query
+            # Assume that the first execution prepares the statement, and
+            # every execution after that reuses it from the connection's
+            # statement cache. See get_sql_cache_stats().
+            stats["estimated_statement_reuses"] += executions - 1
+        else:
+            stats["hits"] += 1
+            stats["estimated_statement_reuses"] += executions
+        return query
+
+    # Get the snapshot of the table and column names in the database, loading
+    # it if necessary.
+    #
+    # Returns:
+    #   A dictionary mapping table names to sets of column names.
+    def _get_schema(self):
+        if self._schema is None:
+            schema = {}
+            with self._write_lock:
+                rows = self._connection.execute(
+                    """
+                    select m.name
+                        , c.name
+                    from sqlite_master m
+                    inner join pragma_table_info(m.name) c
+                    where m.type = 'table'
+                    """
+                ).fetchall()
+            for table_name, column_name in rows:
+                schema.setdefault(table_name, set()).add(column_name)
+            self._schema = schema
+        return self._schema
+
+    # Make sure that a table and its columns exist in the database, so that
+    # their names are safe to use in dynamic SQL statements.
+    #
+    # Args:
+    #   table: Name of the table.
+    #   columns: Sequence of names of columns in the table.
+    #
+    # Raises:
+    #   ValueError: If the table or any of the columns don't exist.
+    def _check_identifiers(self, table, columns):
+        table_columns = self._get_schema().get(table)
+        if table_columns is None:
+            raise ValueError("No such table: {!r}".format(table))
+        for column in columns:
+            if column not in table_columns:
+                raise ValueError("No such column in {}: {!r}"
+                                 .format(table, column))
+
+    # Get the result of a lookup query from the lookup cache, or run the query
+    # and cache its result. Cached results are thrown away when any of the
+    # tables they were read from are changed. Only suitable for queries on
+    # small tables that change rarely.
+    #
+    # Args:
+    #   key: Tuple that uniquely identifies the query and its arguments.
+    #   tables: Tuple of the names of the tables that the query reads.
+    #   fetch: Function that takes a read-only connection, runs the query,
+    #       and returns the result.
+    #
+    # Returns:
+    #   The result of the query. Lists are copied, so callers are free to
+    #   modify them.
+    def _get_cached(self, key, tables, fetch):
+        with self._lookup_cache_lock:
+            if key in self._lookup_cache:
+                self._lookup_cache_stats["hits"] += 1
+                result = self._lookup_cache[key][1]
+                return list(result) if isinstance(result, list) else result
+            self._lookup_cache_stats["misses"] += 1
+            generation = self._lookup_cache_generation
+        with self._reader() as connection:
+            result = fetch(connection)
+        with self._lookup_cache_lock:
+            # If the cache was invalidated while we were querying, our result
+            # might already be out of date
+            if generation == self._lookup_cache_generation:
+                self._lookup_cache[key] = (tables, result)
+        return list(result) if isinstance(result, list) else result
+
+    def invalidate_caches(self, changes=None):
+        """
+        Throw away cached query results. Happens automatically after this
+        Database object writes to the database, but needs to be called if the
+        database is changed in some other way, such as by another program.
+
+        Args:
+            changes: Optional dictionary of changed tables, in the format
+                returned by pop_changes(). Only results read from those tables
+                will be thrown away. If unspecified, all cached results will be
+                thrown away.
+
+        """
+        with self._lookup_cache_lock:
+            self._lookup_cache_generation += 1
+            if changes is None:
+                self._lookup_cache.clear()
+                return
+            for key, (tables, _) in list(self._lookup_cache.items()):
+                if any(table in changes for table in tables):
+                    del self._lookup_cache[key]
+
+    def get_lookup_cache_stats(self):
+        """
+        Get statistics for the lookup table cache.
+
+        Returns:
+            A dictionary with the following keys:
+                hits: Number of times a result was found in the cache.
+                misses: Number of times a query had to be run.
+                cached_results: Number of results in the cache.
+
+        """
+        with self._lookup_cache_lock:
+            stats = dict(self._lookup_cache_stats)
+            stats["cached_results"] = len(self._lookup_cache)
+        return stats
+
+    def enable_instrumentation(self, slow_threshold_ms=100,
+                               slow_log_filename=None):
+        """
+        Start recording statistics about calls to this object's public
+        methods and the SQL statements they run, which can be retrieved with
+        stats(). Calls and statements that take longer than a threshold are
+        logged. Does nothing if instrumentation is
+        already enabled.
+
+        Args:
+            slow_threshold_ms: Optional number of milliseconds that a call or
+                statement has to take to be logged as slow. Defaults to 100.
+            slow_log_filename: Optional name of a file to append slow calls
+                and statements to. If unspecified, the most recent ones are
+                only kept in memory.
+
+        """
+        if self._instrumentation:
+            return
+        instrumentation = Instrumentation(slow_threshold_ms=slow_threshold_ms,
+                                          slow_log_filename=slow_log_filename)
+        for name in dir(type(self)):
+            if name.startswith("_") or name in _uninstrumented_methods:
+                continue
+            method = getattr(self, name)
+            if callable(method):
+                # Shadow the method with an instance attribute
+                setattr(self, name, instrumentation.wrap(name, method))
+        self.set_trace_callback(instrumentation.trace)
+        self._instrumentation = instrumentation
+
+    def disable_instrumentation(self):
+        """
+        Stop recording statistics and throw away the ones recorded so far.
+        Does nothing if instrumentation isn't enabled.
+
+        """
+        if not self._instrumentation:
+            return
+        for name in list(vars(self)):
+            if not name.startswith("_"):
+                delattr(self, name)
+        self.set_trace_callback(None)
+        self._instrumentation = None
+
+    def stats(self):
+        """
+        Get statistics about this object's method calls, the SQL statements
+        they ran, and its caches.
+
+        Returns:
+            A dictionary with the following keys:
+                instrumented: True if instrumentation is enabled. See
+                    enable_instrumentation().
+                slow_threshold_ms: The threshold for logging slow calls and
+                    statements, or None if instrumentation isn't enabled.
+                methods: Dictionary of statistics for each method called since
+                    instrumentation was enabled, as returned by
+                    Instrumentation.get_method_stats().
+                slow_calls: List of the most recent slow calls, as returned by
+                    Instrumentation.get_slow_calls().
+                statements: Dictionary of statistics for each SQL statement
+                    run since instrumentation was enabled, as returned by
+                    Instrumentation.get_statement_stats().
+                slow_statements: List of the most recent slow statements, as
+                    returned by Instrumentation.get_slow_statements().
+                sql_cache: As returned by get_sql_cache_stats().
+                lookup_cache: As returned by get_lookup_cache_stats().
+
+        """
+        instrumentation = self._instrumentation
+        return {
+            "instrumented": instrumentation is not None,
+            "slow_threshold_ms": (instrumentation.slow_threshold_ms
+                                  if instrumentation else None),
+            "methods": (instrumentation.get_method_stats()
+                        if instrumentation else {}),
+            "slow_calls": (instrumentation.get_slow_calls()
+                           if instrumentation else []),
+            "statements": (instrumentation.get_statement_stats()
+                           if instrumentation else {}),
+            "slow_statements": (instrumentation.get_slow_statements()
+                                if instrumentation else []),
+            "sql_cache": self.get_sql_cache_stats(),
+            "lookup_cache": self.get_lookup_cache_stats(),
+        }
+
+    def get_sql_cache_stats(self):
+        """
+        Get statistics for the dynamic SQL statement cache.
+
+        Returns:
+            A dictionary with the following keys:
+                hits: Number of times a statement was found in the cache.
+                misses: Number of times a statement had to be built.
+                cached_statements: Number of statements in the cache.
+                estimated_statement_reuses: Estimated number of executions
+                    that reused an already prepared statement instead of
+                    preparing a new one. The sqlite3 module doesn't report
+                    its statement cache hits, so this counts every execution
+                    of a cached statement except the first. Each connection
+                    prepares its own copy of a statement, so the true number
+                    is lower when a statement runs on more than one of the
+                    read-only connections.
+
+        """
+        stats = dict(self._sql_cache_stats)
+        stats["cached_statements"] = len(self._sql_cache)
+        return stats
 
     def get_person(self, person_id):
         """
@@ -486,67 +1227,399 @@ class Database:
             person_id: The ID of the person.
 
         Returns:
-            The a dictionary of the person's data.
+            The a dictionary of the person's data, or None if there is no
+            such person.
+
+        """
+        people = self.get_people_details((person_id,))
+        if people:
+            return people[0]
+        else:
+            return None
+
+    def get_people_details(self, person_ids):
+        """
+        Retrieve the specified people from the database, along with their
+        aliases, email addresses, and other contact info. Uses the same number
+        of queries no matter how many people are requested.
+
+        Args:
+            person_ids: A sequence of person IDs.
+
+        Returns:
+            A list of dictionaries of the people's data, in the same format
+            returned by get_person() and in the same order as person_ids. IDs
+            that don't match any person are skipped.
 
         """
-        with self._connection:
-            row = self._connection.execute(
+        with self._reader() as connection:
+            rows = connection.execute(
                 """
                 select id
                     , first_name_or_nickname
                     , pronouns
                     , notes
                 from people
-                where id = ?
+                where id in (select value from json_each(?))
                 """,
-                (person_id,),
-            ).fetchone()
+                (json.dumps(list(person_ids)),),
+            ).fetchall()
+            aliases, email_addresses, other_contact_info = (
+                self._get_people_collections(connection, person_ids)
+            )
+        people_by_id = {}
+        for row in rows:
             person = {}
             for key in row.keys():
                 person[key] = row[key]
-            person["aliases"] = self._get_collection(table="people_aliases",
-                                                     filter_column="person_id",
-                                                     get_column="alias",
-                                                     filter_value=person_id)
-            person["email_addresses"] = self._get_collection(
-                table="people_email_addresses",
-                filter_column="person_id",
-                get_column="email_address",
-                filter_value=person_id,
-                order_by_column="primary_email",
-                order_ascending=False,
+            person_id = person["id"]
+            person["aliases"] = aliases.get(person_id, [])
+            person["email_addresses"] = email_addresses.get(person_id, [])
+            person["other_contact_info"] = other_contact_info.get(person_id,
+                                                                  [])
+            people_by_id[person_id] = person
+        return [people_by_id[person_id] for person_id in person_ids
+                if person_id in people_by_id]
+
+    # Get the aliases, email addresses, and other contact info of the
+    # specified people. Email addresses are ordered with the primary address
+    # first.
+    #
+    # Args:
+    #   connection: The sqlite3 connection to use.
+    #   person_ids: A sequence of person IDs.
+    #
+    # Returns:
+    #   A tuple of three dictionaries (aliases, email addresses, other contact
+    #   info), each mapping person IDs to lists of items as returned by
+    #   _get_collections(). People with no items are left out.
+    def _get_people_collections(self, connection, person_ids):
+        aliases = self._get_collections(connection=connection,
+                                        table="people_aliases",
+                                        filter_column="person_id",
+                                        get_column="alias",
+                                        filter_values=person_ids)
+        email_addresses = self._get_collections(
+            connection=connection,
+            table="people_email_addresses",
+            filter_column="person_id",
+            get_column="email_address",
+            filter_values=person_ids,
+            order_by_column="primary_email",
+            order_ascending=False,
+        )
+        other_contact_info = self._get_collections(
+            connection=connection,
+            table="people_other_contact_info",
+            filter_column="person_id",
+            get_column=("other_contact_info_type_id", "contact_info"),
+            filter_values=person_ids,
+        )
+        return aliases, email_addresses, other_contact_info
+
+    def get_people(self, order_by=None, descending=False, after=None,
+                   limit=None):
+        """
+        Get all people from the database, or one page of them.
+
+        Args:
+            order_by: Optional name of the column to sort by. Can be "id",
+                "first_name_or_nickname", "email_address", "pronouns", or
+                "notes". Defaults to "id".
+            descending: Optional direction to sort in. Defaults to False.
+            after: Optional row returned by a previous call with the same
+                order_by and descending arguments. Only the rows that come
+                after it will be returned.
+            limit: Optional maximum number of rows to return.
+
+        Returns:
+            A list of Row objects.
+
+        """
+        with self._reader() as connection:
+            return self._get_page(
+                connection=connection,
+                key="get_people",
+                query="""
+                    select people.id as id
+                        , first_name_or_nickname
+                        , email_address
+                        , pronouns
+                        , notes
+                    from people
+                    left join people_email_addresses
+                    on people.id = people_email_addresses.person_id
+                    and primary_email = 1
+                    """,
+                sort_columns={
+                    "id": "people.id",
+                    "first_name_or_nickname": "first_name_or_nickname",
+                    "email_address": "email_address",
+                    "pronouns": "pronouns",
+                    "notes": "notes",
+                },
+                order_by=order_by,
+                descending=descending,
+                after=after,
+                limit=limit,
             )
-            person["other_contact_info"] = self._get_collection(
-                table="people_other_contact_info",
-                filter_column="person_id",
-                get_column=("other_contact_info_type_id", "contact_info"),
-                filter_value=person_id,
+
+    # Run a list query, sorting the results and returning one page of them.
+    # Pages are selected by keyset pagination: rather than skipping a number
+    # of rows with an offset, the query picks up where the last row of the
+    # previous page left off, so fetching each page costs the same no matter
+    # how far into the results it is. The id column breaks ties between rows
+    # with the same sort value.
+    #
+    # Args:
+    #   connection: The sqlite3 connection to use.
+    #   key: Unique name for the query, used to cache the statement text.
+    #   query: The select statement, without any where, order by, or limit
+    #       clauses. Must have an id column.
+    #   sort_columns: Dictionary mapping the names of the result columns that
+    #       can be sorted by to the SQL expressions for them. Must contain
+    #       "id".
+    #   order_by: Name of the column to sort by, or None to sort by id.
+    #   descending: If True, sort in descending order.
+    #   after: The last row of the previous page, or None for the first page.
+    #   limit: Maximum number of rows to return, or None for no limit.
+    #
+    # Returns:
+    #   A list of Row objects.
+    #
+    # Raises:
+    #   ValueError: If order_by isn't in sort_columns.
+    def _get_page(self, connection, key, query, sort_columns, order_by,
+                  descending, after, limit):
+        order_by = order_by or "id"
+        if order_by not in sort_columns:
+            raise ValueError("Can't sort by {!r}".format(order_by))
+        sort_expression = sort_columns[order_by]
+        id_expression = sort_columns["id"]
+        parameters = {}
+        if after is None:
+            after_kind = None
+        else:
+            parameters["after_id"] = after["id"]
+            if order_by == "id":
+                after_kind = "id"
+            elif after[order_by] is None:
+                after_kind = "null"
+            else:
+                after_kind = "value"
+                parameters["after_value"] = after[order_by]
+        if limit is not None:
+            parameters["limit"] = limit
+
+        def build():
+            # SQLite puts nulls first when sorting in ascending order, and
+            # last when sorting in descending order
+            if descending:
+                direction, compare = "desc", "<"
+                after_null = "{sort} is null and {id} < :after_id"
+                after_value = ("({sort} < :after_value or {sort} is null"
+                               " or ({sort} = :after_value"
+                               " and {id} < :after_id))")
+            else:
+                direction, compare = "asc", ">"
+                after_null = ("({sort} is null and {id} > :after_id"
+                              " or {sort} is not null)")
+                after_value = ("({sort} > :after_value"
+                               " or ({sort} = :after_value"
+                               " and {id} > :after_id))")
+            conditions = {
+                None: "",
+                "id": "where {id} " + compare + " :after_id",
+                "null": "where " + after_null,
+                "value": "where " + after_value,
+            }
+            where_sql = conditions[after_kind].format(sort=sort_expression,
+                                                      id=id_expression)
+            if order_by == "id":
+                order_by_sql = "order by {id} {direction}"
+            else:
+                order_by_sql = "order by {sort} {direction}, {id} {direction}"
+            order_by_sql = order_by_sql.format(sort=sort_expression,
+                                               id=id_expression,
+                                               direction=direction)
+            if limit is None:
+                limit_sql = ""
+            else:
+                limit_sql = "limit :limit"
+            return "\n".join((query, where_sql, order_by_sql, limit_sql))
+        paged_query = self._get_sql(
+            key=("page", key, order_by, descending, after_kind,
+                 limit is not None),
+            table=None,
+            columns=(),
+            build=build,
+        )
+        return connection.execute(paged_query, parameters).fetchall()
+
+    def search_people(self, query, limit=100):
+        """
+        Search for people by name, alias, email address, other contact info,
+        or notes, using the people_search full-text index. Each word in the
+        query matches any word in a person's data that starts with it, and
+        all of the query's words have to match for a person to be returned.
+
+        Args:
+            query: The text to search for, as typed by the user.
+            limit: Optional maximum number of people to return. Defaults to
+                100.
+
+        Returns:
+            A list of Row objects in the same format as get_people(), best
+            matches first.
+
+        """
+        # Only pass the words from the query to the full-text index, quoted so
+        # that punctuation can't be read as query syntax, and with * so that
+        # they're matched as prefixes
+        words = re.findall(r"[^\W_]+", query)
+        if not words:
+            return []
+        match = " ".join('"{}"*'.format(word) for word in words)
+        with self._reader() as connection:
+            return connection.execute(
+                """
+                select p.id as id
+                    , p.first_name_or_nickname as first_name_or_nickname
+                    , e.email_address as email_address
+                    , p.pronouns as pronouns
+                    , p.notes as notes
+                from people_search s
+                inner join people p
+                on p.id = s.rowid
+                left join people_email_addresses e
+                on p.id = e.person_id
+                and e.primary_email = 1
+                where people_search match ?
+                -- Matches on names count for more than matches on other
+                -- columns
+                order by bm25(people_search, 10.0, 5.0, 2.0, 2.0, 1.0)
+                limit ?
+                """,
+                (match, limit),
+            ).fetchall()
+
+    def get_people_search_terms(self, person_ids=None):
+        """
+        Get the names, aliases, and email addresses of people, for building a
+        search index in memory (see rksmanager.prefixindex) when
+        search_people() isn't fast enough, such as when checking people in at
+        the door.
+
+        Args:
+            person_ids: Optional sequence of the IDs of the people to get. If
+                unspecified, every person is included.
+
+        Returns:
+            A list of Row objects with person_id and term columns, one for
+            each name, alias, and email address.
+
+        """
+        queries = []
+        for table, id_column, term_column in (
+            ("people", "id", "first_name_or_nickname"),
+            ("people_aliases", "person_id", "alias"),
+            ("people_email_addresses", "person_id", "email_address"),
+        ):
+            query = "select {} as person_id, {} as term from {}".format(
+                id_column, term_column, table,
             )
-            return person
+            if person_ids is not None:
+                query += (" where {} in (select value from json_each(?))"
+                          .format(id_column))
+            queries.append(query)
+        if person_ids is None:
+            parameters = ()
+        else:
+            parameters = (json.dumps(list(person_ids)),) * len(queries)
+        with self._reader() as connection:
+            return connection.execute(" union all ".join(queries),
+                                      parameters).fetchall()
 
-    def get_people(self):
+    def get_active_restrictions(self, date=None):
         """
-        Get all people from the database.
+        Get the bans and sanctions that are in effect on a given date.
+
+        Args:
+            date: Optional date object. Defaults to today.
 
         Returns:
-            A list of Row objects.
+            A list of Row objects in the same format as get_restrictions(),
+            in no particular order.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        if date is None:
+            date = datetime.date.today()
+        with self._reader() as connection:
+            return connection.execute(
                 """
-                select people.id as id
-                    , first_name_or_nickname
-                    , email_address
-                    , pronouns
+                select 'ban' as kind
+                    , id
+                    , person_id
+                    , begin_date
+                    , end_date
                     , notes
-                from people
-                left join people_email_addresses
-                on people.id = people_email_addresses.person_id
-                and primary_email = 1
-                """
+                from people_bans
+                where begin_date <= :date
+                and (end_date is null or end_date >= :date)
+                union all
+                select 'sanction' as kind
+                    , id
+                    , person_id
+                    , begin_date
+                    , end_date
+                    , notes
+                from people_sanctions
+                where begin_date <= :date
+                and end_date >= :date
+                """,
+                {"date": date},
             ).fetchall()
 
+    def get_restrictions(self, ban_ids=None, sanction_ids=None):
+        """
+        Get bans and sanctions, whether they're in effect or not, for building
+        an index of them in memory (see rksmanager.restrictions). Passing the
+        IDs from pop_changes() gets only the ones that have changed.
+
+        Args:
+            ban_ids: Optional sequence of the IDs of the bans to get. If
+                unspecified, every ban is included.
+            sanction_ids: Optional sequence of the IDs of the sanctions to
+                get. If unspecified, every sanction is included.
+
+        Returns:
+            A list of Row objects with kind ("ban" or "sanction"), id,
+            person_id, begin_date, end_date, and notes columns. end_date is
+            None for permanent bans.
+
+        """
+        queries = []
+        parameters = []
+        for kind, table, ids in (("ban", "people_bans", ban_ids),
+                                 ("sanction", "people_sanctions",
+                                  sanction_ids)):
+            query = """
+                select '{}' as kind
+                    , id
+                    , person_id
+                    , begin_date
+                    , end_date
+                    , notes
+                from {}
+                """.format(kind, table)
+            if ids is not None:
+                query += "where id in (select value from json_each(?))"
+                parameters.append(json.dumps(list(ids)))
+            queries.append(query)
+        with self._reader() as connection:
+            return connection.execute(" union all ".join(queries),
+                                      parameters).fetchall()
+
     def get_other_contact_info_types(self):
         """
         Get all "other" contact info types from the database.
@@ -555,14 +1628,17 @@ class Database:
             A list of Row objects.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select id
                     , name
                 from other_contact_info_types
                 """
             ).fetchall()
+        return self._get_cached(key=("get_other_contact_info_types",),
+                                tables=("other_contact_info_types",),
+                                fetch=fetch)
 
     def get_other_contact_info_types_usage(self):
         """
@@ -572,8 +1648,8 @@ class Database:
             A list of Row objects.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        with self._reader() as connection:
+            return connection.execute(
                 """
                 select t.id as id
                     , name
@@ -596,8 +1672,8 @@ class Database:
             The id of the new contact info type as an integer.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        with self._writer():
+            type_id = self._connection.execute(
                 """
                 insert into other_contact_info_types (
                     name
@@ -607,6 +1683,8 @@ class Database:
                 """,
                 (name,),
             ).lastrowid
+            self._record_change("other_contact_info_types", (type_id,))
+            return type_id
 
     def count_email_addresses(self):
         """
@@ -616,8 +1694,8 @@ class Database:
             The number of email addresses as an integer.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        with self._reader() as connection:
+            return connection.execute(
                 """
                 select count(*)
                 from people_email_addresses
@@ -632,8 +1710,8 @@ class Database:
             The number of phone numbers as an integer.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        with self._reader() as connection:
+            return connection.execute(
                 """
                 select count(*)
                 from people_phone_numbers
@@ -648,8 +1726,8 @@ class Database:
             A list of Row objects.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select t.id as id
                     , name
@@ -665,6 +1743,12 @@ class Database:
                 group by t.id
                 """
             ).fetchall()
+        # The active counts depend on the date, so include it in the key
+        return self._get_cached(
+            key=("get_membership_types", datetime.date.today()),
+            tables=("membership_types", "people_memberships"),
+            fetch=fetch,
+        )
 
     def create_membership_type(self, name):
         """
@@ -677,8 +1761,8 @@ class Database:
             The id of the new membership type as an integer.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        with self._writer():
+            membership_type_id = self._connection.execute(
                 """
                 insert into membership_types (
                     name
@@ -688,6 +1772,8 @@ class Database:
                 """,
                 (name,),
             ).lastrowid
+            self._record_change("membership_types", (membership_type_id,))
+            return membership_type_id
 
     def get_membership_type(self, membership_type_id):
         """
@@ -700,8 +1786,8 @@ class Database:
             A Row object.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select id
                     , name
@@ -710,6 +1796,10 @@ class Database:
                 """,
                 (membership_type_id,),
             ).fetchone()
+        return self._get_cached(key=("get_membership_type",
+                                     membership_type_id),
+                                tables=("membership_types",),
+                                fetch=fetch)
 
     def get_membership_type_pricing_options(self, membership_type_id):
         """
@@ -723,8 +1813,8 @@ class Database:
             A list of Row objects.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select id
                     , length_months
@@ -734,6 +1824,10 @@ class Database:
                 """,
                 (membership_type_id,),
             ).fetchall()
+        return self._get_cached(key=("get_membership_type_pricing_options",
+                                     membership_type_id),
+                                tables=("membership_type_pricing_options",),
+                                fetch=fetch)
 
     def get_membership_type_pricing_option(self, pricing_option_id):
         """
@@ -746,8 +1840,8 @@ class Database:
             A Row object.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select p.id as id
                     , membership_type_id
@@ -761,6 +1855,11 @@ class Database:
                 """,
                 (pricing_option_id,),
             ).fetchone()
+        return self._get_cached(key=("get_membership_type_pricing_option",
+                                     pricing_option_id),
+                                tables=("membership_type_pricing_options",
+                                        "membership_types"),
+                                fetch=fetch)
 
     def save_membership_type_pricing_option(self, data,
                                             pricing_option_id=None):
@@ -777,7 +1876,7 @@ class Database:
             The id of the pricing option as an integer.
 
         """
-        with self._connection:
+        with self._writer():
             if pricing_option_id:
                 data["id"] = pricing_option_id
                 self._connection.execute(
@@ -804,6 +1903,8 @@ class Database:
                     """,
                     data,
                 ).lastrowid
+            self._record_change("membership_type_pricing_options",
+                                (pricing_option_id,))
             return pricing_option_id
 
     def get_event_types(self):
@@ -814,8 +1915,8 @@ class Database:
             A list of Row objects.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select id
                     , name
@@ -825,6 +1926,9 @@ class Database:
                 from event_types
                 """
             ).fetchall()
+        return self._get_cached(key=("get_event_types",),
+                                tables=("event_types",),
+                                fetch=fetch)
 
     def get_event_type(self, event_type_id):
         """
@@ -837,8 +1941,8 @@ class Database:
             A Row object.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        def fetch(connection):
+            return connection.execute(
                 """
                 select id
                     , name
@@ -850,6 +1954,9 @@ class Database:
                 """,
                 (event_type_id,),
             ).fetchone()
+        return self._get_cached(key=("get_event_type", event_type_id),
+                                tables=("event_types",),
+                                fetch=fetch)
 
     def save_event_type(self, data, event_type_id=None):
         """
@@ -865,7 +1972,7 @@ class Database:
             The id of the event type as an integer.
 
         """
-        with self._connection:
+        with self._writer():
             if event_type_id:
                 data["id"] = event_type_id
                 self._connection.execute(
@@ -897,30 +2004,56 @@ class Database:
                     """,
                     data,
                 ).lastrowid
+            self._record_change("event_types", (event_type_id,))
             return event_type_id
 
-    def get_events(self):
+    def get_events(self, order_by=None, descending=False, after=None,
+                   limit=None):
         """
-        Get all events from the database.
+        Get all events from the database, or one page of them.
+
+        Args:
+            order_by: Optional name of the column to sort by. Can be "id",
+                "name", "event_type_id", "event_type_name", "begin_date_time",
+                or "end_date_time". Defaults to "id".
+            descending: Optional direction to sort in. Defaults to False.
+            after: Optional row returned by a previous call with the same
+                order_by and descending arguments. Only the rows that come
+                after it will be returned.
+            limit: Optional maximum number of rows to return.
 
         Returns:
             A list of Row objects.
 
         """
-        with self._connection:
-            return self._connection.execute(
-                """
-                select e.id as id
-                    , e.name as name
-                    , event_type_id
-                    , t.name as event_type_name
-                    , begin_date_time
-                    , end_date_time
-                from events e
-                inner join event_types t
-                on e.event_type_id = t.id
-                """
-            ).fetchall()
+        with self._reader() as connection:
+            return self._get_page(
+                connection=connection,
+                key="get_events",
+                query="""
+                    select e.id as id
+                        , e.name as name
+                        , event_type_id
+                        , t.name as event_type_name
+                        , begin_date_time
+                        , end_date_time
+                    from events e
+                    inner join event_types t
+                    on e.event_type_id = t.id
+                    """,
+                sort_columns={
+                    "id": "e.id",
+                    "name": "e.name",
+                    "event_type_id": "event_type_id",
+                    "event_type_name": "t.name",
+                    "begin_date_time": "begin_date_time",
+                    "end_date_time": "end_date_time",
+                },
+                order_by=order_by,
+                descending=descending,
+                after=after,
+                limit=limit,
+            )
 
     def get_event(self, event_id):
         """
@@ -933,8 +2066,8 @@ class Database:
             A Row object.
 
         """
-        with self._connection:
-            return self._connection.execute(
+        with self._reader() as connection:
+            return connection.execute(
                 """
                 select e.id as id
                     , e.name as name
@@ -966,7 +2099,7 @@ class Database:
             The id of the event type as an integer.
 
         """
-        with self._connection:
+        with self._writer():
             if event_id:
                 data["id"] = event_id
                 self._connection.execute(
@@ -1000,8 +2133,537 @@ class Database:
                     """,
                     data,
                 ).lastrowid
+            self._record_change("events", (event_id,))
             return event_id
 
+    def get_event_attendance(self, event_id):
+        """
+        Get the attendance records for an event.
+
+        Args:
+            event_id: The ID of the event.
+
+        Returns:
+            A list of Row objects with id, person_id, and
+            guest_of_member_person_id columns, in the order that the people
+            were checked in.
+
+        """
+        with self._reader() as connection:
+            return connection.execute(
+                """
+                select id
+                    , person_id
+                    , guest_of_member_person_id
+                from people_event_attendance
+                where event_id = ?
+                order by id
+                """,
+                (event_id,),
+            ).fetchall()
+
+    def record_attendance(self, event_id, person_id,
+                          guest_of_member_person_id=None):
+        """
+        Record that a person attended an event. Does nothing if their
+        attendance has already been recorded. For recording attendance on
+        its own, such as when importing attendance lists. The check-in page
+        uses record_door_transaction() instead, even when nothing is paid, so
+        that every check-in it makes can be undone the same way.
+
+        Args:
+            event_id: The ID of the event.
+            person_id: The ID of the person.
+            guest_of_member_person_id: Optional ID of the member whose guest
+                the person was.
+
+        Returns:
+            The ID of the attendance record as an integer.
+
+        """
+        with self._writer():
+            attendance_id, _ = self._record_attendance(
+                event_id, person_id, guest_of_member_person_id,
+            )
+        return attendance_id
+
+    # Does the work of record_attendance(). Must be called from within a
+    # transaction.
+    #
+    # Args:
+    #   event_id: The ID of the event.
+    #   person_id: The ID of the person.
+    #   guest_of_member_person_id: ID of the member whose guest the person
+    #       was, or None.
+    #
+    # Returns:
+    #   An (attendance_id, created) tuple. attendance_id is the ID of the
+    #   attendance record as an integer, and created is True if the record
+    #   was inserted, or False if it already existed.
+    def _record_attendance(self, event_id, person_id,
+                           guest_of_member_person_id):
+        row = self._connection.execute(
+            """
+            select id
+            from people_event_attendance
+            where event_id = ?
+            and person_id = ?
+            """,
+            (event_id, person_id),
+        ).fetchone()
+        if row:
+            return row["id"], False
+        attendance_id = self._connection.execute(
+            """
+            insert into people_event_attendance (
+                person_id
+                , event_id
+                , guest_of_member_person_id
+            ) values (?, ?, ?)
+            """,
+            (person_id, event_id, guest_of_member_person_id),
+        ).lastrowid
+        self._record_change("people_event_attendance", (attendance_id,))
+        return attendance_id, True
+
+    def remove_attendance(self, event_id, person_id):
+        """
+        Remove the record of a person attending an event, such as when they
+        were checked in by mistake.
+
+        Args:
+            event_id: The ID of the event.
+            person_id: The ID of the person.
+
+        Returns:
+            True if a record was removed, or False if there wasn't one.
+
+        """
+        with self._writer() as connection:
+            ids = [row["id"] for row in connection.execute(
+                """
+                select id
+                from people_event_attendance
+                where event_id = ?
+                and person_id = ?
+                """,
+                (event_id, person_id),
+            )]
+            if not ids:
+                return False
+            connection.execute(
+                """
+                delete from people_event_attendance
+                where event_id = ?
+                and person_id = ?
+                """,
+                (event_id, person_id),
+            )
+            self._record_change("people_event_attendance", ids)
+            return True
+
+    def get_event_door_fees(self, event_id):
+        """
+        Get the door fees that members pay for an event, per membership type.
+        The fee for non-members is in the event's nonmember_door_fee column,
+        or the event type's default_nonmember_door_fee if that's null (see
+        get_event()).
+
+        Args:
+            event_id: The ID of the event.
+
+        Returns:
+            A list of Row objects with membership_type_id and fee columns.
+            Fees set for the event take the place of the event type's
+            defaults.
+
+        """
+        with self._reader() as connection:
+            return connection.execute(
+                """
+                select membership_type_id
+                    , fee
+                from events_door_fees
+                where event_id = :event_id
+                union all
+                select d.membership_type_id
+                    , d.fee
+                from events e
+                inner join event_types_default_door_fees d
+                on d.event_type_id = e.event_type_id
+                where e.id = :event_id
+                and d.membership_type_id not in (
+                    select membership_type_id
+                    from events_door_fees
+                    where event_id = :event_id
+                )
+                """,
+                {"event_id": event_id},
+            ).fetchall()
+
+    def get_person_memberships(self, person_id):
+        """
+        Get all of the memberships that a person has or had.
+
+        Args:
+            person_id: The ID of the person.
+
+        Returns:
+            A list of Row objects with id, membership_type_id,
+            membership_type_name, begin_date, and end_date columns, most
+            recent first. end_date is None for memberships that don't
+            expire.
+
+        """
+        with self._reader() as connection:
+            return connection.execute(
+                """
+                select m.id as id
+                    , m.membership_type_id as membership_type_id
+                    , t.name as membership_type_name
+                    , m.begin_date as begin_date
+                    , m.end_date as end_date
+                from people_memberships m
+                inner join membership_types t
+                on t.id = m.membership_type_id
+                where m.person_id = ?
+                order by m.begin_date desc
+                """,
+                (person_id,),
+            ).fetchall()
+
+    def record_door_transaction(self, event_id, person_id, door_fee=None,
+                                dues_payments=(),
+                                guest_of_member_person_id=None,
+                                date_time=None):
+        """
+        Record everything that happens when a person comes in the door, in a
+        single transaction: their attendance, and a payment covering their
+        door fee and any membership dues they paid. Each membership that dues
+        were paid on is extended to its new end date. Attendance is only
+        recorded once per person and event, as with record_attendance().
+
+        Args:
+            event_id: The ID of the event.
+            person_id: The ID of the person.
+            door_fee: Optional door fee paid, as a Decimal.
+            dues_payments: Optional sequence of dictionaries, one for each
+                membership dues payment, with membership_id, amount (a
+                Decimal), and new_end_date (a date object) keys. A payment
+                can also have an original_end_date key, for the end date
+                that new_end_date was worked out from. If the membership
+                doesn't end on that date by the time the payment is
+                recorded, such as because someone else renewed it in the
+                meantime, nothing is recorded.
+            guest_of_member_person_id: Optional ID of the member whose guest
+                the person was.
+            date_time: Optional datetime object of when the payment was made.
+                Defaults to now.
+
+        Returns:
+            A dictionary with the IDs of the records:
+                attendance_id: The attendance record.
+                attendance_created: True if the attendance record was
+                    created by this transaction, or False if the person's
+                    attendance had already been recorded.
+                payment_id: The payment, or None if nothing was paid.
+                door_fee_payment_id: The door fee payment, or None if no
+                    door fee was paid.
+                dues_payment_ids: List of the membership dues payments, in
+                    the same order as dues_payments.
+
+        Raises:
+            ValueError: If a membership doesn't exist, doesn't belong to the
+                person, doesn't expire, or doesn't end on a payment's
+                original_end_date.
+
+        """
+        if date_time is None:
+            date_time = datetime.datetime.now().replace(microsecond=0)
+        ids = {
+            "attendance_id": None,
+            "attendance_created": False,
+            "payment_id": None,
+            "door_fee_payment_id": None,
+            "dues_payment_ids": [],
+        }
+        with self._writer() as connection:
+            ids["attendance_id"], ids["attendance_created"] = (
+                self._record_attendance(event_id, person_id,
+                                        guest_of_member_person_id)
+            )
+            amounts = [payment["amount"] for payment in dues_payments]
+            if door_fee is not None:
+                amounts.append(door_fee)
+            if not amounts:
+                return ids
+
+            # Work out each membership's end dates before writing anything,
+            # in case one of them is invalid. Dues can be paid more than once
+            # on the same membership, in which case each payment extends it
+            # from where the last one left it.
+            memberships = {row["id"]: row for row in connection.execute(
+                """
+                select id
+                    , person_id
+                    , end_date
+                from people_memberships
+                where id in (select value from json_each(?))
+                """,
+                (json.dumps([payment["membership_id"]
+                             for payment in dues_payments]),),
+            )}
+            end_dates = {}
+            dues_rows = []
+            for payment in dues_payments:
+                membership_id = payment["membership_id"]
+                membership = memberships.get(membership_id)
+                if membership is None or membership["person_id"] != person_id:
+                    raise ValueError("Person {} has no membership {}"
+                                     .format(person_id, membership_id))
+                original_end_date = end_dates.get(membership_id,
+                                                  membership["end_date"])
+                if original_end_date is None:
+                    raise ValueError("Membership {} doesn't expire"
+                                     .format(membership_id))
+                expected_end_date = payment.get("original_end_date",
+                                                original_end_date)
+                if original_end_date != expected_end_date:
+                    raise ValueError(
+                        "Membership {} ends on {}, not {}".format(
+                            membership_id, original_end_date.isoformat(),
+                            expected_end_date.isoformat(),
+                        )
+                    )
+                end_dates[membership_id] = payment["new_end_date"]
+                dues_rows.append({
+                    "membership_id": membership_id,
+                    "original_end_date": original_end_date,
+                    "new_end_date": payment["new_end_date"],
+                })
+
+            payment_id = connection.execute(
+                """
+                insert into people_payments (
+                    person_id
+                    , date_time
+                    , at_event_id
+                ) values (?, ?, ?)
+                """,
+                (person_id, date_time, event_id),
+            ).lastrowid
+            ids["payment_id"] = payment_id
+            self._record_change("people_payments", (payment_id,))
+            # executemany() can't give us the id of each new row, and every
+            # item's id is needed below, so the items are inserted one at a
+            # time. There are only ever a few of them.
+            item_ids = [connection.execute(
+                """
+                insert into payments_items (
+                    payment_id
+                    , amount
+                ) values (?, ?)
+                """,
+                (payment_id, amount),
+            ).lastrowid for amount in amounts]
+            self._record_change("payments_items", item_ids)
+
+            if door_fee is not None:
+                ids["door_fee_payment_id"] = connection.execute(
+                    """
+                    insert into events_door_fee_payments (
+                        event_id
+                        , payment_item_id
+                    ) values (?, ?)
+                    """,
+                    (event_id, item_ids[-1]),
+                ).lastrowid
+                self._record_change("events_door_fee_payments",
+                                    (ids["door_fee_payment_id"],))
+            if dues_rows:
+                # The dues payments don't need their ids until afterwards, so
+                # they're inserted in one batch and their ids are read back
+                # in one query
+                for row, item_id in zip(dues_rows, item_ids):
+                    row["payment_item_id"] = item_id
+                connection.executemany(
+                    """
+                    insert into memberships_dues_payments (
+                        membership_id
+                        , payment_item_id
+                        , original_end_date
+                        , new_end_date
+                    ) values (
+                        :membership_id
+                        , :payment_item_id
+                        , :original_end_date
+                        , :new_end_date
+                    )
+                    """,
+                    dues_rows,
+                )
+                dues_ids = {row["payment_item_id"]: row["id"]
+                            for row in connection.execute(
+                                """
+                                select id
+                                    , payment_item_id
+                                from memberships_dues_payments
+                                where payment_item_id in (
+                                    select value from json_each(?)
+                                )
+                                """,
+                                (json.dumps(item_ids),),
+                            )}
+                ids["dues_payment_ids"] = [dues_ids[row["payment_item_id"]]
+                                           for row in dues_rows]
+                self._record_change("memberships_dues_payments",
+                                    ids["dues_payment_ids"])
+                connection.executemany(
+                    """
+                    update people_memberships
+                    set end_date = ?
+                    where id = ?
+                    """,
+                    [(end_date, membership_id)
+                     for membership_id, end_date in end_dates.items()],
+                )
+                self._record_change("people_memberships", end_dates)
+        return ids
+
+    def remove_door_transaction(self, transaction):
+        """
+        Undo a door transaction, such as when a person was checked in by
+        mistake. The payment and everything it covered are deleted, and any
+        memberships that dues were paid on are moved back to their original
+        end dates. The attendance record is only deleted if the transaction
+        created it, so that attendance recorded beforehand, such as at
+        another station, is kept.
+
+        Args:
+            transaction: The dictionary of IDs returned by
+                record_door_transaction().
+
+        """
+        with self._writer() as connection:
+            dues_payment_ids = json.dumps(transaction["dues_payment_ids"])
+            if transaction["dues_payment_ids"]:
+                # Newest first, so that a membership that was extended more
+                # than once ends up back at its earliest end date
+                end_dates = [(row["original_end_date"], row["membership_id"])
+                             for row in connection.execute(
+                                 """
+                                 select membership_id
+                                     , original_end_date
+                                 from memberships_dues_payments
+                                 where id in (select value from json_each(?))
+                                 order by id desc
+                                 """,
+                                 (dues_payment_ids,),
+                             )]
+                connection.executemany(
+                    """
+                    update people_memberships
+                    set end_date = ?
+                    where id = ?
+                    """,
+                    end_dates,
+                )
+                self._record_change("people_memberships",
+                                    (membership_id
+                                     for _, membership_id in end_dates))
+                connection.execute(
+                    """
+                    delete from memberships_dues_payments
+                    where id in (select value from json_each(?))
+                    """,
+                    (dues_payment_ids,),
+                )
+                self._record_change("memberships_dues_payments",
+                                    transaction["dues_payment_ids"])
+            if transaction["door_fee_payment_id"] is not None:
+                connection.execute(
+                    """
+                    delete from events_door_fee_payments
+                    where id = ?
+                    """,
+                    (transaction["door_fee_payment_id"],),
+                )
+                self._record_change("events_door_fee_payments",
+                                    (transaction["door_fee_payment_id"],))
+            if transaction["payment_id"] is not None:
+                item_ids = [row["id"] for row in connection.execute(
+                    """
+                    select id
+                    from payments_items
+                    where payment_id = ?
+                    """,
+                    (transaction["payment_id"],),
+                )]
+                connection.execute(
+                    """
+                    delete from payments_items
+                    where payment_id = ?
+                    """,
+                    (transaction["payment_id"],),
+                )
+                connection.execute(
+                    """
+                    delete from people_payments
+                    where id = ?
+                    """,
+                    (transaction["payment_id"],),
+                )
+                self._record_change("payments_items", item_ids)
+                self._record_change("people_payments",
+                                    (transaction["payment_id"],))
+            if transaction["attendance_created"]:
+                connection.execute(
+                    """
+                    delete from people_event_attendance
+                    where id = ?
+                    """,
+                    (transaction["attendance_id"],),
+                )
+                self._record_change("people_event_attendance",
+                                    (transaction["attendance_id"],))
+
+
+# Public Database methods that aren't worth instrumenting, or that would
+# interfere with the instrumentation if they were
+_uninstrumented_methods = {
+    "close",
+    "enable_instrumentation",
+    "disable_instrumentation",
+    "stats",
+    "set_trace_callback",
+    "get_sql_cache_stats",
+    "get_lookup_cache_stats",
+}
+
+# Numbers for naming the shared in-memory databases used in place of private
+# ones. See Database.__init__().
+_memory_database_numbers = itertools.count()
+
+
+def merge_changes(changes, other_changes):
+    """
+    Merge one set of database changes, as returned by Database.pop_changes(),
+    into another.
+
+    Args:
+        changes: The dictionary of changes to merge into. Modified in place.
+        other_changes: The dictionary of changes to merge from.
+
+    """
+    for table, ids in other_changes.items():
+        if table in changes:
+            if ids is None or changes[table] is None:
+                changes[table] = None
+            else:
+                changes[table] |= ids
+        else:
+            changes[table] = None if ids is None else set(ids)
+
 
 class Row(sqlite3.Row):
     """sqlite3.Row class with some extra methods."""
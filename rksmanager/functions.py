@@ -1,4 +1,6 @@
 """General-purpose utility functions."""
+import bisect
+import datetime
 
 
 def get_nested_attr(obj, name_string):
@@ -18,3 +20,95 @@ def get_nested_attr(obj, name_string):
     for name in names:
         obj = getattr(obj, name)
     return obj
+
+
+def get_stable_keys(old_keys, new_keys):
+    """
+    Find the largest set of keys that appear in both of two sequences in the
+    same relative order. When updating a list from old_keys to new_keys, these
+    are the items that can stay where they are, and every other item has to be
+    removed, inserted, or moved.
+
+    Args:
+        old_keys: Sequence of unique keys in the old order.
+        new_keys: Sequence of unique keys in the new order.
+
+    Returns:
+        A set of keys.
+
+    """
+    new_positions = {key: position for position, key in enumerate(new_keys)}
+    common = [(new_positions[key], key) for key in old_keys
+              if key in new_positions]
+    # Usually nothing has moved, so check for that before doing any real work
+    if all(a[0] < b[0] for a, b in zip(common, common[1:])):
+        return {key for _, key in common}
+    # Otherwise find the longest increasing subsequence of new positions.
+    # tails[n] is the index in common of the smallest position that ends an
+    # increasing subsequence of length n + 1, and previous links each item to
+    # the one before it in its subsequence.
+    tails = []
+    tail_positions = []
+    previous = [None] * len(common)
+    for index, (position, _) in enumerate(common):
+        length = bisect.bisect_left(tail_positions, position)
+        if length > 0:
+            previous[index] = tails[length - 1]
+        if length == len(tails):
+            tails.append(index)
+            tail_positions.append(position)
+        else:
+            tails[length] = index
+            tail_positions[length] = position
+    stable = set()
+    index = tails[-1] if tails else None
+    while index is not None:
+        stable.add(common[index][1])
+        index = previous[index]
+    return stable
+
+
+def get_consecutive_ranges(numbers):
+    """
+    Group a sequence of increasing integers into ranges of consecutive
+    integers.
+
+    Args:
+        numbers: Iterable of integers in increasing order.
+
+    Returns:
+        A list of (first, last) tuples, such as [(1, 3), (5, 5)] for the
+        numbers 1, 2, 3, and 5.
+
+    """
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
+
+
+def add_months(date, months):
+    """
+    Add a number of months to a date, moving it back to the end of the month
+    if the month is too short.
+
+    Args:
+        date: The date object.
+        months: Number of months to add.
+
+    Returns:
+        The new date object.
+
+    """
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    day = date.day
+    while True:
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            day -= 1
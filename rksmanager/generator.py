@@ -0,0 +1,749 @@
+"""
+Synthetic dataset generator. Fills a new database with made-up people,
+events, memberships, payments, attendance, RSVPs, conduct records, and so on,
+for reproducing performance problems that only show up with lots of data.
+Activity is skewed the way it is in a real group: most people only come to an
+event or two, while a few regulars come to nearly everything. The same
+arguments and seed always produce the same data.
+
+Run from the base project directory with:
+
+    python -m rksmanager.generator FILENAME [--people N] [--events N]
+        [--seed N] [--end-date YYYY-MM-DD]
+
+"""
+import sys
+import argparse
+import random
+import itertools
+import datetime
+import time
+from decimal import Decimal
+
+from .database import Database
+from .functions import add_months
+
+# Tables in the order that their rows are inserted in. Foreign keys aren't
+# checked until the end of each transaction, so the order is only for speed.
+# The people search index is rebuilt for a person whenever one of their
+# aliases, email addresses, or other contact info is inserted, which does
+# nothing if the person hasn't been inserted yet. Inserting those first means
+# that each person is only indexed once, when they're inserted.
+TABLE_ORDER = (
+    "event_types_default_door_fees",
+    "legal_document_types",
+    "new_guest_info_sheets_default_fields",
+    "people_aliases",
+    "people_email_addresses",
+    "people_other_contact_info",
+    "people",
+    "people_phone_numbers",
+    "people_membership_approval",
+    "people_memberships",
+    "events",
+    "events_door_fees",
+    "people_payments",
+    "payments_items",
+    "memberships_dues_payments",
+    "events_door_fee_payments",
+    "people_event_rsvps",
+    "people_event_attendance",
+    "events_new_guest_info_sheets",
+    "new_guest_info_sheets_data",
+    "people_legal_documents",
+    "people_incident_reports",
+    "people_incident_reports_involvement",
+    "people_warnings",
+    "people_sanctions",
+    "people_bans",
+)
+
+# Most popular first, since names are picked with a Zipf-like distribution
+FIRST_NAMES = (
+    "Alex", "Sam", "Jessica", "Chris", "Michael", "Sarah", "Jamie", "David",
+    "Ashley", "Taylor", "Matt", "Emily", "Jordan", "Kate", "Dan", "Rachel",
+    "Casey", "John", "Amanda", "Morgan", "Nick", "Lauren", "Riley", "Mike",
+    "Megan", "Robin", "Steve", "Nicole", "Jesse", "Andrew", "Heather",
+    "Charlie", "Ben", "Stephanie", "Avery", "Kevin", "Amber", "Quinn", "Josh",
+    "Brittany", "Dakota", "Eric", "Melissa", "Skyler", "Tom", "Danielle",
+    "Rowan", "Zoe", "Ezra", "Margaret",
+)
+ALIAS_WORDS = (
+    "Raven", "Kitten", "Pup", "Wolf", "Fox", "Bunny", "Sparrow", "Rope",
+    "Switch", "Velvet", "Ember", "Onyx", "Thorn", "Ivy", "Storm", "Jinx",
+    "Moth", "Lark", "Sable", "Echo", "Pixie", "Bear", "Otter", "Cinder",
+    "Wren", "Rook", "Vixen", "Hex", "Lace", "Nyx", "Kestrel", "Salem",
+)
+PRONOUNS = (("she/her", 42), ("he/him", 38), ("they/them", 12),
+            ("she/they", 4), ("he/they", 2), (None, 2))
+EMAIL_DOMAINS = (("gmail.com", 60), ("yahoo.com", 12), ("hotmail.com", 8),
+                 ("outlook.com", 7), ("protonmail.com", 6),
+                 ("rochester.rr.com", 4), ("example.org", 3))
+AREA_CODES = (("585", 88), ("716", 5), ("315", 4), ("607", 3))
+# Contact info type names and the fraction of people that have each one
+OTHER_CONTACT_INFO_TYPES = (("Fetlife", 0.6), ("Discord", 0.2),
+                            ("Telegram", 0.08), ("Twitter", 0.05))
+# Membership type names, their pricing options as (length_months, price)
+# tuples, and the share of members that have each one. Types without pricing
+# options never expire.
+MEMBERSHIP_TYPES = (
+    ("Bronze", ((1, "15.00"), (3, "40.00"), (12, "150.00")), 60),
+    ("Silver", ((1, "25.00"), (3, "70.00"), (12, "260.00")), 30),
+    ("Gold", ((1, "40.00"), (12, "420.00")), 8),
+    ("Honorary", (), 2),
+)
+# Relative popularity of the pricing options of a membership type, in the
+# same order as above
+PRICING_OPTION_WEIGHTS = (6, 3, 1)
+# Event type data, the share of events that are of each type, the mean
+# attendance, the fraction of attendees that RSVP, and the door fee for each
+# membership type
+EVENT_TYPES = (
+    ({"name": "Munch",
+      "default_start_time": datetime.time(19, 0),
+      "default_duration_minutes": 120,
+      "default_nonmember_door_fee": Decimal("0.00")},
+     50, 15, 0.0, {}),
+    ({"name": "Social",
+      "default_start_time": datetime.time(19, 30),
+      "default_duration_minutes": 240,
+      "default_nonmember_door_fee": Decimal("10.00")},
+     25, 35, 0.2, {"Bronze": "5.00", "Silver": "0.00", "Gold": "0.00",
+                   "Honorary": "0.00"}),
+    ({"name": "Workshop",
+      "default_start_time": datetime.time(18, 0),
+      "default_duration_minutes": 180,
+      "default_nonmember_door_fee": Decimal("15.00")},
+     15, 20, 0.7, {"Bronze": "5.00", "Silver": "5.00", "Gold": "0.00",
+                   "Honorary": "0.00"}),
+    ({"name": "Play Party",
+      "default_start_time": datetime.time(21, 0),
+      "default_duration_minutes": 300,
+      "default_nonmember_door_fee": Decimal("25.00")},
+     10, 60, 0.8, {"Bronze": "15.00", "Silver": "10.00", "Gold": "0.00",
+                   "Honorary": "0.00"}),
+)
+LEGAL_DOCUMENT_TYPES = ("Waiver", "NDA")
+# Fields on new guest info sheets, as (field_name, field_behavior) tuples
+GUEST_INFO_SHEET_FIELDS = (("Name", "first_name_or_nickname"),
+                           ("Pronouns", "pronouns"),
+                           ("Email address", "email_address"),
+                           ("How did you hear about us?", None))
+HEARD_ABOUT_US = ("Fetlife", "A friend", "Meetup", "Reddit", "Google")
+REPORTS = (
+    "Ignored a safeword during a scene.",
+    "Touched someone without asking first.",
+    "Was drunk and disruptive at the door.",
+    "Kept pressuring someone to play after they said no.",
+    "Took photos in the play space.",
+    "Shared someone's personal information without permission.",
+)
+NOTES = (
+    "Prefers to be contacted through Fetlife.",
+    "Volunteers at the door sometimes.",
+    "Presented a workshop on rope safety.",
+    "Has a service animal.",
+    "Asked not to be photographed.",
+)
+
+# Roughly how many events a group holds in a year, for working out how many
+# years the events should be spread over
+EVENTS_PER_YEAR = 150
+
+
+class DatasetGenerator:
+    """
+    Generates a synthetic dataset and writes it to a database. Rows are
+    buffered and written in large bulk insert transactions.
+
+    Args:
+        db: The Database object to write to. Must not have any people or
+            events in it yet.
+        people: Optional number of people to generate. Defaults to 1000.
+        events: Optional number of events to generate. Defaults to 100.
+        seed: Optional seed for the random number generator. Defaults to 0.
+        end_date: Optional date of the last day to generate events,
+            payments, and so on for. Defaults to today.
+        batch_size: Optional number of rows to buffer before writing them to
+            the database. Defaults to 50000.
+
+    """
+    def __init__(self, db, people=1000, events=100, seed=0, end_date=None,
+                 batch_size=50000):
+        if people < 1 or events < 1:
+            raise ValueError("Need at least one person and one event")
+        self.db = db
+        self.people = people
+        self.events = events
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.end_date = end_date or datetime.date.today()
+        years = max(events / EVENTS_PER_YEAR, 1)
+        self.start_date = self.end_date - datetime.timedelta(
+            days=int(years * 365),
+        )
+        # Table name -> list of rows waiting to be inserted
+        self._rows = {}
+        self._buffered = 0
+        # Table name -> number of rows generated
+        self._counts = {}
+        # Table name -> iterator of ids for new rows
+        self._ids = {}
+
+    def generate(self):
+        """
+        Generate the dataset and write it to the database.
+
+        Returns:
+            A dictionary mapping table names to the number of rows inserted
+            into them.
+
+        Raises:
+            ValueError: If the database already has people or events in it.
+
+        """
+        if self.db.get_people(limit=1) or self.db.get_events(limit=1):
+            raise ValueError("The database must be empty")
+        self._generate_lookups()
+        self._generate_people()
+        self._generate_memberships()
+        self._generate_events()
+        self._generate_conduct_records()
+        self._flush()
+        return dict(self._counts)
+
+    # Add a row to the buffer, writing the buffer to the database if it's
+    # full.
+    #
+    # Args:
+    #   table: Name of the table that the row belongs to.
+    #   row: Dictionary of column names and values, not including the id.
+    #       Every row for a table must have the same keys.
+    #
+    # Returns:
+    #   The id assigned to the row.
+    def _add(self, table, row):
+        ids = self._ids.get(table)
+        if ids is None:
+            ids = self._ids[table] = itertools.count(1)
+        row_id = row["id"] = next(ids)
+        self._rows.setdefault(table, []).append(row)
+        self._counts[table] = self._counts.get(table, 0) + 1
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self._flush()
+        return row_id
+
+    # Write all of the buffered rows to the database in one transaction.
+    def _flush(self):
+        self.db.bulk_insert([(table, self._rows[table])
+                             for table in TABLE_ORDER
+                             if self._rows.get(table)])
+        self._rows.clear()
+        self._buffered = 0
+
+    # Pick an item, with the odds of each given by a sequence of (item,
+    # weight) tuples.
+    def _weighted(self, choices):
+        items, weights = zip(*choices)
+        return self.random.choices(items, weights=weights)[0]
+
+    # Pick a random date between two dates, inclusive.
+    def _date_between(self, start, end):
+        days = (end - start).days
+        return start + datetime.timedelta(days=self.random.randint(0, days))
+
+    # Create the contact info types, membership types, event types, and other
+    # lookup table rows. The ones that the Database class can create are
+    # created through it, to save them from having to be kept in sync with
+    # the schema here.
+    def _generate_lookups(self):
+        db = self.db
+        self.contact_info_types = [
+            (db.create_other_contact_info_type(name), fraction)
+            for name, fraction in OTHER_CONTACT_INFO_TYPES
+        ]
+        # (membership_type_id, [(length_months, price)], weight) tuples
+        self.membership_types = []
+        membership_type_ids = {}
+        for name, pricing_options, weight in MEMBERSHIP_TYPES:
+            membership_type_id = db.create_membership_type(name)
+            membership_type_ids[name] = membership_type_id
+            for length_months, price in pricing_options:
+                db.save_membership_type_pricing_option({
+                    "membership_type_id": membership_type_id,
+                    "length_months": length_months,
+                    "price": Decimal(price),
+                })
+            self.membership_types.append(
+                (membership_type_id, pricing_options, weight)
+            )
+        # (event_type_id, data, weight, mean_attendance, rsvp_rate,
+        # {membership_type_id: fee}) tuples
+        self.event_types = []
+        for data, weight, attendance, rsvp_rate, fees in EVENT_TYPES:
+            event_type_id = db.save_event_type(dict(data))
+            member_fees = {}
+            for membership_type_name, fee in fees.items():
+                membership_type_id = membership_type_ids[membership_type_name]
+                member_fees[membership_type_id] = Decimal(fee)
+                self._add("event_types_default_door_fees", {
+                    "event_type_id": event_type_id,
+                    "membership_type_id": membership_type_id,
+                    "fee": Decimal(fee),
+                })
+            self.event_types.append((event_type_id, data, weight, attendance,
+                                     rsvp_rate, member_fees))
+        self.legal_document_type_ids = [
+            self._add("legal_document_types", {"document_type": name})
+            for name in LEGAL_DOCUMENT_TYPES
+        ]
+        for position, (field_name, field_behavior) in enumerate(
+                GUEST_INFO_SHEET_FIELDS):
+            self._add("new_guest_info_sheets_default_fields", {
+                "field_name": field_name,
+                "field_behavior": field_behavior,
+                "field_position": position,
+            })
+
+    # Generate people, along with their aliases, email addresses, phone
+    # numbers, and other contact info. Each person gets an activity level
+    # from a heavy-tailed distribution, which decides how likely they are to
+    # show up to events, become a member, and so on.
+    def _generate_people(self):
+        rand = self.random
+        name_weights = [1 / rank for rank in range(1, len(FIRST_NAMES) + 1)]
+        self.person_ids = []
+        self.activity = []
+        self.names = {}
+        for _ in range(self.people):
+            name = rand.choices(FIRST_NAMES, weights=name_weights)[0]
+            notes = rand.choice(NOTES) if rand.random() < 0.05 else None
+            person_id = self._add("people", {
+                "first_name_or_nickname": name,
+                "pronouns": self._weighted(PRONOUNS),
+                "notes": notes,
+            })
+            self.person_ids.append(person_id)
+            self.activity.append(rand.paretovariate(1.2))
+            self.names[person_id] = name
+
+            alias_count = rand.choices((0, 1, 2, 3),
+                                       weights=(50, 35, 12, 3))[0]
+            aliases = set()
+            while len(aliases) < alias_count:
+                alias = rand.choice(ALIAS_WORDS)
+                if rand.random() < 0.3:
+                    alias += str(rand.randint(1, 99))
+                aliases.add(alias)
+            for alias in sorted(aliases):
+                self._add("people_aliases", {"person_id": person_id,
+                                             "alias": alias})
+
+            # Including the person's id keeps the addresses unique
+            email_count = rand.choices((0, 1, 2), weights=(10, 75, 15))[0]
+            for number in range(email_count):
+                local_part = "{}{}".format(name.lower(), person_id)
+                if number:
+                    local_part += "." + str(number)
+                self._add("people_email_addresses", {
+                    "person_id": person_id,
+                    "email_address": "{}@{}".format(
+                        local_part, self._weighted(EMAIL_DOMAINS),
+                    ),
+                    "primary_email": True if number == 0 else None,
+                })
+
+            if rand.random() < 0.3:
+                # Multiplying by a prime scatters the numbers while keeping
+                # them unique for the first 8 million people
+                number = person_id * 7919 % 8000000
+                self._add("people_phone_numbers", {
+                    "person_id": person_id,
+                    "country_code": "1",
+                    "area_code": self._weighted(AREA_CODES),
+                    "prefix": str(200 + number // 10000),
+                    "line_number": "{:04}".format(number % 10000),
+                    "calls_okay": rand.choice((True, False, None)),
+                    "texts_okay": rand.choice((True, False, None)),
+                })
+
+            for contact_info_type_id, fraction in self.contact_info_types:
+                if rand.random() < fraction:
+                    self._add("people_other_contact_info", {
+                        "person_id": person_id,
+                        "other_contact_info_type_id": contact_info_type_id,
+                        "contact_info": "{}_{}".format(name.lower(),
+                                                       person_id),
+                    })
+
+        self.activity_cum_weights = list(
+            itertools.accumulate(self.activity)
+        )
+
+    # Generate membership approvals, memberships, and dues payments. The
+    # more active someone is, the more likely they are to be a member.
+    def _generate_memberships(self):
+        rand = self.random
+        # Person id -> list of (begin_date, end_date, membership_type_id)
+        # tuples. end_date is None for memberships that never expire.
+        self.memberships = {}
+        self.member_ids = []
+        type_choices = [(membership_type, weight)
+                        for *membership_type, weight in self.membership_types]
+        for person_id, activity in zip(self.person_ids, self.activity):
+            if rand.random() >= min(0.02 * activity, 0.8):
+                continue
+            self.member_ids.append(person_id)
+            approval_date = self._date_between(self.start_date,
+                                               self.end_date)
+            self._add("people_membership_approval", {
+                "person_id": person_id,
+                "approval_date": approval_date,
+            })
+            membership_type_id, pricing_options = self._weighted(type_choices)
+            begin_date = approval_date
+            if not pricing_options:
+                self._add("people_memberships", {
+                    "person_id": person_id,
+                    "membership_type_id": membership_type_id,
+                    "begin_date": begin_date,
+                    "end_date": None,
+                })
+                self.memberships[person_id] = [
+                    (begin_date, None, membership_type_id),
+                ]
+                continue
+            # Renew until the member lets it lapse or we run out of time,
+            # then maybe come back later
+            periods = []
+            while begin_date <= self.end_date:
+                dues_payments = []
+                end_date = begin_date
+                while end_date <= self.end_date:
+                    length_months, price = rand.choices(
+                        pricing_options,
+                        weights=PRICING_OPTION_WEIGHTS[:len(pricing_options)],
+                    )[0]
+                    new_end_date = add_months(end_date, length_months)
+                    dues_payments.append((end_date, new_end_date, price))
+                    end_date = new_end_date
+                    if rand.random() < 0.15:
+                        break
+                membership_id = self._add("people_memberships", {
+                    "person_id": person_id,
+                    "membership_type_id": membership_type_id,
+                    "begin_date": begin_date,
+                    "end_date": end_date,
+                })
+                for original_end_date, new_end_date, price in dues_payments:
+                    payment_time = datetime.datetime.combine(
+                        original_end_date,
+                        datetime.time(rand.randint(8, 22),
+                                      rand.randint(0, 59)),
+                    )
+                    payment_item_id = self._add_payment(
+                        person_id, payment_time, Decimal(price),
+                    )
+                    self._add("memberships_dues_payments", {
+                        "membership_id": membership_id,
+                        "payment_item_id": payment_item_id,
+                        "original_end_date": original_end_date,
+                        "new_end_date": new_end_date,
+                    })
+                periods.append((begin_date, end_date, membership_type_id))
+                if rand.random() < 0.7:
+                    break
+                begin_date = end_date + datetime.timedelta(
+                    days=rand.randint(30, 365),
+                )
+            self.memberships[person_id] = periods
+
+    # Add a payment with a single item.
+    #
+    # Args:
+    #   person_id: ID of the person making the payment.
+    #   date_time: When the payment was made.
+    #   amount: Amount paid, as a Decimal.
+    #   at_event_id: Optional ID of the event that the payment was made at.
+    #
+    # Returns:
+    #   The ID of the payment item.
+    def _add_payment(self, person_id, date_time, amount, at_event_id=None):
+        payment_id = self._add("people_payments", {
+            "person_id": person_id,
+            "date_time": date_time,
+            "at_event_id": at_event_id,
+        })
+        return self._add("payments_items", {
+            "payment_id": payment_id,
+            "amount": amount,
+        })
+
+    # Get the type of membership that a person had on a particular date.
+    #
+    # Returns:
+    #   The membership type ID, or None if they weren't a member.
+    def _membership_type_on(self, person_id, date):
+        for begin_date, end_date, membership_type_id in self.memberships.get(
+                person_id, ()):
+            if begin_date <= date and (end_date is None or date < end_date):
+                return membership_type_id
+        return None
+
+    # Pick distinct people, with more active people more likely to be picked.
+    #
+    # Args:
+    #   count: Number of people to pick.
+    #
+    # Returns:
+    #   A list of person IDs. May be shorter than count if there aren't
+    #   enough people.
+    def _pick_people(self, count):
+        count = min(count, len(self.person_ids))
+        picked = {}
+        # Popular people get picked over and over, so give up eventually
+        # rather than looping forever on small datasets
+        for _ in range(10):
+            for person_id in self.random.choices(
+                    self.person_ids,
+                    cum_weights=self.activity_cum_weights,
+                    k=count - len(picked)):
+                picked[person_id] = None
+            if len(picked) >= count:
+                break
+        return list(picked)[:count]
+
+    # Generate events, along with their attendance, RSVPs, door fee
+    # payments, and the info sheets and waivers of first-time guests.
+    def _generate_events(self):
+        rand = self.random
+        type_choices = [(event_type, event_type[2])
+                        for event_type in self.event_types]
+        dates = sorted(self._date_between(self.start_date, self.end_date)
+                       for _ in range(self.events))
+        # People who have been to an event already
+        seen = set()
+        waiver_type_id = self.legal_document_type_ids[0]
+        for date in dates:
+            (event_type_id, data, _, mean_attendance, rsvp_rate,
+             member_fees) = self._weighted(type_choices)
+            begin = datetime.datetime.combine(date,
+                                              data["default_start_time"])
+            end = begin + datetime.timedelta(
+                minutes=data["default_duration_minutes"],
+            )
+            nonmember_fee = data["default_nonmember_door_fee"]
+            event_nonmember_fee = None
+            if nonmember_fee and rand.random() < 0.05:
+                event_nonmember_fee = nonmember_fee + 5
+                nonmember_fee = event_nonmember_fee
+            event_id = self._add("events", {
+                "event_type_id": event_type_id,
+                "name": "{} {:%B} {}, {}".format(data["name"], date,
+                                                 date.day, date.year),
+                "begin_date_time": begin,
+                "end_date_time": end,
+                "nonmember_door_fee": event_nonmember_fee,
+            })
+
+            attendance = max(int(rand.lognormvariate(0, 0.5)
+                                 * mean_attendance), 1)
+            attendees = self._pick_people(attendance)
+            member_types = {person_id: self._membership_type_on(person_id,
+                                                                date)
+                            for person_id in attendees}
+            members = [person_id for person_id in attendees
+                       if member_types[person_id]]
+            no_shows = [
+                person_id
+                for person_id in self._pick_people(
+                    int(attendance * rsvp_rate * 0.2)
+                )
+                if person_id not in member_types
+            ]
+            for person_id in attendees + no_shows:
+                is_attendee = person_id in member_types
+                if is_attendee and rand.random() >= rsvp_rate:
+                    continue
+                self._add("people_event_rsvps", {
+                    "person_id": person_id,
+                    "event_id": event_id,
+                    "rsvp_received_date": date - datetime.timedelta(
+                        days=rand.randint(0, 14),
+                    ),
+                    "guest_of_member_person_id": None,
+                })
+
+            for person_id in attendees:
+                membership_type_id = member_types[person_id]
+                guest_of = None
+                if membership_type_id:
+                    fee = member_fees.get(membership_type_id, nonmember_fee)
+                else:
+                    fee = nonmember_fee
+                    if members and rand.random() < 0.1:
+                        guest_of = rand.choice(members)
+                self._add("people_event_attendance", {
+                    "person_id": person_id,
+                    "event_id": event_id,
+                    "guest_of_member_person_id": guest_of,
+                })
+                if fee:
+                    payment_time = begin + datetime.timedelta(
+                        minutes=rand.randint(0, 60),
+                    )
+                    payment_item_id = self._add_payment(
+                        person_id, payment_time, fee, event_id,
+                    )
+                    self._add("events_door_fee_payments", {
+                        "event_id": event_id,
+                        "payment_item_id": payment_item_id,
+                    })
+                if person_id not in seen:
+                    seen.add(person_id)
+                    self._add_guest_info_sheet(event_id, person_id)
+                    self._add("people_legal_documents", {
+                        "person_id": person_id,
+                        "document_type_id": waiver_type_id,
+                        "signed_date": date,
+                        "notes": None,
+                    })
+
+    # Add the info sheet that a person filled out at their first event.
+    def _add_guest_info_sheet(self, event_id, person_id):
+        info_sheet_id = self._add("events_new_guest_info_sheets", {
+            "event_id": event_id,
+            "person_id": person_id,
+        })
+        values = {
+            "first_name_or_nickname": self.names[person_id],
+            "pronouns": self._weighted(PRONOUNS),
+            "email_address": "{}{}@{}".format(
+                self.names[person_id].lower(), person_id,
+                self._weighted(EMAIL_DOMAINS),
+            ),
+            None: self.random.choice(HEARD_ABOUT_US),
+        }
+        for position, (field_name, field_behavior) in enumerate(
+                GUEST_INFO_SHEET_FIELDS):
+            self._add("new_guest_info_sheets_data", {
+                "info_sheet_id": info_sheet_id,
+                "field_name": field_name,
+                "field_data": values[field_behavior],
+                "field_behavior": field_behavior,
+                "field_position": position,
+            })
+
+    # Generate incident reports, warnings, sanctions, and bans. These are
+    # rare, and mostly involve the people who are around the most.
+    def _generate_conduct_records(self):
+        rand = self.random
+        report_count = max(self.events // 50 + self.people // 1000, 1)
+        for _ in range(report_count):
+            people = self._pick_people(rand.randint(2, 3))
+            if len(people) < 2:
+                break
+            reporter_id, *involved_ids = people
+            incident_date = self._date_between(self.start_date,
+                                               self.end_date)
+            report_id = self._add("people_incident_reports", {
+                "reporter_person_id": reporter_id,
+                "incident_date": incident_date,
+                "reported_date": incident_date + datetime.timedelta(
+                    days=rand.randint(0, 14),
+                ),
+                "report": rand.choice(REPORTS),
+            })
+            for involved_id in involved_ids:
+                self._add("people_incident_reports_involvement", {
+                    "report_id": report_id,
+                    "involved_person_id": involved_id,
+                })
+        for person_id in self._pick_people(max(self.people // 200, 1)):
+            self._add("people_warnings", {
+                "person_id": person_id,
+                "warning_date": self._date_between(self.start_date,
+                                                   self.end_date),
+                "notes": rand.choice(REPORTS),
+            })
+        for person_id in self._pick_people(self.people // 1000):
+            begin_date = self._date_between(self.start_date, self.end_date)
+            self._add("people_sanctions", {
+                "person_id": person_id,
+                "begin_date": begin_date,
+                "end_date": begin_date + datetime.timedelta(
+                    days=rand.choice((30, 90, 180)),
+                ),
+                "notes": rand.choice(REPORTS),
+            })
+        for person_id in self._pick_people(self.people // 500):
+            begin_date = self._date_between(self.start_date, self.end_date)
+            end_date = None
+            if rand.random() < 0.7:
+                end_date = begin_date + datetime.timedelta(
+                    days=rand.choice((180, 365, 730)),
+                )
+            self._add("people_bans", {
+                "person_id": person_id,
+                "begin_date": begin_date,
+                "end_date": end_date,
+                "notes": rand.choice(REPORTS),
+            })
+
+
+def main(argv=None):
+    """
+    Generate a synthetic dataset in a new database file and print how many
+    rows were generated.
+
+    Args:
+        argv: Optional list of command line arguments. Defaults to
+            sys.argv[1:].
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m rksmanager.generator",
+        description="Fill a new database with synthetic data.",
+    )
+    parser.add_argument("filename", help="database file to create")
+    parser.add_argument("--people", type=int, default=1000,
+                        help="number of people (default: %(default)s)")
+    parser.add_argument("--events", type=int, default=100,
+                        help="number of events (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default: %(default)s)")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat,
+                        help="date of the last day of data, as YYYY-MM-DD"
+                             " (default: today)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    db = Database(args.filename)
+    try:
+        generator = DatasetGenerator(db,
+                                     people=args.people,
+                                     events=args.events,
+                                     seed=args.seed,
+                                     end_date=args.end_date)
+        counts = generator.generate()
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        db.close()
+    seconds = time.perf_counter() - start
+    for table in TABLE_ORDER:
+        if counts.get(table):
+            print("{:>10} {}".format(counts[table], table))
+    print("{} rows generated in {:.1f} seconds.".format(
+        sum(counts.values()), seconds,
+    ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,13 +7,15 @@ import traceback
 import sys
 
 from PySide2.QtWidgets import QApplication, QMainWindow, QAction
-from PySide2.QtCore import Signal
+from PySide2.QtCore import Signal, QTimer
 
 import rksmanager.database
+from ..restrictions import RestrictionIndex
 from . import dialogboxes
 from .widgets import TabHolder
-from .pages import (PersonList, PersonCreator, ContactInfoTypeList,
-                    MembershipTypeList, EventTypeList, EventCreator, EventList)
+from .workers import DatabaseExecutor
+# The pages module is imported the first time a page is opened, rather than
+# here, so that it doesn't slow down startup. See _create_or_focus_page().
 
 
 class Gui(QApplication):
@@ -22,15 +24,54 @@ class Gui(QApplication):
     # Argument will be True if the database is now open, or False if it is now
     # closed.
     database_is_open = Signal(bool)
-    # TODO: Make this more granular if performance becomes an issue
-    database_modified = Signal()
+    # Argument will be a dictionary of the tables and rows that were changed,
+    # in the format returned by Database.pop_changes()
+    database_modified = Signal(object)
+    # Argument will be a set of the IDs of the people whose bans or sanctions
+    # were changed. Emitted after the restrictions attribute has been updated.
+    restrictions_changed = Signal(object)
+    # How often to checkpoint the database's write-ahead log
+    checkpoint_interval_ms = 5 * 60 * 1000
+    # How often to check whether another program has changed the database
+    poll_interval_ms = 1000
 
     def __init__(self):
         self.db = None
+        self.db_filename = None
+        # Runs database queries in a background thread. Only exists while a
+        # database is open.
+        self.db_executor = None
+        # Index of everyone's bans and sanctions, for flagging restricted
+        # people in lists without querying the database for each one. Only
+        # exists while a database is open.
+        self.restrictions = None
         super().__init__()
+        # Connected before any page is, so that the index is up to date by
+        # the time the pages hear about the changes
+        self.database_modified.connect(self._update_restrictions)
+        self._checkpoint_timer = QTimer(self)
+        self._checkpoint_timer.setInterval(self.checkpoint_interval_ms)
+        self._checkpoint_timer.timeout.connect(self.checkpoint_database)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(self.poll_interval_ms)
+        self._poll_timer.timeout.connect(self.poll_database)
 
     def start(self):
         """Display the main window and pass control to the Gui object."""
+        self.build_main_window()
+        if len(sys.argv) > 1:
+            self.create_or_open_database(sys.argv[1])
+        self.exec_()
+        # Make sure the background thread is stopped before we exit
+        self.close_database()
+
+    def build_main_window(self):
+        """
+        Build and display the main window, without passing control to the Gui
+        object. Called by start(), or by code that drives the GUI itself, such
+        as the GUI benchmarks.
+
+        """
         main_window = QMainWindow()
         self.main_window = main_window
         self._build_menu_bar(main_window)
@@ -39,9 +80,6 @@ class Gui(QApplication):
         main_window.setCentralWidget(tab_holder)
         main_window.setGeometry(0, 0, 1000, 700)
         main_window.show()
-        if len(sys.argv) > 1:
-            self.create_or_open_database(sys.argv[1])
-        self.exec_()
 
     # Build the menu bar and add it to the specified window
     def _build_menu_bar(self, window):
@@ -61,6 +99,16 @@ class Gui(QApplication):
             menu.addAction(action)
             return action
 
+        # Convenience function for creating slots that open pages.
+        #
+        # Args:
+        #   class_name: Name of the page's class in the pages module.
+        #
+        # Returns:
+        #   A function that opens the page when called.
+        def open_page(class_name):
+            return lambda: self._create_or_focus_page(class_name)
+
         menu_bar = window.menuBar()
         file_menu = menu_bar.addMenu("File")
 
@@ -87,22 +135,22 @@ class Gui(QApplication):
 
         add_action(text="Create New Person Record...",
                    menu=people_menu,
-                   triggered=lambda: PersonCreator.create_or_focus(gui=self))
+                   triggered=open_page("PersonCreator"))
         add_action(text="View People",
                    menu=people_menu,
-                   triggered=lambda: PersonList.create_or_focus(gui=self))
+                   triggered=open_page("PersonList"))
 
         people_menu.addSeparator()
 
         add_action(
             text="Manage Contact Info Types",
             menu=people_menu,
-            triggered=lambda: ContactInfoTypeList.create_or_focus(gui=self),
+            triggered=open_page("ContactInfoTypeList"),
         )
         add_action(
             text="Manage Membership Types",
             menu=people_menu,
-            triggered=lambda: MembershipTypeList.create_or_focus(gui=self),
+            triggered=open_page("MembershipTypeList"),
         )
 
         events_menu = menu_bar.addMenu("Events")
@@ -111,16 +159,34 @@ class Gui(QApplication):
 
         add_action(text="Create Event...",
                    menu=events_menu,
-                   triggered=lambda: EventCreator.create_or_focus(gui=self))
+                   triggered=open_page("EventCreator"))
         add_action(text="View Events",
                    menu=events_menu,
-                   triggered=lambda: EventList.create_or_focus(gui=self))
+                   triggered=open_page("EventList"))
 
         events_menu.addSeparator()
 
         add_action(text="Manage Event Types",
                    menu=events_menu,
-                   triggered=lambda: EventTypeList.create_or_focus(gui=self))
+                   triggered=open_page("EventTypeList"))
+
+        # The diagnostics page isn't in any menu, but can be opened with a
+        # keyboard shortcut
+        diagnostics_action = QAction(parent=window)
+        diagnostics_action.setShortcut("Ctrl+Shift+D")
+        diagnostics_action.triggered.connect(open_page("Diagnostics"))
+        diagnostics_action.setEnabled(False)
+        self.database_is_open.connect(diagnostics_action.setEnabled)
+        window.addAction(diagnostics_action)
+
+    # Open a page in a new tab, or switch to its tab if it's already open.
+    # Imports the pages module if no page has been opened yet.
+    #
+    # Args:
+    #   class_name: Name of the page's class in the pages module.
+    def _create_or_focus_page(self, class_name):
+        from . import pages
+        getattr(pages, class_name).create_or_focus(gui=self)
 
     def create_or_open_database(self, filename=None):
         """
@@ -139,6 +205,7 @@ class Gui(QApplication):
         if filename:
             self.close_database()
             self.db = rksmanager.database.Database(filename)
+            self.db_filename = filename
             self.database_is_open.emit(True)
             version = self.db.get_sqlite_user_version()
             if version < self.db.expected_sqlite_user_version:
@@ -148,11 +215,8 @@ class Gui(QApplication):
                         self.db.apply_migrations()
                         success = True
                     except Exception as e:
-                        traceback.print_exception(
-                            etype=type(e),
-                            value=e,
-                            tb=e.__traceback__,
-                        )
+                        traceback.print_exception(type(e), e,
+                                                  e.__traceback__)
                     if success:
                         dialogboxes.convert_database_success_dialog(window)
                     else:
@@ -165,6 +229,68 @@ class Gui(QApplication):
             elif version > self.db.expected_sqlite_user_version:
                 self.close_database()
                 dialogboxes.old_software_dialog(window)
+            if self.db:
+                self.restrictions = RestrictionIndex(
+                    self.db.get_restrictions()
+                )
+                self.db_executor = DatabaseExecutor(self.db)
+                self._checkpoint_timer.start()
+                self._poll_timer.start()
+
+    def report_database_changes(self):
+        """
+        Emit the database_modified signal for any changes made to the database
+        since the last time this was called. Should be called after saving
+        anything to the database.
+
+        """
+        if self.db:
+            changes = self.db.pop_changes()
+            if changes:
+                self.database_modified.emit(changes)
+
+    # Update the restrictions index with any changes to bans and sanctions,
+    # fetching only the ones that changed, and emit the restrictions_changed
+    # signal if anyone's restrictions changed. Connected to the
+    # database_modified signal.
+    #
+    # Args:
+    #   changes: Dictionary of changed tables and rows, in the format
+    #       returned by Database.pop_changes().
+    def _update_restrictions(self, changes):
+        if self.restrictions is None:
+            return
+        if "people_bans" not in changes and "people_sanctions" not in changes:
+            return
+        ban_ids = changes.get("people_bans", ())
+        sanction_ids = changes.get("people_sanctions", ())
+        rows = self.db.get_restrictions(ban_ids, sanction_ids)
+        person_ids = self.restrictions.update(rows, ban_ids, sanction_ids)
+        if person_ids:
+            self.restrictions_changed.emit(person_ids)
+
+    def poll_database(self):
+        """
+        Emit the database_modified signal if another program (such as another
+        copy of RKS Manager) has changed the database. Called periodically
+        while a database is open.
+
+        """
+        if self.db:
+            changes = self.db.poll_external_changes()
+            if changes:
+                self.database_modified.emit(changes)
+
+    def checkpoint_database(self):
+        """
+        Checkpoint the database's write-ahead log in the background thread,
+        without waiting for any readers or writers. Called periodically while
+        a database is open.
+
+        """
+        if self.db_executor:
+            self.db_executor.submit(lambda db: db.checkpoint(),
+                                    lambda result: None)
 
     def close_database(self):
         """
@@ -174,6 +300,13 @@ class Gui(QApplication):
         """
         if self.db:
             self.tab_holder.close_all_tabs()
+            self._checkpoint_timer.stop()
+            self._poll_timer.stop()
+            if self.db_executor:
+                self.db_executor.shutdown()
+                self.db_executor = None
             self.db.close()
             self.db = None
+            self.restrictions = None
+            self.db_filename = None
             self.database_is_open.emit(False)
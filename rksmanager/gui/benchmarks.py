@@ -0,0 +1,757 @@
+"""
+Benchmark suite for the GUI. Drives the Gui object, the tab holder, and the
+page classes against generated datasets, without showing anything on screen,
+and measures how long it takes to open and populate pages, sort lists, set
+the values of list editing widgets, and refresh open tabs after the database
+is modified. Also times how long run.py takes to start up and first paint
+the main window, and records the peak memory usage of the process. Results use
+the same format as the Database benchmarks (see rksmanager.benchmarks), so
+they can be saved and compared against a baseline in the same way.
+
+Run from the base project directory with:
+
+    python -m rksmanager.gui.benchmarks [--sizes small medium large]
+        [--tabs N] [--startup-runs N] [--output results.json]
+        [--baseline benchmarks/gui-baseline.json]
+
+benchmarks/gui-baseline.json holds reference results for the small and medium
+datasets. As with the Database benchmarks, timings depend on the machine, so
+compare against results made on the same machine where possible.
+
+The offscreen Qt platform is used unless the QT_QPA_PLATFORM environment
+variable says otherwise.
+
+"""
+import os
+import sys
+import re
+import json
+import time
+import shutil
+import pathlib
+import platform
+import argparse
+import datetime
+import itertools
+import random
+import sqlite3
+import tempfile
+import subprocess
+
+from PySide2.QtWidgets import QWidget, QLabel
+from PySide2.QtCore import (Qt, QObject, QEvent, QEventLoop, QModelIndex,
+                            QTimer)
+
+from ..benchmarks import (DATASETS, END_DATE, get_dataset,
+                          summarize_latencies, format_result, compare_results)
+from . import Gui
+from .widgets import ListEdit, GridLayout
+from .pages import (PersonList, PersonDetails, PersonEditor, EventList,
+                    EventCheckIn)
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+SEARCH_QUERIES = ("al", "sam", "raven", "jessica gmail", "fox", "michael9",
+                  "fetlife rope")
+# Number of seconds to wait for a page to finish reloading in the background
+# before giving up
+WAIT_TIMEOUT = 60
+# Run in a new Python process by measure_startup(), with the path of run.py
+# and its arguments as arguments
+STARTUP_SCRIPT = """
+import sys
+import runpy
+import rksmanager.gui.benchmarks
+rksmanager.gui.benchmarks.quit_after_first_paint()
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+# Printed by the startup script's process when the GUI is first painted
+FIRST_PAINT_MARKER = "first paint"
+
+
+def get_peak_memory_mb():
+    """
+    Get the peak memory usage (resident set size) of this process so far.
+
+    Returns:
+        The peak memory usage in megabytes, or None if it isn't available on
+        this platform.
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, and kilobytes everywhere else
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class _FirstPaintFilter(QObject):
+    """
+    Event filter that prints FIRST_PAINT_MARKER and quits the application
+    once any widget has been painted. Installed on the application by
+    quit_after_first_paint().
+
+    """
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.painted = False
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and not self.painted:
+            self.painted = True
+            print(FIRST_PAINT_MARKER, flush=True)
+            # Let the paint finish first
+            QTimer.singleShot(0, self.parent().quit)
+        return False
+
+
+def quit_after_first_paint():
+    """
+    Make every Gui object created from now on quit its event loop as soon as
+    its main window has been painted. Used by measure_startup() to time how
+    long the GUI takes to start up.
+
+    """
+    build_main_window = Gui.build_main_window
+
+    def build_and_watch(gui):
+        gui.installEventFilter(_FirstPaintFilter(gui))
+        build_main_window(gui)
+    Gui.build_main_window = build_and_watch
+
+
+def measure_startup(database=None, runs=5, new_database=False):
+    """
+    Time how long it takes from starting run.py in a new Python process to
+    the GUI being painted for the first time.
+
+    Args:
+        database: Optional database file for run.py to open.
+        runs: Optional number of times to start the GUI. Defaults to 5.
+        new_database: Optional flag to delete the database file before each
+            run, so that the time includes creating it. Defaults to False.
+
+    Returns:
+        A list of startup times in seconds.
+
+    Raises:
+        RuntimeError: If the GUI quits without being painted.
+
+    """
+    base_project_dir = pathlib.Path(__file__).resolve().parents[2]
+    command = [sys.executable, "-c", STARTUP_SCRIPT,
+               str(base_project_dir / "run.py")]
+    if database:
+        command.append(str(database))
+    latencies = []
+    for _ in range(runs):
+        if new_database:
+            for suffix in ("", "-wal", "-shm"):
+                path = pathlib.Path(str(database) + suffix)
+                if path.exists():
+                    path.unlink()
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=str(base_project_dir),
+                                   stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        painted = None
+        for line in process.stdout:
+            if line.strip() == FIRST_PAINT_MARKER and painted is None:
+                painted = time.perf_counter()
+        process.wait()
+        if painted is None:
+            raise RuntimeError("GUI exited with status {} without being"
+                               " painted".format(process.returncode))
+        latencies.append(painted - start)
+    return latencies
+
+
+class GuiBenchmarks:
+    """
+    Runs the GUI benchmarks against a Gui object. Each benchmark is a
+    bench_<name>() method that returns a list of latencies in seconds.
+
+    Args:
+        gui: The Gui object. Its main window must already be built, and it
+            must have a database open.
+        people: Number of people in the database.
+        events: Number of events in the database.
+        seed: Optional seed for picking people, search queries, and so on.
+            Defaults to 0.
+        min_time: Optional number of seconds to spend on each benchmark.
+            Defaults to 1.
+        tabs: Optional number of person details tabs to have open for the
+            refresh benchmarks. Defaults to 20.
+
+    """
+    min_calls = 5
+    max_calls = 200
+
+    def __init__(self, gui, people, events, seed=0, min_time=1.0, tabs=20):
+        self.gui = gui
+        self.people = people
+        self.events = events
+        self.random = random.Random(seed)
+        self.min_time = min_time
+        self.tabs = tabs
+
+    def get_benchmarks(self):
+        """
+        Get the names of the benchmarks, in the order they should be run.
+
+        Returns:
+            A list of (name, method) tuples.
+
+        """
+        return [
+            ("open_person_list", self.bench_open_person_list),
+            ("person_list_fetch_more", self.bench_person_list_fetch_more),
+            ("search_people", self.bench_search_people),
+            ("sort_person_list", self.bench_sort_person_list),
+            ("open_event_list", self.bench_open_event_list),
+            ("sort_event_list", self.bench_sort_event_list),
+            ("open_person_details", self.bench_open_person_details),
+            ("open_person_editor", self.bench_open_person_editor),
+            ("check_in", self.bench_check_in),
+            ("list_edit_value[10]",
+             lambda: self.bench_list_edit_value(10)),
+            ("list_edit_value[100]",
+             lambda: self.bench_list_edit_value(100)),
+            ("grid_layout_insert_row[10]",
+             lambda: self.bench_grid_layout_insert_row(10)),
+            ("grid_layout_insert_row[1000]",
+             lambda: self.bench_grid_layout_insert_row(1000)),
+            ("grid_layout_find_rows_below[10]",
+             lambda: self.bench_grid_layout_find_rows_below(10)),
+            ("grid_layout_find_rows_below[1000]",
+             lambda: self.bench_grid_layout_find_rows_below(1000)),
+            ("refresh_current_tab[{}]".format(self.tabs),
+             self.bench_refresh_current_tab),
+            ("refresh_all_tabs[{}]".format(self.tabs),
+             self.bench_refresh_all_tabs),
+        ]
+
+    # Call a function over and over and measure how long each call takes.
+    #
+    # Args:
+    #   function: Function with no arguments to time. Should process any
+    #       events that it causes, so that the time includes updating the
+    #       widgets.
+    #   setup: Optional function with no arguments to call before each call
+    #       of the function, without timing it.
+    #
+    # Returns:
+    #   A list of latencies in seconds.
+    def _repeat(self, function, setup=None):
+        latencies = []
+        started = time.perf_counter()
+        while len(latencies) < self.max_calls and (
+                len(latencies) < self.min_calls
+                or time.perf_counter() - started < self.min_time):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            function()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    # Process all pending events, including deleting widgets that have been
+    # scheduled for deletion, which normally only happens once control
+    # returns to the event loop.
+    def _process_events(self):
+        self.gui.processEvents()
+        self.gui.sendPostedEvents(None, QEvent.DeferredDelete)
+
+    # Process events until the current tab's page has finished reloading.
+    #
+    # Raises:
+    #   TimeoutError: If it takes longer than WAIT_TIMEOUT seconds.
+    def _wait_for_current_tab(self):
+        tab_holder = self.gui.tab_holder
+        deadline = time.perf_counter() + WAIT_TIMEOUT
+        self._process_events()
+        while True:
+            page = tab_holder.currentWidget()
+            if page is None or not (tab_holder.is_stale(page)
+                                    or page.loading):
+                break
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Timed out waiting for {} to reload"
+                                   .format(type(page).__name__))
+            self.gui.processEvents(QEventLoop.WaitForMoreEvents)
+        self._process_events()
+
+    # Close all tabs, and delete their pages right away.
+    def _close_all_tabs(self):
+        self.gui.tab_holder.close_all_tabs()
+        self._process_events()
+
+    # Pick a random person ID.
+    def _person_id(self):
+        return self.random.randint(1, self.people)
+
+    def bench_open_person_list(self):
+        """Time opening the people tab and showing the first page of rows."""
+        def open_person_list():
+            PersonList.create_or_focus(self.gui)
+            self._process_events()
+        return self._repeat(open_person_list, setup=self._close_all_tabs)
+
+    def bench_person_list_fetch_more(self):
+        """Time loading another page of rows as the people list scrolls."""
+        parent = QModelIndex()
+
+        def setup():
+            page = PersonList.create_or_focus(self.gui)
+            if not page._model.canFetchMore(parent):
+                self._close_all_tabs()
+                PersonList.create_or_focus(self.gui)
+            self._process_events()
+
+        def fetch_more():
+            self.gui.tab_holder.currentWidget()._model.fetchMore(parent)
+            self._process_events()
+        return self._repeat(fetch_more, setup=setup)
+
+    def bench_search_people(self):
+        """Time searching from the people tab and showing the results."""
+        self._close_all_tabs()
+        page = PersonList.create_or_focus(self.gui)
+        queries = itertools.cycle(SEARCH_QUERIES)
+
+        def search():
+            page.search_box.setText(next(queries))
+            self._wait_for_current_tab()
+        latencies = self._repeat(search)
+        page.search_box.setText("")
+        self._wait_for_current_tab()
+        return latencies
+
+    # Time sorting a list page by each of its columns in turn, in both
+    # directions.
+    #
+    # Args:
+    #   page_class: The class of the list page.
+    #
+    # Returns:
+    #   A list of latencies in seconds.
+    def _bench_sort(self, page_class):
+        self._close_all_tabs()
+        page = page_class.create_or_focus(self.gui)
+        self._process_events()
+        sorts = itertools.cycle(itertools.product(
+            range(len(page._model.headers)),
+            (Qt.DescendingOrder, Qt.AscendingOrder),
+        ))
+
+        def sort():
+            page.table_view.sortByColumn(*next(sorts))
+            self._process_events()
+        return self._repeat(sort)
+
+    def bench_sort_person_list(self):
+        """Time sorting the people tab."""
+        return self._bench_sort(PersonList)
+
+    def bench_open_event_list(self):
+        """Time opening the events tab, which shows every event."""
+        def open_event_list():
+            EventList.create_or_focus(self.gui)
+            self._process_events()
+        return self._repeat(open_event_list, setup=self._close_all_tabs)
+
+    def bench_sort_event_list(self):
+        """Time sorting the events tab."""
+        return self._bench_sort(EventList)
+
+    def bench_open_person_details(self):
+        """Time opening a person details tab."""
+        def open_person_details():
+            PersonDetails.create_or_focus(self.gui, self._person_id())
+            self._process_events()
+        return self._repeat(open_person_details, setup=self._close_all_tabs)
+
+    def bench_open_person_editor(self):
+        """Time opening a person editor tab."""
+        def open_person_editor():
+            PersonEditor.create_or_focus(self.gui, self._person_id())
+            self._process_events()
+        return self._repeat(open_person_editor, setup=self._close_all_tabs)
+
+    def bench_check_in(self):
+        """
+        Time finding and checking in people one after another on an event's
+        check-in page, the way a volunteer would at the door: typing a
+        person's name and the part of their email address before the @ into
+        the search box, pressing Enter to pick them, then pressing Enter
+        again to take the door fee that's filled in.
+
+        """
+        self._close_all_tabs()
+        page = EventCheckIn.create_or_focus(self.gui,
+                                            self.random.randint(1,
+                                                                self.events))
+        self._wait_for_current_tab()
+        queries = []
+
+        def pick_person():
+            person = self.gui.db.get_person(self._person_id())
+            emails = person["email_addresses"]
+            queries.append("{} {}".format(
+                person["first_name_or_nickname"],
+                emails[0].split("@")[0] if emails else "",
+            ))
+
+        def check_in():
+            page.search_box.setText(queries.pop())
+            page.pick_person()
+            page.check_in()
+            self._process_events()
+        latencies = self._repeat(check_in, setup=pick_person)
+        self._close_all_tabs()
+        return latencies
+
+    def bench_list_edit_value(self, count):
+        """
+        Time setting the value of a ListEdit, alternating between two lists
+        of strings so that every item changes each time.
+
+        Args:
+            count: Number of strings in each list.
+
+        """
+        list_edit = ListEdit()
+        values = itertools.cycle((
+            ["Alias {}".format(number) for number in range(count)],
+            ["Other alias {}".format(number) for number in range(count)],
+        ))
+
+        def set_value():
+            list_edit.value = next(values)
+            self._process_events()
+        latencies = self._repeat(set_value)
+        list_edit.deleteLater()
+        self._process_events()
+        return latencies
+
+    def bench_grid_layout_insert_row(self, count):
+        """
+        Time inserting a row of widgets into a GridLayout just above its last
+        row, then removing it again, including the layout pass that follows.
+        Only the widgets in the last row are moved, but the time still grows
+        with the size of the grid, since QGridLayout searches its whole item
+        list for each widget that's removed, and lays out every item. See
+        bench_grid_layout_find_rows_below() for GridLayout's own part.
+
+        Args:
+            count: Number of rows already in the grid.
+
+        """
+        widget, layout = self._make_grid_layout(count)
+
+        def insert_and_remove_row():
+            layout.insert_row(count, ((QLabel("New"), 0, 1),
+                                      (QLabel("New"), 1, 1)))
+            for removed in layout.remove_row(count):
+                removed.deleteLater()
+            self._process_events()
+        latencies = self._repeat(insert_and_remove_row)
+        widget.deleteLater()
+        self._process_events()
+        return latencies
+
+    def bench_grid_layout_find_rows_below(self, count):
+        """
+        Time looking up the widgets below a GridLayout's second to last row,
+        as insert_row() does to find the widgets that it has to move. This
+        is the part of inserting a row that GridLayout's row index is
+        responsible for, and should take about the same time whatever the
+        size of the grid.
+
+        Args:
+            count: Number of rows in the grid, not counting the last one.
+
+        """
+        widget, layout = self._make_grid_layout(count)
+        num_rows, num_columns = layout.rowCount(), layout.columnCount()
+        latencies = self._repeat(
+            lambda: layout.get_widget_coordinates_in_rect(
+                count, 0, num_rows - count, num_columns,
+            )
+        )
+        widget.deleteLater()
+        self._process_events()
+        return latencies
+
+    # Make a GridLayout with two labels in each row, on a widget that isn't
+    # shown.
+    #
+    # Args:
+    #   count: Number of rows, not counting the last one.
+    #
+    # Returns:
+    #   A (widget, layout) tuple. The widget has to be kept, or the layout
+    #   is deleted along with it.
+    def _make_grid_layout(self, count):
+        widget = QWidget()
+        layout = GridLayout()
+        widget.setLayout(layout)
+        for row in range(count + 1):
+            layout.addWidget(QLabel(str(row)), row, 0)
+            layout.addWidget(QLabel(str(row)), row, 1)
+        return widget, layout
+
+    # Open the person list, the event list, and the number of person details
+    # tabs set by the tabs attribute, with the person list as the current
+    # tab.
+    #
+    # Returns:
+    #   A list of the IDs of the people whose details are open.
+    def _open_tabs(self):
+        self._close_all_tabs()
+        person_ids = self.random.sample(range(1, self.people + 1),
+                                        min(self.tabs, self.people))
+        person_list = PersonList.create_or_focus(self.gui)
+        EventList.create_or_focus(self.gui)
+        for person_id in person_ids:
+            PersonDetails.create_or_focus(self.gui, person_id)
+        self.gui.tab_holder.setCurrentWidget(person_list)
+        self._wait_for_current_tab()
+        return person_ids
+
+    def bench_refresh_current_tab(self):
+        """
+        Time how long it takes for the current tab to be refreshed after one
+        of the open people is saved, with the other tabs open in the
+        background. The save is simulated by emitting the database_modified
+        signal, so that the database doesn't change between runs.
+
+        """
+        person_ids = self._open_tabs()
+
+        def refresh():
+            self.gui.database_modified.emit({
+                "people": {self.random.choice(person_ids)},
+                "people_email_addresses": None,
+            })
+            self._wait_for_current_tab()
+        return self._repeat(refresh)
+
+    def bench_refresh_all_tabs(self):
+        """
+        Time how long it takes to switch through every open tab after
+        something has changed that they all depend on, waiting for each one
+        to refresh.
+
+        """
+        self._open_tabs()
+        tab_holder = self.gui.tab_holder
+
+        def refresh_all():
+            for index in range(tab_holder.count()):
+                tab_holder.setCurrentIndex(index)
+                self._wait_for_current_tab()
+
+        def setup():
+            tab_holder.setCurrentIndex(0)
+            self._wait_for_current_tab()
+            self.gui.database_modified.emit({"people": None})
+            self._process_events()
+        return self._repeat(refresh_all, setup=setup)
+
+
+def run_benchmarks(gui, sizes, seed=0, end_date=END_DATE, data_dir=None,
+                   pattern=None, min_time=1.0, tabs=20, startup_runs=5,
+                   report=print):
+    """
+    Run the GUI benchmarks against each dataset size. Each size gets a fresh
+    copy of its dataset. The startup time is measured with each dataset, and
+    also without a database and with a new one, under the "empty" size name.
+
+    Args:
+        gui: The Gui object. Its main window must already be built. Any
+            database that it has open will be closed.
+        sizes: Sequence of dataset size names. See
+            rksmanager.benchmarks.DATASETS.
+        seed: Optional seed for the generator and the benchmarks. Defaults
+            to 0.
+        end_date: Optional end date for the generator. Defaults to
+            rksmanager.benchmarks.END_DATE.
+        data_dir: Optional directory to keep generated datasets in. If
+            unspecified, they're generated in a temporary directory and
+            thrown away.
+        pattern: Optional regular expression. Only benchmarks with names
+            that it matches are run.
+        min_time: Optional number of seconds to spend on each benchmark.
+            Defaults to 1.
+        tabs: Optional number of person details tabs to have open for the
+            refresh benchmarks. Defaults to 20.
+        startup_runs: Optional number of times to start the GUI for each
+            startup benchmark. Defaults to 5.
+        report: Optional function to call with a line of text as each
+            benchmark finishes. Defaults to print.
+
+    Returns:
+        A (results, memory) tuple. results is a dictionary mapping size names
+        to dictionaries mapping benchmark names to the results returned by
+        rksmanager.benchmarks.summarize_latencies(). memory is a dictionary
+        mapping size names to dictionaries mapping benchmark names to the
+        peak memory usage of this process in megabytes, as of the end of the
+        benchmark. The startup benchmarks run in other processes, so they're
+        left out of it.
+
+    """
+    results = {}
+    memory = {}
+
+    # Record the result of a startup benchmark, unless the pattern excludes
+    # it.
+    #
+    # Args:
+    #   size: Name of the dataset size to record it under.
+    #   name: Name of the benchmark.
+    #   kwargs: Arguments for measure_startup().
+    def startup(size, name, **kwargs):
+        if pattern and not re.search(pattern, name):
+            return
+        result = summarize_latencies(measure_startup(runs=startup_runs,
+                                                     **kwargs))
+        results.setdefault(size, {})[name] = result
+        report(format_result(size, name, result))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        startup("empty", "startup")
+        startup("empty", "startup[new database]",
+                database=pathlib.Path(temp_dir) / "new.rksm",
+                new_database=True)
+        for size in sizes:
+            dataset = get_dataset(size, seed, end_date, data_dir or temp_dir)
+            copy = pathlib.Path(temp_dir) / "benchmark.rksm"
+            shutil.copyfile(dataset, copy)
+            people, events = DATASETS[size]
+            results[size] = {}
+            memory[size] = {}
+            startup(size, "startup", database=copy)
+            gui.create_or_open_database(str(copy))
+            try:
+                benchmarks = GuiBenchmarks(gui, people, events, seed=seed,
+                                           min_time=min_time, tabs=tabs)
+                for name, method in benchmarks.get_benchmarks():
+                    if pattern and not re.search(pattern, name):
+                        continue
+                    result = summarize_latencies(method())
+                    results[size][name] = result
+                    memory[size][name] = get_peak_memory_mb()
+                    report(format_result(size, name, result))
+            finally:
+                gui.close_database()
+                gui.sendPostedEvents(None, QEvent.DeferredDelete)
+            copy.unlink()
+    return results, memory
+
+
+def main(argv=None):
+    """
+    Run the GUI benchmarks, print the results, and optionally save them and
+    compare them against a baseline.
+
+    Args:
+        argv: Optional list of command line arguments. Defaults to
+            sys.argv[1:].
+
+    Returns:
+        The exit status as an integer. 1 if any benchmarks regressed.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m rksmanager.gui.benchmarks",
+        description="Benchmark the GUI.",
+    )
+    parser.add_argument("--sizes", nargs="+", choices=DATASETS,
+                        default=list(DATASETS),
+                        help="dataset sizes to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default: %(default)s)")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat,
+                        default=END_DATE,
+                        help="end date of the generated data, as YYYY-MM-DD"
+                             " (default: %(default)s)")
+    parser.add_argument("--data-dir",
+                        help="directory to keep generated datasets in")
+    parser.add_argument("--match", metavar="REGEX",
+                        help="only run benchmarks whose names match")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="seconds to spend on each benchmark"
+                             " (default: %(default)s)")
+    parser.add_argument("--tabs", type=int, default=20,
+                        help="person details tabs to keep open for the"
+                             " refresh benchmarks (default: %(default)s)")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="times to start the GUI for each startup"
+                             " benchmark (default: %(default)s)")
+    parser.add_argument("--output", help="file to save the results to")
+    parser.add_argument("--baseline",
+                        help="file of earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fraction that median latency has to go up by"
+                             " to count as a regression"
+                             " (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    # Has to be set before the QApplication is created
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    gui = Gui()
+    gui.build_main_window()
+    try:
+        results, memory = run_benchmarks(gui,
+                                         sizes=args.sizes,
+                                         seed=args.seed,
+                                         end_date=args.end_date,
+                                         data_dir=args.data_dir,
+                                         pattern=args.match,
+                                         min_time=args.min_time,
+                                         tabs=args.tabs,
+                                         startup_runs=args.startup_runs)
+    finally:
+        gui.main_window.close()
+    print("Peak memory usage: {} MB".format(
+        "unknown" if get_peak_memory_mb() is None
+        else "{:.1f}".format(get_peak_memory_mb())
+    ))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "created": datetime.datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "qt_platform": os.environ["QT_QPA_PLATFORM"],
+                "seed": args.seed,
+                "end_date": args.end_date.isoformat(),
+                "tabs": args.tabs,
+                "results": results,
+                "peak_memory_mb": memory,
+            }, output, indent=2)
+    problems = []
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            problems = compare_results(results,
+                                       json.load(baseline)["results"],
+                                       threshold=args.threshold)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print("{} regression(s) found.".format(len(problems)))
+        return 1
+    print("No regressions found.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,14 +5,18 @@ of a specific record, or editing a record. Smaller "control" widgets go in the
 gui.widgets module.
 
 """
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 import functools
 import sys
 import datetime
 
 from PySide2.QtWidgets import (QWidget, QFormLayout, QHBoxLayout, QPushButton,
-                               QTableView, QVBoxLayout, QAbstractItemView)
-from PySide2.QtCore import Qt, QAbstractTableModel, QSortFilterProxyModel
+                               QTableView, QVBoxLayout, QAbstractItemView,
+                               QLineEdit, QCheckBox, QSpinBox, QLabel,
+                               QPlainTextEdit, QComboBox)
+from PySide2.QtCore import (Qt, QAbstractTableModel, QSortFilterProxyModel,
+                            QModelIndex, QEvent)
+from PySide2.QtGui import QColor
 
 from .widgets import (Label, LineEdit, TextEdit, ListLabel, ListEdit,
                       PrimaryItemListLabel, PrimaryItemListEdit, ComboListEdit,
@@ -20,6 +24,10 @@ from .widgets import (Label, LineEdit, TextEdit, ListLabel, ListEdit,
                       DateTimeLabel, ComboBox, LineEditWithSuggest,
                       DateTimeEditWithSuggest)
 from . import dialogboxes
+from ..functions import get_stable_keys, get_consecutive_ranges, add_months
+from ..database import merge_changes
+from ..prefixindex import PrefixIndex
+from ..restrictions import describe
 
 
 class BasePage(QWidget):
@@ -34,12 +42,22 @@ class BasePage(QWidget):
 
         tab_name_fmt = "Person Details ({id:d}: {first_name_or_nickname})"
 
-    Subclasses can define a load() method with no arguments, which will be
-    called when the page is initialized and whenever the Gui.database_modified
-    signal is emitted. Alternatively, the loader attribute can be set to the
-    name of a Database method to use instead. If a data_id argument is passed
-    to this on initialization, it will be passed to the Database method as the
-    first argument.
+    If the loader attribute is set to the name of a Database method, it will
+    be used to set the page's data set when the page is initialized, and again
+    in a background thread whenever the database is modified. Reloads of
+    pages in tabs that aren't being shown are put off until the tab is
+    switched to. If a data_id argument is passed to this on initialization, it
+    will be passed to the Database method as the first argument. Subclasses
+    that need more than one Database method to build their data set can
+    override the fetch() method, or load() and reload() for full control.
+
+    If the depends_on attribute is set to a tuple of table names, the page will
+    only be reloaded when one of those tables is modified. If the data_table
+    attribute is also set, changes to that table will only reload the page if
+    they affect the row whose ID is data_id.
+
+        depends_on = ("events", "event_types")
+        data_table = "events"
 
     If the default_data attribute is set, it will be used as an initial data
     set for the page before the load() method is called.
@@ -50,10 +68,17 @@ class BasePage(QWidget):
     when the database changes.
 
     """
+    depends_on = None
+    data_table = None
+
     def __init__(self, gui, data_id=None):
         super().__init__()
         self.gui = gui
         self.data_id = data_id
+        # Incremented every time a background load starts, so that we can tell
+        # whether a result is from the latest one
+        self._load_generation = 0
+        self._loading = False
 
         # Python is picky about when we're allowed to set an attribute to a
         # class reference, so we may have to use class names instead. This loop
@@ -71,20 +96,71 @@ class BasePage(QWidget):
         self.load_extra()
         if hasattr(self, "default_data"):
             self.data = self.default_data
+        # The initial load isn't done in the background, since the tab name
+        # depends on the data set
         self.load()
-        gui.database_modified.connect(self.load)
+        gui.database_modified.connect(self.database_modified)
+
+    def database_modified(self, changes):
+        """
+        Mark the page as stale if it depends on any of the changed tables and
+        rows, so that the tab holder will reload it when it's next shown.
+        Called whenever the Gui.database_modified signal is emitted.
+
+        Args:
+            changes: Dictionary of changed tables and rows, in the format
+                returned by Database.pop_changes().
+
+        """
+        if self.depends_on is None:
+            self.gui.tab_holder.mark_stale(self)
+            return
+        for table in self.depends_on:
+            if table not in changes:
+                continue
+            ids = changes[table]
+            if (table != self.data_table or not self.data_id or ids is None
+                    or self.data_id in ids):
+                self.gui.tab_holder.mark_stale(self)
+                return
+
+    def fetch(self, db):
+        """
+        Get this page's data set using the Database method named by the loader
+        attribute. May be called from a background thread, so overriding
+        methods mustn't touch any widgets.
+
+        Args:
+            db: The Database object to use.
+
+        Returns:
+            The data set.
+
+        """
+        db_method = getattr(db, self.loader)
+        if self.data_id:
+            return db_method(self.data_id)
+        else:
+            return db_method()
 
     def load(self):
         """
-        If the loader attribute is set, use the corresponding Database method
-        to set this page's data.
+        If the loader attribute is set, set this page's data using the fetch()
+        method, without using the background thread.
 
         """
         if hasattr(self, "loader"):
-            db_method = getattr(self.gui.db, self.loader)
-            if self.data_id:
-                db_method = functools.partial(db_method, self.data_id)
-            self.data = db_method()
+            self.data = self.fetch(self.gui.db)
+
+    def reload(self):
+        """
+        If the loader attribute is set, set this page's data using the fetch()
+        method in the background thread. Called by the tab holder when the
+        page is stale and being shown.
+
+        """
+        if hasattr(self, "loader"):
+            self.run_in_background(self.fetch, self._set_data)
 
     def load_extra(self):
         """
@@ -99,6 +175,66 @@ class BasePage(QWidget):
             else:
                 self.extra_data = db_extra_method()
 
+    # Callback for setting the data set from a background thread's result.
+    #
+    # Args:
+    #   data: The new data set.
+    def _set_data(self, data):
+        self.data = data
+
+    def run_in_background(self, function, callback):
+        """
+        Run a function against the database in the background thread, then
+        pass its result to a callback. The page is shown as loading until the
+        result arrives. If this is called again before then, the earlier
+        result will be thrown away when it arrives, so that stale data doesn't
+        overwrite newer data. If the background thread isn't available, the
+        function is run right away instead.
+
+        Args:
+            function: Function that takes a Database object and returns a
+                result. Runs in a background thread, so it mustn't touch any
+                widgets.
+            callback: Function that takes the result. Called in the GUI
+                thread.
+
+        """
+        self._load_generation += 1
+        generation = self._load_generation
+        executor = self.gui.db_executor
+        if executor is None:
+            callback(function(self.gui.db))
+            return
+
+        def finished(result):
+            if generation == self._load_generation:
+                self.loading = False
+                callback(result)
+
+        def failed(exception):
+            if generation == self._load_generation:
+                self.loading = False
+
+        self.loading = True
+        executor.submit(function, finished, failed, owner=self)
+
+    @property
+    def loading(self):
+        """
+        Whether the page is waiting for data from the background thread. While
+        it is, a busy cursor is shown over the page.
+
+        """
+        return self._loading
+
+    @loading.setter
+    def loading(self, loading):
+        self._loading = loading
+        if loading:
+            self.setCursor(Qt.BusyCursor)
+        else:
+            self.unsetCursor()
+
     @classmethod
     def create_or_focus(cls, gui, data_id=None, replace_tab=None):
         """
@@ -323,26 +459,378 @@ class BaseListModel(QAbstractTableModel):
 
     headers = ("ID", "Name", "Email Address", "Pronouns", "Notes")
 
+    Models for large data sets can set the page_size attribute to load their
+    data a page at a time as the user scrolls, instead of all at once. Paged
+    models must also set the columns attribute to a tuple of the data set's
+    column names, in the same order as headers, and get their data from a
+    Database method that accepts order_by, descending, after, and limit
+    arguments (see Database.get_people()). Sorting a paged model re-queries
+    the database in the new order. For example:
+
+    columns = ("id", "first_name_or_nickname", "email_address", "pronouns",
+               "notes")
+    page_size = 200
+
+    When a model is given a new data set, it's compared to the old one and only
+    the rows that were added, removed, or changed are updated in the view, so
+    that refreshing a large list is cheap and the user's selection and scroll
+    position are kept. Rows are matched up by the key returned by the row_key()
+    method, which is the ID column by default.
+
+    Subclasses should set the formatters attribute to a tuple of formatter
+    names, one for each column. Each name refers to a format_<name>() method,
+    which converts a value to the text that will be displayed and the key that
+    the column will be sorted by. Values are formatted once when they're loaded
+    rather than every time they're painted or compared. Columns without a
+    formatter are formatted according to the type of each value. For example:
+
+    formatters = ("number", "text", "time", "decimal")
+
     """
     time_format = "%l:%M %p"
     datetime_format = "%Y-%m-%d %l:%M %p"
+    page_size = None
+    formatters = ()
+    # Role for the sort keys produced by the formatters. The proxy model sorts
+    # by this role rather than by the display text.
+    sort_role = Qt.UserRole
 
     def __init__(self):
         self.dataset = []
+        self._formatters = []
+        for column in range(len(self.headers)):
+            if column < len(self.formatters):
+                name = self.formatters[column]
+            else:
+                name = "value"
+            self._formatters.append(getattr(self, "format_" + name))
+        # Display values and sort keys, one list per column, each parallel to
+        # dataset. See _splice().
+        self._display = [[] for _ in self._formatters]
+        self._sort_keys = [[] for _ in self._formatters]
+        # Paging state. See set_fetcher().
+        self._fetcher = None
+        self._fetched_all = True
+        self._order_by = None
+        self._descending = False
+        # Incremented whenever a paged model's data set is replaced
+        self.generation = 0
         super().__init__()
 
+    def row_key(self, row):
+        """
+        Get the value that identifies a row, for matching up rows when the data
+        set is replaced. Must be unique within the data set.
+
+        Args:
+            row: The row.
+
+        Returns:
+            The row's ID. Subclasses whose first column isn't unique should
+            override this.
+
+        """
+        return row[0]
+
     def populate(self, data):
         """
-        Assign a new data set to this model.
+        Assign a new data set to this model, updating only the rows that have
+        changed.
 
         Args:
             data: The data set as a 2-dimensional list or similar.
 
         """
-        self.dataset = data
-        # For some reason this causes segmentation faults, so we'll just let
-        # the list widget call the proxy model's invalidate() method instead
-        # self.layoutChanged.emit()
+        data = list(data)
+        old_keys = [self.row_key(row) for row in self.dataset]
+        new_keys = [self.row_key(row) for row in data]
+        if (not self.dataset
+                or len(set(old_keys)) < len(old_keys)
+                or len(set(new_keys)) < len(new_keys)):
+            # Nothing to keep, or we can't tell which rows are which
+            self.beginResetModel()
+            self._splice(0, len(self.dataset), data)
+            self.endResetModel()
+            return
+        stable_keys = get_stable_keys(old_keys, new_keys)
+
+        # Remove the rows that are gone or have moved, starting from the bottom
+        # so that the row numbers of the ones we haven't removed yet don't
+        # change
+        parent = QModelIndex()
+        for first, last in reversed(get_consecutive_ranges(
+                index for index, key in enumerate(old_keys)
+                if key not in stable_keys)):
+            self.beginRemoveRows(parent, first, last)
+            self._splice(first, last + 1, ())
+            self.endRemoveRows()
+
+        # Now every remaining row is in the right order, so insert the new and
+        # moved rows in between them, and update any that have changed
+        changed = []
+        index = 0
+        while index < len(data):
+            if new_keys[index] in stable_keys:
+                if tuple(self.dataset[index]) != tuple(data[index]):
+                    self._splice(index, index + 1, data[index:index + 1])
+                    changed.append(index)
+                index += 1
+                continue
+            end = index + 1
+            while end < len(data) and new_keys[end] not in stable_keys:
+                end += 1
+            self.beginInsertRows(parent, index, end - 1)
+            self._splice(index, index, data[index:end])
+            self.endInsertRows()
+            index = end
+        last_column = self.columnCount(parent) - 1
+        for first, last in get_consecutive_ranges(changed):
+            self.dataChanged.emit(self.index(first, 0),
+                                  self.index(last, last_column))
+
+    # Replace a slice of the data set with new rows, formatting them for
+    # display and sorting. All changes to the data set go through this, so
+    # that the formatted columns stay in step with it.
+    #
+    # Args:
+    #   start: Index of the first row to replace.
+    #   stop: Index after the last row to replace. Same as start to insert
+    #       rows without replacing any.
+    #   rows: Sequence of new rows.
+    def _splice(self, start, stop, rows):
+        self.dataset[start:stop] = rows
+        for column, formatter in enumerate(self._formatters):
+            formatted = [formatter(row[column]) for row in rows]
+            self._display[column][start:stop] = [display
+                                                 for display, _ in formatted]
+            self._sort_keys[column][start:stop] = [key for _, key in formatted]
+
+    def format_value(self, value):
+        """
+        Format a value according to its type, using one of the other
+        format_*() methods.
+
+        Args:
+            value: The value to format.
+
+        Returns:
+            A (display value, sort key) tuple.
+
+        """
+        if isinstance(value, Decimal):
+            return self.format_decimal(value)
+        if isinstance(value, datetime.datetime):
+            return self.format_datetime(value)
+        if isinstance(value, datetime.time):
+            return self.format_time(value)
+        if isinstance(value, (int, float)):
+            return self.format_number(value)
+        return self.format_text(value)
+
+    def format_text(self, value):
+        """
+        Format a text value. Sorts alphabetically, with empty values first.
+
+        Args:
+            value: The value to format.
+
+        Returns:
+            A (display value, sort key) tuple.
+
+        """
+        if value is None:
+            return None, ""
+        return value, str(value)
+
+    def format_number(self, value):
+        """
+        Format an integer or other number. Sorts numerically, with empty
+        values (or anything else that isn't a number) first.
+
+        Args:
+            value: The value to format.
+
+        Returns:
+            A (display value, sort key) tuple.
+
+        """
+        if isinstance(value, (int, float, Decimal)):
+            return value, float(value)
+        return value, float("-inf")
+
+    def format_decimal(self, value):
+        """
+        Format a Decimal value, such as a price. QTableView won't display
+        Decimal objects, so it's displayed as text. Sorts numerically, with
+        empty values first.
+
+        Args:
+            value: The value to format.
+
+        Returns:
+            A (display value, sort key) tuple.
+
+        """
+        if value is None:
+            return None, float("-inf")
+        return str(value), float(value)
+
+    def format_time(self, value):
+        """
+        Format a time of day using the time_format attribute. Sorts
+        chronologically, with empty values first.
+
+        Args:
+            value: The value to format.
+
+        Returns:
+            A (display value, sort key) tuple.
+
+        """
+        if value is None:
+            return None, ""
+        return value.strftime(self.time_format), value.isoformat()
+
+    def format_datetime(self, value):
+        """
+        Format a date and time using the datetime_format attribute. Sorts
+        chronologically, with empty values first.
+
+        Args:
+            value: The value to format.
+
+        Returns:
+            A (display value, sort key) tuple.
+
+        """
+        if value is None:
+            return None, ""
+        return value.strftime(self.datetime_format), value.isoformat()
+
+    def set_fetcher(self, fetcher):
+        """
+        Put a paged model's data set under the control of a Database method,
+        and load the first page. If the model already has rows loaded, the same
+        number of rows will be reloaded instead.
+
+        Args:
+            fetcher: A Database method (or partial) that accepts order_by,
+                descending, after, and limit keyword arguments.
+
+        """
+        arguments = self.reload_arguments()
+        self.reloaded(fetcher(**arguments), arguments, fetcher)
+
+    def reload_arguments(self):
+        """
+        Get the arguments to pass to a paged model's fetcher to reload the rows
+        that the model currently has loaded.
+
+        Returns:
+            A dictionary of keyword arguments.
+
+        """
+        return {"order_by": self._order_by,
+                "descending": self._descending,
+                "after": None,
+                "limit": max(self.page_size, len(self.dataset))}
+
+    def reloaded(self, rows, arguments, fetcher):
+        """
+        Replace a paged model's data set with freshly fetched rows.
+
+        Args:
+            rows: The rows returned by the fetcher.
+            arguments: The arguments that the fetcher was called with, from
+                reload_arguments().
+            fetcher: The Database method (or partial) to fetch any further
+                pages with. Must belong to the GUI thread's Database object.
+
+        """
+        self._fetcher = fetcher
+        self._fetched_all = len(rows) < arguments["limit"]
+        self.generation += 1
+        self.populate(rows)
+
+    # Replace the whole data set, resetting any views of the model. Cheaper
+    # than populate() when the rows are all in a new order anyway.
+    #
+    # Args:
+    #   rows: The new data set.
+    def _replace_dataset(self, rows):
+        self.generation += 1
+        self.beginResetModel()
+        self._splice(0, len(self.dataset), list(rows))
+        self.endResetModel()
+
+    # Get rows from the fetcher in the model's current sort order.
+    #
+    # Args:
+    #   after: The last row that's already been loaded, or None.
+    #   limit: The maximum number of rows to get.
+    #
+    # Returns:
+    #   A list of rows.
+    def _fetch(self, after, limit):
+        return self._fetcher(order_by=self._order_by,
+                             descending=self._descending,
+                             after=after,
+                             limit=limit)
+
+    def canFetchMore(self, parent):
+        if parent.isValid() or self._fetcher is None:
+            return False
+        return not self._fetched_all
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        rows = self._fetch(after=self.dataset[-1] if self.dataset else None,
+                           limit=self.page_size)
+        self._fetched_all = len(rows) < self.page_size
+        if rows:
+            first = len(self.dataset)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._splice(first, first, rows)
+            self.endInsertRows()
+
+    def show_rows(self, rows):
+        """
+        Take a paged model out of paged mode and display a fixed set of rows
+        instead, such as search results. Calling set_fetcher() will put it back
+        in paged mode.
+
+        Args:
+            rows: The rows to display.
+
+        """
+        self._fetcher = None
+        self._fetched_all = True
+        self._replace_dataset(rows)
+
+    def sort(self, column, order):
+        """
+        Sort a paged model by re-querying the database in the new order.
+        Non-paged models are sorted by the proxy model instead, so this does
+        nothing for them.
+
+        """
+        if not self.page_size:
+            return
+        self._order_by = self.columns[column]
+        self._descending = order == Qt.DescendingOrder
+        if self._fetcher is not None:
+            rows = self._fetch(after=None, limit=self.page_size)
+            self._fetched_all = len(rows) < self.page_size
+        else:
+            # Showing a fixed set of rows (see show_rows()), which are all
+            # loaded already, so we can just sort them here by their sort keys
+            sort_keys = self._sort_keys[column]
+            order = sorted(range(len(self.dataset)),
+                           key=sort_keys.__getitem__,
+                           reverse=self._descending)
+            rows = [self.dataset[index] for index in order]
+        self._replace_dataset(rows)
 
     def rowCount(self, index):
         return len(self.dataset)
@@ -352,23 +840,65 @@ class BaseListModel(QAbstractTableModel):
 
     def data(self, index, role):
         if role == Qt.DisplayRole:
-            row = self.dataset[index.row()]
-            cell = row[index.column()]
-            if isinstance(cell, Decimal):
-                # QTableView won't display Decimal objects, so return a float
-                return float(cell)
-            if isinstance(cell, datetime.time):
-                return cell.strftime(self.time_format)
-            if isinstance(cell, datetime.datetime):
-                return cell.strftime(self.datetime_format)
-            else:
-                return cell
+            return self._display[index.column()][index.row()]
+        if role == self.sort_role:
+            return self._sort_keys[index.column()][index.row()]
 
     def headerData(self, section, orientation, role):
         if role == Qt.DisplayRole and orientation == Qt.Horizontal:
                 return self.headers[section]
 
 
+class BasePersonListModel(BaseListModel):
+    """
+    Generic Model object for lists of people. Rows of people who are banned
+    or sanctioned are highlighted, with a tooltip saying what the restriction
+    is. The restrictions are looked up in a RestrictionIndex (see
+    rksmanager.restrictions) as the rows are painted, so highlighting them
+    doesn't cost any queries. row_key() must return the person's ID.
+
+    """
+    # Background colors of restricted people's rows, keyed by kind of
+    # restriction
+    restriction_colors = {"ban": "#ffb4b4", "sanction": "#ffe0a8"}
+
+    def __init__(self):
+        # The RestrictionIndex to look people up in. Set by the page that
+        # owns the model.
+        self.restrictions = None
+        super().__init__()
+
+    def data(self, index, role):
+        if role in (Qt.BackgroundRole, Qt.ToolTipRole):
+            if self.restrictions is None:
+                return None
+            person_id = self.row_key(self.dataset[index.row()])
+            restriction = self.restrictions.status(person_id)
+            if restriction is None:
+                return None
+            if role == Qt.BackgroundRole:
+                return QColor(self.restriction_colors[restriction["kind"]])
+            return describe(restriction)
+        return super().data(index, role)
+
+    def restrictions_changed(self, person_ids):
+        """
+        Repaint the rows of people whose restrictions have changed. Connected
+        to the Gui.restrictions_changed signal.
+
+        Args:
+            person_ids: Set of the IDs of the people whose restrictions
+                changed.
+
+        """
+        changed = [index for index, row in enumerate(self.dataset)
+                   if self.row_key(row) in person_ids]
+        last_column = self.columnCount(QModelIndex()) - 1
+        for first, last in get_consecutive_ranges(changed):
+            self.dataChanged.emit(self.index(first, 0),
+                                  self.index(last, last_column))
+
+
 class BaseList(BasePage):
     """
     Generic table viewer widget. Subclasses should set the model_class
@@ -383,10 +913,17 @@ class BaseList(BasePage):
     def __init__(self, *args, **kwargs):
         self._model = self.model_class()
         self.proxy_model = QSortFilterProxyModel()
+        self.proxy_model.setSortRole(self._model.sort_role)
         self.proxy_model.setSourceModel(self._model)
         layout = QVBoxLayout()
         self.table_view = QTableView()
-        self.table_view.setModel(self.proxy_model)
+        if self._model.page_size:
+            # Paged models only have some of their rows loaded, so they have to
+            # do their own sorting in the database
+            self.table_view.setModel(self._model)
+            self.table_view.sortByColumn(0, Qt.AscendingOrder)
+        else:
+            self.table_view.setModel(self.proxy_model)
         self.table_view.setSortingEnabled(True)
         self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table_view.doubleClicked.connect(self.table_double_clicked)
@@ -423,15 +960,67 @@ class BaseList(BasePage):
         if hasattr(self, "details_class"):
             self.details_class.create_or_focus(self.gui, data_id)
 
+    # Get the Database method that a paged model should fetch its pages with.
+    #
+    # Args:
+    #   db: The Database object to get the method from.
+    #
+    # Returns:
+    #   The method, with the page's data_id already filled in if necessary.
+    def _get_fetcher(self, db):
+        db_method = getattr(db, self.loader)
+        if self.data_id:
+            db_method = functools.partial(db_method, self.data_id)
+        return db_method
+
+    def load(self):
+        """
+        If the loader attribute is set, use the corresponding Database method
+        to set this page's data. Paged models are given the method to fetch
+        their pages with instead.
+
+        """
+        if self._model.page_size and hasattr(self, "loader"):
+            self._model.set_fetcher(self._get_fetcher(self.gui.db))
+        else:
+            super().load()
+
+    def reload(self):
+        """
+        Reload this page's data in the background thread. Paged models reload
+        all of the rows that they currently have loaded.
+
+        """
+        if self._model.page_size and hasattr(self, "loader"):
+            model = self._model
+            arguments = model.reload_arguments()
+            generation = model.generation
+
+            def fetch(db):
+                return self._get_fetcher(db)(**arguments)
+
+            def finished(rows):
+                # Throw the rows away if the model has been re-sorted or
+                # otherwise replaced its data set in the meantime
+                if model.generation == generation:
+                    model.reloaded(rows, arguments,
+                                   self._get_fetcher(self.gui.db))
+            self.run_in_background(fetch, finished)
+        else:
+            super().reload()
+
     @property
     def data(self):
-        """The page's current data set (a 2-dimensional sequence)."""
+        """
+        The page's current data set (a 2-dimensional sequence). For paged
+        models, only the rows that have been loaded so far.
+
+        """
         return self._model.dataset
 
     @data.setter
     def data(self, data):
         self._model.populate(data)
-        self.proxy_model.invalidate()
 
     @property
     def tab_name(self):
@@ -455,16 +1044,49 @@ class PersonDetails(BaseDetails):
         ("other_contact_info", "Other Contact Info", MappedDoubleListLabel),
         ("pronouns", "Pronouns"),
         ("notes", "Notes"),
+        ("restrictions", "Bans and\nSanctions", ListLabel),
     )
     loader = "get_person"
+    # Changes to a person's aliases etc. are reported as changes to the person
+    depends_on = ("people",)
+    data_table = "people"
     editor_class = "PersonEditor"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.show_restrictions()
+        self.gui.restrictions_changed.connect(self.restrictions_changed)
+
     def load_extra(self):
         """Fetch "other" contact info types from the database."""
         self.extra_data = {
             "other_contact_info": self.gui.db.get_other_contact_info_types()
         }
 
+    def show_restrictions(self):
+        """
+        Show the person's bans and sanctions that are in effect today, from
+        the Gui's RestrictionIndex.
+
+        """
+        self.data_widgets["restrictions"].value = [
+            "{}: {}".format(describe(restriction), restriction["notes"] or "")
+            for restriction in self.gui.restrictions.get(self.data_id)
+        ]
+
+    def restrictions_changed(self, person_ids):
+        """
+        Update the person's bans and sanctions if they've changed. Connected
+        to the Gui.restrictions_changed signal.
+
+        Args:
+            person_ids: Set of the IDs of the people whose restrictions
+                changed.
+
+        """
+        if self.data_id in person_ids:
+            self.show_restrictions()
+
 
 class BasePersonEditor(BaseEditor):
     """Common editor widget for the Create Person and Edit Person tabs."""
@@ -492,7 +1114,7 @@ class BasePersonEditor(BaseEditor):
 
         """
         person_id = self.gui.db.save_person(self.values, self.data_id)
-        self.gui.database_modified.emit()
+        self.gui.report_database_changes()
         PersonDetails.create_or_focus(self.gui, person_id, replace_tab=self)
 
 
@@ -500,6 +1122,8 @@ class PersonEditor(BasePersonEditor):
     """Editor widget for the Person Details tab."""
     tab_name_fmt = "Edit Person ({id:d}: {first_name_or_nickname})"
     loader = "get_person"
+    depends_on = ("people",)
+    data_table = "people"
 
     def cancel(self):
         """
@@ -516,18 +1140,82 @@ class PersonCreator(BasePersonEditor):
     default_data = {"id": "Not assigned yet"}
 
 
-class PersonListModel(BaseListModel):
+class PersonListModel(BasePersonListModel):
     """Model for holding person data to be displayed by a QTableView."""
     headers = ("ID", "Name", "Email Address", "Pronouns", "Notes")
+    columns = ("id", "first_name_or_nickname", "email_address", "pronouns",
+               "notes")
+    formatters = ("number", "text", "text", "text", "text")
+    page_size = 200
 
 
 class PersonList(BaseList):
-    """Table viewer widget for the People tab."""
+    """
+    Table viewer widget for the People tab. Typing into the search box shows
+    only the people matching the search.
+
+    """
     tab_name_fmt = "People"
 
     model_class = PersonListModel
     loader = "get_people"
+    depends_on = ("people", "people_email_addresses")
     details_class = PersonDetails
+    search_limit = 200
+
+    def __init__(self, *args, **kwargs):
+        # Has to exist before the parent constructor calls load()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText(
+            "Search names, aliases, email addresses, contact info, and notes"
+        )
+        self.search_box.setClearButtonEnabled(True)
+        super().__init__(*args, **kwargs)
+        self.search_box.textChanged.connect(self.search)
+        self.layout().insertWidget(0, self.search_box)
+        self._model.restrictions = self.gui.restrictions
+        self.gui.restrictions_changed.connect(
+            self._model.restrictions_changed
+        )
+
+    def search(self, text):
+        """
+        Reload the list to match the search box. Called when the search box's
+        text changes.
+
+        Args:
+            text: The search box's new text.
+
+        """
+        self.reload()
+
+    def load(self):
+        """
+        If there's anything in the search box, use the full-text search index
+        to find the matching people. Otherwise list everyone.
+
+        """
+        query = self.search_box.text()
+        if query.strip():
+            self._model.show_rows(self.gui.db.search_people(query,
+                                                            self.search_limit))
+        else:
+            super().load()
+
+    def reload(self):
+        """
+        Same as load(), but in the background thread.
+
+        """
+        query = self.search_box.text()
+        if query.strip():
+            limit = self.search_limit
+            self.run_in_background(
+                lambda db: db.search_people(query, limit),
+                self._model.show_rows,
+            )
+        else:
+            super().reload()
 
 
 class ContactInfoTypeListModel(BaseListModel):
@@ -536,6 +1224,21 @@ class ContactInfoTypeListModel(BaseListModel):
 
     """
     headers = ("ID", "Name", "Usage Count")
+    formatters = ("number", "text", "number")
+
+    def row_key(self, row):
+        """
+        Get the value that identifies a row. The email and phone rows don't
+        have IDs, so use the name instead.
+
+        Args:
+            row: The row.
+
+        Returns:
+            The contact info type's name.
+
+        """
+        return row[1]
 
 
 class ContactInfoTypeList(BaseList):
@@ -543,6 +1246,9 @@ class ContactInfoTypeList(BaseList):
     tab_name_fmt = "Manage Contact Info Types"
 
     model_class = ContactInfoTypeListModel
+    loader = "get_other_contact_info_types_usage"
+    depends_on = ("other_contact_info_types", "people_other_contact_info",
+                  "people_email_addresses", "people_phone_numbers")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -562,20 +1268,26 @@ class ContactInfoTypeList(BaseList):
         name = dialogboxes.add_new_contact_info_type_dialog(window)
         if name is not None:
             self.gui.db.create_other_contact_info_type(name)
-            self.gui.database_modified.emit()
+            self.gui.report_database_changes()
 
-    def load(self):
+    def fetch(self, db):
         """
         Fetch contact info type data from the database, and tack on rows for
         email and phone so that we have all contact info types covered.
 
+        Args:
+            db: The Database object to use.
+
+        Returns:
+            The data set.
+
         """
-        ci_types = self.gui.db.get_other_contact_info_types_usage()
-        email_address_count = self.gui.db.count_email_addresses()
-        phone_number_count = self.gui.db.count_phone_numbers()
+        ci_types = db.get_other_contact_info_types_usage()
+        email_address_count = db.count_email_addresses()
+        phone_number_count = db.count_phone_numbers()
         ci_types.insert(0, ("", "Email", email_address_count))
         ci_types.insert(1, ("", "Phone", phone_number_count))
-        self.data = ci_types
+        return ci_types
 
 
 class MembershipTypeListModel(BaseListModel):
@@ -584,6 +1296,7 @@ class MembershipTypeListModel(BaseListModel):
 
     """
     headers = ("ID", "Name", "Active Count")
+    formatters = ("number", "text", "number")
 
 
 class MembershipTypeList(BaseList):
@@ -592,6 +1305,7 @@ class MembershipTypeList(BaseList):
 
     model_class = MembershipTypeListModel
     loader = "get_membership_types"
+    depends_on = ("membership_types", "people_memberships")
     details_class = "MembershipPricingOptionList"
 
     def __init__(self, *args, **kwargs):
@@ -610,7 +1324,7 @@ class MembershipTypeList(BaseList):
         name = dialogboxes.add_new_membership_type_dialog(window)
         if name is not None:
             self.gui.db.create_membership_type(name)
-            self.gui.database_modified.emit()
+            self.gui.report_database_changes()
 
 
 class MembershipPricingOptionListModel(BaseListModel):
@@ -620,6 +1334,7 @@ class MembershipPricingOptionListModel(BaseListModel):
 
     """
     headers = ("ID", "Length (Months)", "Price")
+    formatters = ("number", "number", "decimal")
 
 
 class MembershipPricingOptionList(BaseList):
@@ -628,6 +1343,7 @@ class MembershipPricingOptionList(BaseList):
 
     model_class = MembershipPricingOptionListModel
     loader = "get_membership_type_pricing_options"
+    depends_on = ("membership_type_pricing_options",)
     extra_loader = "get_membership_type"
     details_class = "MembershipPricingOptionEditor"
 
@@ -662,6 +1378,8 @@ class MembershipPricingOptionEditor(BaseMembershipPricingOptionEditor):
     tab_name_fmt = "Edit {membership_type_name} Membership Pricing Option"
 
     loader = "get_membership_type_pricing_option"
+    depends_on = ("membership_type_pricing_options", "membership_types")
+    data_table = "membership_type_pricing_options"
 
     def save(self):
         """
@@ -671,24 +1389,33 @@ class MembershipPricingOptionEditor(BaseMembershipPricingOptionEditor):
         """
         self.gui.db.save_membership_type_pricing_option(self.values,
                                                         self.data_id)
-        self.gui.database_modified.emit()
+        self.gui.report_database_changes()
         self.cancel()
 
 
 class MembershipPricingOptionCreator(BaseMembershipPricingOptionEditor):
     """Editor widget for the Create Pricing Option tab."""
     tab_name_fmt = "Create {membership_type_name} Membership Pricing Option"
+    loader = "get_membership_type"
+    depends_on = ("membership_types",)
+    data_table = "membership_types"
 
-    def load(self):
+    def fetch(self, db):
         """
         Load the membership type's data from the database and use it for the
         initial data set.
 
+        Args:
+            db: The Database object to use.
+
+        Returns:
+            The data set.
+
         """
-        mtype_data = self.gui.db.get_membership_type(self.data_id)
-        self.data = {"id": "Not assigned yet",
-                     "membership_type_id": self.data_id,
-                     "membership_type_name": mtype_data["name"]}
+        mtype_data = db.get_membership_type(self.data_id)
+        return {"id": "Not assigned yet",
+                "membership_type_id": self.data_id,
+                "membership_type_name": mtype_data["name"]}
 
     def save(self):
         """
@@ -697,7 +1424,7 @@ class MembershipPricingOptionCreator(BaseMembershipPricingOptionEditor):
 
         """
         self.gui.db.save_membership_type_pricing_option(self.values)
-        self.gui.database_modified.emit()
+        self.gui.report_database_changes()
         self.cancel()
 
 
@@ -712,6 +1439,8 @@ class EventTypeDetails(BaseDetails):
         ("default_nonmember_door_fee", "Default Non-Member Door Fee"),
     )
     loader = "get_event_type"
+    depends_on = ("event_types",)
+    data_table = "event_types"
     editor_class = "EventTypeEditor"
 
 
@@ -735,7 +1464,7 @@ class BaseEventTypeEditor(BaseEditor):
 
         """
         event_type_id = self.gui.db.save_event_type(self.values, self.data_id)
-        self.gui.database_modified.emit()
+        self.gui.report_database_changes()
         EventTypeDetails.create_or_focus(self.gui, event_type_id,
                                          replace_tab=self)
 
@@ -744,6 +1473,8 @@ class EventTypeEditor(BaseEventTypeEditor):
     """Editor widget for the Edit Event Type tab."""
     tab_name_fmt = "Edit Event Type ({id:d}: {name})"
     loader = "get_event_type"
+    depends_on = ("event_types",)
+    data_table = "event_types"
 
     def cancel(self):
         """
@@ -768,6 +1499,7 @@ class EventTypeListModel(BaseListModel):
     """
     headers = ("ID", "Event Type", "Default Start Time",
                "Default Duration (Minutes)")
+    formatters = ("number", "text", "time", "number")
 
 
 class EventTypeList(BaseList):
@@ -775,6 +1507,7 @@ class EventTypeList(BaseList):
     tab_name_fmt = "Manage Event Types"
     model_class = EventTypeListModel
     loader = "get_event_types"
+    depends_on = ("event_types",)
     details_class = EventTypeDetails
 
     def __init__(self, *args, **kwargs):
@@ -805,8 +1538,33 @@ class EventDetails(BaseDetails):
         ("nonmember_door_fee", "Non-Member Door Fee"),
     )
     loader = "get_event"
+    depends_on = ("events", "event_types")
+    data_table = "events"
     editor_class = "EventEditor"
 
+    def place_buttons(self):
+        """
+        Place the edit and check-in buttons into the layout. Overrides
+        BaseDetails.place_buttons().
+
+        """
+        button_layout = QHBoxLayout()
+        edit_button = QPushButton("Edit")
+        edit_button.clicked.connect(self.edit)
+        button_layout.addWidget(edit_button)
+        check_in_button = QPushButton("Check People In")
+        check_in_button.clicked.connect(self.check_in)
+        button_layout.addWidget(check_in_button)
+        self.layout().addRow(button_layout)
+
+    def check_in(self):
+        """
+        Open a check-in tab for the event. Called when the check-in button is
+        clicked.
+
+        """
+        EventCheckIn.create_or_focus(self.gui, self.data_id)
+
 
 class BaseEventEditor(BaseEditor):
     """
@@ -885,7 +1643,7 @@ class BaseEventEditor(BaseEditor):
 
         """
         event_id = self.gui.db.save_event(self.values, self.data_id)
-        self.gui.database_modified.emit()
+        self.gui.report_database_changes()
         EventDetails.create_or_focus(self.gui, event_id, replace_tab=self)
 
 
@@ -893,6 +1651,8 @@ class EventEditor(BaseEventEditor):
     """Editor widget for the Edit Event tab."""
     tab_name_fmt = "Edit Event ({id:d}: {name})"
     loader = "get_event"
+    depends_on = ("events", "event_types")
+    data_table = "events"
 
     def cancel(self):
         """
@@ -913,6 +1673,10 @@ class EventListModel(BaseListModel):
     """Model for holding event data to be displayed by a QTableView."""
     headers = ("ID", "Event Name", "Event Type ID", "Event Type",
                "Start Date/Time", "End Date/Time")
+    columns = ("id", "name", "event_type_id", "event_type_name",
+               "begin_date_time", "end_date_time")
+    formatters = ("number", "text", "number", "text", "datetime", "datetime")
+    page_size = 200
 
 
 class EventList(BaseList):
@@ -920,4 +1684,659 @@ class EventList(BaseList):
     tab_name_fmt = "View Events"
     model_class = EventListModel
     loader = "get_events"
+    depends_on = ("events", "event_types")
     details_class = EventDetails
+
+
+class CheckInResultsModel(BasePersonListModel):
+    """
+    Model for holding the people matching a check-in search, to be displayed
+    by a QTableView.
+
+    """
+    headers = ("ID", "Name", "Email Address", "Checked In", "Restriction")
+    formatters = ("number", "text", "text", "text", "text")
+
+
+class CheckedInListModel(BasePersonListModel):
+    """
+    Model for holding the people who have been checked in to an event, to be
+    displayed by a QTableView.
+
+    """
+    headers = ("ID", "Name", "Email Address")
+    formatters = ("number", "text", "text")
+
+
+class EventCheckIn(BasePage):
+    """
+    Check-in page for an event, for use at the door, where everything can be
+    done from the keyboard. Typing into the search box finds people by the
+    start of any word of their names, aliases, or email addresses, using a
+    PrefixIndex that's built in the background when the page is opened, and
+    updated as people are changed, so that the results keep up with typing.
+
+    Pressing Enter picks the highlighted person (the best match, unless
+    another one has been picked with the up and down arrow keys). If they
+    have nothing to pay, they're checked in right away. Otherwise the door
+    fee box is filled in with the fee for their membership type, and Tab
+    moves on to the membership renewal box, for members paying dues.
+    Pressing Enter again records their attendance and payment in one
+    transaction. Either way, the page goes back to an empty search box for
+    the next person. Escape goes back without checking them in. Ctrl+Z undoes
+    the most recent check-in made on this page, including its payment.
+
+    People who are banned or sanctioned are flagged in the results, and when
+    they're picked and checked in.
+
+    """
+    tab_name_fmt = "Check-In ({id:d}: {name})"
+    depends_on = ("events", "people", "people_event_attendance",
+                  "events_door_fees", "event_types_default_door_fees")
+    # Maximum number of matching people to show
+    result_limit = 50
+    # Number of days before a membership ends that renewing it is due. People
+    # with nothing to pay are checked in as soon as they're picked, unless
+    # their renewal is due, so that the volunteer can offer it.
+    renewal_notice_days = 30
+
+    def __init__(self, *args, **kwargs):
+        # Have to exist before the parent constructor calls load()
+        self._index = None
+        # Name and primary email address of each person, keyed by person ID
+        self._people = {}
+        # IDs of the people checked in so far, in the order they came in
+        self._checked_in = []
+        self._checked_in_set = set()
+        # Door fees for members, keyed by membership type ID
+        self._door_fees = {}
+        # (person ID, transaction) pairs for the check-ins made on this page,
+        # most recent last, so that they can be undone. Check-ins made
+        # elsewhere, such as at another station, are never undone from here.
+        # See Database.record_door_transaction().
+        self._undo_stack = []
+        # The person being checked in, and their membership on the day of the
+        # event (or None), while the payment boxes are in use. See
+        # pick_person().
+        self._picked = None
+        self._membership = None
+        # Database changes that the page hasn't caught up with yet. See
+        # reload().
+        self._pending_changes = {}
+        self._unapplied_changes = {}
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Loading people...")
+        self.search_box.setClearButtonEnabled(True)
+        self._results_model = CheckInResultsModel()
+        self.results_view = QTableView()
+        self.results_view.setModel(self._results_model)
+        self.results_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.results_view.setSelectionMode(
+            QAbstractItemView.SingleSelection
+        )
+        self.picked_label = QLabel()
+        self.fee_box = QLineEdit()
+        self.fee_box.setPlaceholderText("No door fee")
+        self.renewal_box = QComboBox()
+        self.status_label = QLabel()
+        self.count_label = QLabel()
+        self._checked_in_model = CheckedInListModel()
+        super().__init__(*args, **kwargs)
+        self._results_model.restrictions = self.gui.restrictions
+        self._checked_in_model.restrictions = self.gui.restrictions
+        self.gui.restrictions_changed.connect(self.restrictions_changed)
+        self.search_box.textChanged.connect(self.search)
+        self.search_box.returnPressed.connect(self.pick_person)
+        self.search_box.installEventFilter(self)
+        self.results_view.doubleClicked.connect(self.pick_person)
+        self.fee_box.returnPressed.connect(self.check_in)
+        self.fee_box.installEventFilter(self)
+        self.renewal_box.installEventFilter(self)
+        check_in_button = QPushButton("Check In")
+        check_in_button.clicked.connect(self.check_in)
+        self.undo_button = QPushButton("Undo Last Check-In")
+        self.undo_button.setShortcut("Ctrl+Z")
+        self.undo_button.setEnabled(False)
+        self.undo_button.clicked.connect(self.undo_check_in)
+        checked_in_view = QTableView()
+        checked_in_view.setModel(self._checked_in_model)
+        payment_layout = QHBoxLayout()
+        payment_layout.addWidget(self.picked_label, 1)
+        payment_layout.addWidget(QLabel("Door fee:"))
+        payment_layout.addWidget(self.fee_box)
+        payment_layout.addWidget(QLabel("Renew membership:"))
+        payment_layout.addWidget(self.renewal_box)
+        payment_layout.addWidget(check_in_button)
+        self._payment_widgets = (self.fee_box, self.renewal_box,
+                                 check_in_button)
+        status_layout = QHBoxLayout()
+        status_layout.addWidget(self.status_label)
+        status_layout.addStretch()
+        status_layout.addWidget(self.undo_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.search_box)
+        layout.addWidget(self.results_view)
+        layout.addLayout(payment_layout)
+        layout.addLayout(status_layout)
+        layout.addWidget(self.count_label)
+        layout.addWidget(checked_in_view)
+        self.setLayout(layout)
+        self._show_checked_in()
+        self.cancel_payment()
+
+    def database_modified(self, changes):
+        """
+        Keep track of changes to people and attendance, so that reload() only
+        has to fetch what changed, then mark the page as stale if needed.
+        Called whenever the Gui.database_modified signal is emitted.
+
+        Args:
+            changes: Dictionary of changed tables and rows, in the format
+                returned by Database.pop_changes().
+
+        """
+        merge_changes(self._pending_changes, changes)
+        super().database_modified(changes)
+
+    def restrictions_changed(self, person_ids):
+        """
+        Update the flags on people whose bans or sanctions have changed.
+        Connected to the Gui.restrictions_changed signal.
+
+        Args:
+            person_ids: Set of the IDs of the people whose restrictions
+                changed.
+
+        """
+        self.search(self.search_box.text())
+        self._checked_in_model.restrictions_changed(person_ids)
+
+    def load(self):
+        """
+        Load the event right away, since the tab name depends on it, then
+        build the search index in the background thread.
+
+        """
+        self.data = self.gui.db.get_event(self.data_id)
+        self._index = None
+        self.reload()
+
+    def reload(self):
+        """
+        Bring the page up to date with the database in the background thread.
+        Only the people who have changed are fetched and reindexed, unless
+        the index hasn't been built yet or the changes can't be narrowed down
+        to particular people.
+
+        """
+        merge_changes(self._unapplied_changes, self._pending_changes)
+        self._pending_changes = {}
+        event_id = self.data_id
+        if self._index is None:
+            person_ids = None
+        elif "people" in self._unapplied_changes:
+            person_ids = self._unapplied_changes["people"]
+            if person_ids is not None:
+                person_ids = list(person_ids)
+        else:
+            person_ids = []
+
+        def fetch(db):
+            result = {
+                "event": db.get_event(event_id),
+                "door_fees": {row["membership_type_id"]: row["fee"]
+                              for row in db.get_event_door_fees(event_id)},
+                "attendance": [row["person_id"]
+                               for row in db.get_event_attendance(event_id)],
+                "person_ids": person_ids,
+                "people": {},
+            }
+            if person_ids is None:
+                for row in db.get_people():
+                    result["people"][row["id"]] = (
+                        row["first_name_or_nickname"], row["email_address"],
+                    )
+                result["index"] = PrefixIndex(
+                    (row["person_id"], row["term"])
+                    for row in db.get_people_search_terms()
+                )
+            elif person_ids:
+                for person in db.get_people_details(person_ids):
+                    emails = person["email_addresses"]
+                    result["people"][person["id"]] = (
+                        person["first_name_or_nickname"],
+                        emails[0] if emails else None,
+                    )
+                terms = {}
+                for row in db.get_people_search_terms(person_ids):
+                    terms.setdefault(row["person_id"], []).append(row["term"])
+                result["terms"] = terms
+            return result
+        self.run_in_background(fetch, self._apply)
+
+    # Callback for bringing the page up to date with the result of the
+    # background thread's fetch in reload().
+    #
+    # Args:
+    #   result: Dictionary of the fetched data.
+    def _apply(self, result):
+        if result["event"]:
+            self.data = result["event"]
+        self._door_fees = result["door_fees"]
+        if result["person_ids"] is None:
+            self._index = result["index"]
+            self._people = result["people"]
+        else:
+            for person_id in result["person_ids"]:
+                if person_id in result["people"]:
+                    self._people[person_id] = result["people"][person_id]
+                    self._index.set(person_id,
+                                    result["terms"].get(person_id, ()))
+                else:
+                    self._people.pop(person_id, None)
+                    self._index.remove(person_id)
+        self._unapplied_changes = {}
+        self._checked_in = result["attendance"]
+        self._checked_in_set = set(self._checked_in)
+        self.search_box.setPlaceholderText(
+            "Search names, aliases, and email addresses"
+        )
+        self.search(self.search_box.text())
+        self._show_checked_in()
+
+    def search(self, text):
+        """
+        Show the people matching the search box, and highlight the best
+        match. Called when the search box's text changes.
+
+        Args:
+            text: The search box's new text.
+
+        """
+        if self._index is None:
+            return
+        rows = []
+        for person_id in self._index.search(text, self.result_limit):
+            name, email_address = self._people.get(person_id, ("", None))
+            checked_in = "Yes" if person_id in self._checked_in_set else ""
+            restriction = describe(self.gui.restrictions.status(person_id))
+            rows.append((person_id, name, email_address, checked_in,
+                         restriction))
+        self._results_model.populate(rows)
+        if rows:
+            self.results_view.selectRow(0)
+
+    def eventFilter(self, watched, event):
+        """
+        Let the up and down arrow keys move the highlight in the search
+        results while the search box has the keyboard focus, and handle Enter
+        and Escape in the payment boxes.
+
+        """
+        if event.type() != QEvent.KeyPress:
+            return super().eventFilter(watched, event)
+        key = event.key()
+        if watched is self.search_box and key in (Qt.Key_Up, Qt.Key_Down):
+            rows = len(self._results_model.dataset)
+            if rows:
+                current = self.results_view.currentIndex().row()
+                step = -1 if key == Qt.Key_Up else 1
+                self.results_view.selectRow(
+                    min(max(current + step, 0), rows - 1)
+                )
+            return True
+        if watched in (self.fee_box, self.renewal_box):
+            if key == Qt.Key_Escape:
+                self.cancel_payment()
+                return True
+            if watched is self.renewal_box and key in (Qt.Key_Return,
+                                                       Qt.Key_Enter):
+                self.check_in()
+                return True
+        return super().eventFilter(watched, event)
+
+    def pick_person(self):
+        """
+        Pick the highlighted person to check in, and move to the door fee
+        box, filled in with the fee for their membership type. People with
+        no door fee and no membership renewal due are checked in right away,
+        unless they're banned or sanctioned. Called when Enter is pressed in
+        the search box, or a search result is double clicked.
+
+        """
+        index = self.results_view.currentIndex()
+        if index.isValid():
+            self._pick(self._results_model.dataset[index.row()][0])
+
+    # Does the work of pick_person(). Also used to start over with the same
+    # person when their payment couldn't be recorded.
+    #
+    # Args:
+    #   person_id: The ID of the person.
+    #   check_in_if_free: Optional bool. If False, people with nothing to pay
+    #       aren't checked in right away. Defaults to True.
+    def _pick(self, person_id, check_in_if_free=True):
+        name = self._people.get(person_id, ("",))[0]
+        if person_id in self._checked_in_set:
+            self._show_status("{} is already checked in.".format(name),
+                              person_id)
+            self.search_box.clear()
+            return
+        date = self.data["begin_date_time"].date()
+        self._membership = None
+        for membership in self.gui.db.get_person_memberships(person_id):
+            if (membership["begin_date"] <= date
+                    and (membership["end_date"] is None
+                         or membership["end_date"] >= date)):
+                self._membership = membership
+                break
+        nonmember_fee = self.data["nonmember_door_fee"]
+        if nonmember_fee is None:
+            nonmember_fee = self.data["default_nonmember_door_fee"]
+        self.renewal_box.clear()
+        self.renewal_box.addItem("No", None)
+        renewal_due = False
+        if self._membership is None:
+            fee = nonmember_fee
+            description = "not a member"
+        else:
+            membership_type_id = self._membership["membership_type_id"]
+            fee = self._door_fees.get(membership_type_id, nonmember_fee)
+            description = self._membership["membership_type_name"]
+            end_date = self._membership["end_date"]
+            if end_date is not None:
+                description += " until " + end_date.isoformat()
+                options = self.gui.db.get_membership_type_pricing_options(
+                    membership_type_id
+                )
+                for option in options:
+                    self.renewal_box.addItem(
+                        "{:d} months ({})".format(option["length_months"],
+                                                  option["price"]),
+                        (option["length_months"], option["price"]),
+                    )
+                renewal_due = bool(options) and (
+                    (end_date - date).days <= self.renewal_notice_days
+                )
+        self._picked = person_id
+        self.picked_label.setText("{} ({})".format(name, description))
+        self._show_status("Checking in {}.".format(name), person_id)
+        for widget in self._payment_widgets:
+            widget.setEnabled(True)
+        self.fee_box.setText(str(fee) if fee else "")
+        if (check_in_if_free and not fee and not renewal_due
+                and self.gui.restrictions.status(person_id) is None):
+            self.check_in()
+            return
+        self.fee_box.setFocus()
+        self.fee_box.selectAll()
+
+    def check_in(self):
+        """
+        Record the picked person as attending the event, along with their
+        payment, and clear the search box for the next person. Called when
+        Enter is pressed in the door fee or renewal box, or the check-in
+        button is clicked.
+
+        """
+        person_id = self._picked
+        if person_id is None:
+            return
+        text = self.fee_box.text().strip()
+        try:
+            fee = Decimal(text) if text else Decimal(0)
+        except InvalidOperation:
+            fee = None
+        if fee is None or not fee.is_finite() or fee < 0:
+            self.status_label.setStyleSheet("")
+            self.status_label.setText("The door fee has to be an amount of"
+                                      " money, or blank.")
+            self.fee_box.setFocus()
+            self.fee_box.selectAll()
+            return
+        dues_payments = []
+        renewal = self.renewal_box.currentData()
+        if renewal is not None:
+            length_months, price = renewal
+            end_date = self._membership["end_date"]
+            dues_payments.append({
+                "membership_id": self._membership["id"],
+                "amount": price,
+                "original_end_date": end_date,
+                "new_end_date": add_months(end_date, length_months),
+            })
+        try:
+            transaction = self.gui.db.record_door_transaction(
+                self.data_id, person_id, fee or None, dues_payments,
+            )
+        except ValueError as e:
+            # Their membership changed since they were picked, such as by
+            # someone renewing it at another station. Nothing was recorded,
+            # so start over with the membership as it is now.
+            self._pick(person_id, check_in_if_free=False)
+            if self._picked == person_id:
+                self.status_label.setStyleSheet("")
+                self.status_label.setText("Couldn't check them in: {}. Their"
+                                          " membership has been reloaded."
+                                          .format(e))
+            return
+        self._undo_stack.append((person_id, transaction))
+        self.undo_button.setEnabled(True)
+        self._checked_in.append(person_id)
+        self._checked_in_set.add(person_id)
+        name = self._people.get(person_id, ("",))[0]
+        status = "Checked in {}.".format(name)
+        total = fee + sum(payment["amount"] for payment in dues_payments)
+        if total:
+            status += " Paid {}.".format(total)
+        self._show_status(status, person_id)
+        self._show_checked_in()
+        self.gui.report_database_changes()
+        self.search_box.clear()
+        self.cancel_payment()
+
+    def cancel_payment(self):
+        """
+        Go back to the search box without checking anyone in. Called when
+        Escape is pressed in the door fee or renewal box.
+
+        """
+        self._picked = None
+        self._membership = None
+        self.picked_label.setText("")
+        self.fee_box.clear()
+        self.renewal_box.clear()
+        for widget in self._payment_widgets:
+            widget.setEnabled(False)
+        self.search_box.setFocus()
+        self.search_box.selectAll()
+
+    def undo_check_in(self):
+        """
+        Remove the most recent check-in made on this page, along with its
+        payment. Check-ins made elsewhere aren't touched, even if they were
+        made for the same person before this page's payment was recorded.
+        Called when the undo button is clicked, or Ctrl+Z is pressed.
+
+        """
+        if not self._undo_stack:
+            return
+        person_id, transaction = self._undo_stack.pop()
+        self.undo_button.setEnabled(bool(self._undo_stack))
+        self.gui.db.remove_door_transaction(transaction)
+        name = self._people.get(person_id, ("",))[0]
+        if transaction["attendance_created"]:
+            if person_id in self._checked_in_set:
+                self._checked_in.remove(person_id)
+                self._checked_in_set.discard(person_id)
+            text = "Undid check-in of {}.".format(name)
+        else:
+            # Someone else checked them in first, so only the payment was
+            # ours to undo
+            text = ("Undid payment of {}. They were already checked in"
+                    " elsewhere.".format(name))
+        self.status_label.setStyleSheet("")
+        self.status_label.setText(text)
+        self._show_checked_in()
+        self.search(self.search_box.text())
+        self.gui.report_database_changes()
+
+    # Show a message in the status label, with a warning in red if the
+    # person is banned or sanctioned.
+    #
+    # Args:
+    #   text: The message.
+    #   person_id: The ID of the person that the message is about.
+    def _show_status(self, text, person_id):
+        restriction = self.gui.restrictions.status(person_id)
+        if restriction is None:
+            self.status_label.setStyleSheet("")
+        else:
+            text += " {}: {}".format(describe(restriction),
+                                     restriction["notes"] or "")
+            self.status_label.setStyleSheet("color: red; font-weight: bold")
+        self.status_label.setText(text)
+
+    # Show the people who have been checked in, most recent first.
+    def _show_checked_in(self):
+        rows = []
+        for person_id in reversed(self._checked_in):
+            name, email_address = self._people.get(person_id, ("", None))
+            rows.append((person_id, name, email_address))
+        self._checked_in_model.populate(rows)
+        self.count_label.setText("{} checked in".format(len(rows)))
+
+
+class DiagnosticsListModel(BaseListModel):
+    """
+    Model for holding Database method statistics to be displayed by a
+    QTableView.
+
+    """
+    headers = ("Method", "Calls", "Rows", "Statements", "Errors",
+               "Total (ms)", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)")
+    formatters = ("text",) + ("number",) * 9
+
+
+class Diagnostics(BaseList):
+    """
+    Hidden page for tracking down performance problems. Shows how often each
+    Database method has been called and how long the calls took, along with
+    cache statistics, the SQL statements that took the most time, and the
+    most recent slow calls and statements. Opened with Ctrl+Shift+D.
+
+    """
+    tab_name_fmt = "Diagnostics"
+    model_class = DiagnosticsListModel
+    # The statistics aren't stored in the database, so database changes don't
+    # affect this page
+    depends_on = ()
+    # Number of statements to show in the list of the ones that took the
+    # most time
+    top_statements = 10
+
+    def __init__(self, *args, **kwargs):
+        # Have to exist before the parent constructor calls load()
+        self.instrument_box = QCheckBox("Record method timings")
+        self.threshold_box = QSpinBox()
+        self.threshold_box.setRange(1, 60000)
+        self.threshold_box.setValue(100)
+        self.threshold_box.setSuffix(" ms")
+        self.details_box = QPlainTextEdit()
+        self.details_box.setReadOnly(True)
+        super().__init__(*args, **kwargs)
+        self.instrument_box.toggled.connect(self.set_instrumented)
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.load)
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        controls = QHBoxLayout()
+        controls.addWidget(self.instrument_box)
+        controls.addWidget(QLabel("Log calls and statements slower than"))
+        controls.addWidget(self.threshold_box)
+        controls.addStretch()
+        controls.addWidget(refresh_button)
+        controls.addWidget(reset_button)
+        self.layout().insertLayout(0, controls)
+        self.layout().addWidget(self.details_box)
+
+    def set_instrumented(self, instrumented):
+        """
+        Turn the Database object's instrumentation on or off. Called when the
+        checkbox is toggled. Slow calls and statements are logged to a file
+        next to the database file.
+
+        Args:
+            instrumented: True to turn instrumentation on.
+
+        """
+        if instrumented:
+            self.gui.db.enable_instrumentation(
+                slow_threshold_ms=self.threshold_box.value(),
+                slow_log_filename=self.gui.db_filename + "-slow.log",
+            )
+        else:
+            self.gui.db.disable_instrumentation()
+        self.load()
+
+    def reset(self):
+        """
+        Throw away the statistics recorded so far. Called when the reset button
+        is clicked.
+
+        """
+        if self.instrument_box.isChecked():
+            self.gui.db.disable_instrumentation()
+            self.set_instrumented(True)
+
+    def load(self):
+        """Show the Database object's current statistics."""
+        stats = self.gui.db.stats()
+        self.instrument_box.blockSignals(True)
+        self.instrument_box.setChecked(stats["instrumented"])
+        self.instrument_box.blockSignals(False)
+        # The threshold only takes effect when instrumentation is turned on
+        self.threshold_box.setEnabled(not stats["instrumented"])
+        rows = []
+        for name, method_stats in sorted(stats["methods"].items()):
+            rows.append((name,) + tuple(
+                round(method_stats[key], 3) if key.endswith("_ms")
+                else method_stats[key]
+                for key in ("calls", "rows", "statements", "errors",
+                            "total_ms", "p50_ms", "p95_ms", "p99_ms",
+                            "max_ms")
+            ))
+        self.data = rows
+        lines = ["SQL statement cache: {hits} hits, {misses} misses,"
+                 " ~{estimated_statement_reuses} prepared statement reuses"
+                 " (estimated),"
+                 " {cached_statements} statements"
+                 .format(**stats["sql_cache"]),
+                 "Lookup cache: {hits} hits, {misses} misses,"
+                 " {cached_results} results"
+                 .format(**stats["lookup_cache"]),
+                 "",
+                 "Statements that took the most time:"]
+        statements = sorted(stats["statements"].items(),
+                            key=lambda item: item[1]["total_ms"],
+                            reverse=True)
+        for sql, statement_stats in statements[:self.top_statements]:
+            lines.append("{executions} executions, {total_ms:.1f} ms total,"
+                         " p50 {p50_ms:.3f} ms, p95 {p95_ms:.3f} ms,"
+                         " max {max_ms:.3f} ms".format(**statement_stats))
+            lines.append("    " + sql)
+        lines += ["", "Recent slow statements:"]
+        for slow_statement in reversed(stats["slow_statements"]):
+            lines.append("{time:%H:%M:%S} in {method}() {ms:.1f} ms"
+                         .format(**slow_statement))
+            lines.append("    " + slow_statement["sql"])
+        lines += ["", "Recent slow calls:"]
+        for slow_call in reversed(stats["slow_calls"]):
+            lines.append("{time:%H:%M:%S} {method}({arguments}) {ms:.1f} ms"
+                         .format(**slow_call))
+            lines += ["    " + sql for sql in slow_call["statements"]]
+        self.details_box.setPlainText("\n".join(lines))
+
+    def reload(self):
+        """Same as load(). The statistics don't come from the database."""
+        self.load()
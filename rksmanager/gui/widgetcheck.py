@@ -0,0 +1,260 @@
+"""
+Functional check for the list editing widgets and GridLayout. Opens the
+person editor and creator pages against a new database in a temporary
+directory, without showing anything on screen, clicks the buttons in their
+list editing widgets the way a user would, saves, and checks what ended up in
+the database. Also checks that GridLayout's row index agrees with the
+positions that Qt itself reports as rows are inserted and removed.
+
+Run from the base project directory with:
+
+    python -m rksmanager.gui.widgetcheck
+
+The offscreen Qt platform is used unless the QT_QPA_PLATFORM environment
+variable says otherwise.
+
+"""
+import os
+import sys
+import pathlib
+import tempfile
+
+from PySide2.QtWidgets import QWidget, QLabel
+from PySide2.QtCore import Qt, QEvent, QModelIndex
+from PySide2.QtTest import QTest
+
+from . import Gui
+from .widgets import GridLayout
+from .pages import PersonEditor, PersonCreator
+
+
+class WidgetCheck:
+    """
+    Runs the widget checks against a Gui object, collecting any problems
+    found rather than stopping at the first one.
+
+    Args:
+        gui: The Gui object. Its main window must already be built, and it
+            must have an empty database open.
+
+    """
+    def __init__(self, gui):
+        self.gui = gui
+        self.problems = []
+
+    def check(self, condition, problem):
+        """
+        Record a problem if a condition doesn't hold.
+
+        Args:
+            condition: The condition that should be true.
+            problem: Human-readable description of what went wrong, recorded
+                if condition is false.
+
+        Returns:
+            The condition.
+
+        """
+        if not condition:
+            self.problems.append(problem)
+        return condition
+
+    # Process all pending events, including the queued button clicks of list
+    # editing widgets and deleting widgets that have been scheduled for
+    # deletion.
+    def _process_events(self):
+        self.gui.processEvents()
+        self.gui.sendPostedEvents(None, QEvent.DeferredDelete)
+        self.gui.processEvents()
+
+    # Click a cell of a list editing widget's table view with the mouse.
+    #
+    # Args:
+    #   widget: The ListEdit.
+    #   row: The row index of the cell.
+    #   column: The column index of the cell.
+    def _click(self, widget, row, column):
+        rect = widget.view.visualRect(widget.model.index(row, column))
+        QTest.mouseClick(widget.view.viewport(), Qt.LeftButton,
+                         Qt.NoModifier, rect.center())
+        self._process_events()
+
+    # Get the text shown in every cell of a list editing widget.
+    #
+    # Args:
+    #   widget: The ListEdit.
+    #
+    # Returns:
+    #   A list of rows, each a list of strings.
+    def _cells(self, widget):
+        model = widget.model
+        return [[model.data(model.index(row, column), Qt.DisplayRole)
+                 for column in range(model.columnCount(QModelIndex()))]
+                for row in range(model.rowCount(QModelIndex()))]
+
+    def check_person_editor(self):
+        """
+        Create a person with the Create Person page, then edit them with the
+        Edit Person page, using every kind of button in the list editing
+        widgets.
+
+        """
+        db = self.gui.db
+        fetlife_id = db.create_other_contact_info_type("Fetlife")
+        discord_id = db.create_other_contact_info_type("Discord")
+        self.gui.report_database_changes()
+
+        creator = PersonCreator.create_or_focus(self.gui)
+        self._process_events()
+        widgets = creator.data_widgets
+        widgets["first_name_or_nickname"].value = "Sam"
+        for alias in ("Raven", "Fox", "Raven"):
+            widgets["aliases"].value = widgets["aliases"].value + [alias]
+        self.check(widgets["aliases"].value == ["Raven", "Fox"],
+                   "ListEdit kept a duplicate item: {}"
+                   .format(widgets["aliases"].value))
+        widgets["email_addresses"].value = ["sam@example.com",
+                                            "sam@example.org"]
+        widgets["other_contact_info"].value = [(fetlife_id, "sam_f"),
+                                               (discord_id, "sam#1")]
+        cells = self._cells(widgets["other_contact_info"])
+        self.check(cells and cells[0][:2] == ["Fetlife", "sam_f"],
+                   "ComboListEdit shows {} instead of the type name"
+                   .format(cells))
+        creator.save()
+        self._process_events()
+        person = db.get_person(1)
+        self.check(sorted(person["aliases"]) == ["Fox", "Raven"]
+                   and person["email_addresses"] == ["sam@example.com",
+                                                     "sam@example.org"]
+                   and sorted(map(tuple, person["other_contact_info"]))
+                   == [(fetlife_id, "sam_f"), (discord_id, "sam#1")],
+                   "Create Person saved {}".format(dict(person)))
+
+        editor = PersonEditor.create_or_focus(self.gui, 1)
+        self._process_events()
+        widgets = editor.data_widgets
+
+        aliases = widgets["aliases"]
+        aliases._text_box.value = "Velvet"
+        aliases.add()
+        self._click(aliases, aliases.value.index("Raven"), 1)
+        self.check(aliases.value == ["Fox", "Velvet"],
+                   "ListEdit remove button left {}".format(aliases.value))
+        self.check(aliases._text_box.value == "Raven",
+                   "ListEdit didn't put the removed item in the text box")
+
+        emails = widgets["email_addresses"]
+        self._click(emails, 1, 1)  # Make "sam@example.org" primary
+        self.check(emails.value == ["sam@example.org", "sam@example.com"],
+                   "Make Primary left {}".format(emails.value))
+        self._click(emails, 0, 2)  # Remove the new primary
+        cells = self._cells(emails)
+        self.check(emails.value == ["sam@example.com"]
+                   and cells[0][1] == "(Primary)",
+                   "Removing the primary email address left {}"
+                   .format(cells))
+
+        contact_info = widgets["other_contact_info"]
+        self._click(contact_info,
+                    contact_info.value.index((fetlife_id, "sam_f")), 2)
+        self.check(contact_info._combo_box.value == fetlife_id
+                   and contact_info._text_box.value == "sam_f",
+                   "ComboListEdit didn't put the removed item back in its"
+                   " combo box and text box")
+        contact_info._combo_box.value = discord_id
+        contact_info._text_box.value = "sam#2"
+        contact_info.add()
+        cells = self._cells(contact_info)
+        self.check(cells == [["Discord", "sam#1", "-"],
+                             ["Discord", "sam#2", "-"]],
+                   "ComboListEdit shows {} after adding and removing"
+                   .format(cells))
+
+        editor.save()
+        self._process_events()
+        person = db.get_person(1)
+        self.check(sorted(person["aliases"]) == ["Fox", "Velvet"]
+                   and person["email_addresses"] == ["sam@example.com"]
+                   and sorted(map(tuple, person["other_contact_info"]))
+                   == [(discord_id, "sam#1"), (discord_id, "sam#2")],
+                   "Edit Person saved {}".format(dict(person)))
+
+    def check_grid_layout(self):
+        """
+        Insert and remove rows of a GridLayout, checking the coordinates in
+        its row index against the positions that Qt reports after each step.
+
+        """
+        parent = QWidget()
+        layout = GridLayout()
+        parent.setLayout(layout)
+
+        def row(*names_and_columns):
+            return [(QLabel(name), column, colspan)
+                    for name, column, colspan in names_and_columns]
+
+        steps = (
+            ("insert 0", lambda: layout.insert_row(
+                0, row(("a", 0, 1), ("b", 1, 1)))),
+            ("insert 1", lambda: layout.insert_row(1, row(("c", 0, 2)))),
+            ("insert 0", lambda: layout.insert_row(0, row(("d", 1, 1)))),
+            ("insert 2", lambda: layout.insert_row(2, row(("e", 0, 1)))),
+            ("insert 9", lambda: layout.insert_row(9, row(("f", 0, 1)))),
+            ("remove 1", lambda: layout.remove_row(1)),
+            ("remove 0", lambda: layout.remove_row(0)),
+        )
+        for name, step in steps:
+            step()
+            actual = {}
+            for i in range(layout.count()):
+                label = layout.itemAt(i).widget().text()
+                actual[label] = tuple(layout.getItemPosition(i))
+            indexed = {widget.text(): tuple(coordinates)
+                       for widget, *coordinates
+                       in layout.get_all_widget_coordinates()}
+            if not self.check(indexed == actual,
+                              "GridLayout index after {}: {}, Qt says {}"
+                              .format(name, indexed, actual)):
+                break
+        self.check(sorted(w.text() for w, *_
+                          in layout.get_widget_coordinates_in_rect(0, 0, 3,
+                                                                   1))
+                   == ["c", "e"],
+                   "GridLayout found the wrong widgets in a rectangle")
+
+
+def main():
+    """
+    Run the widget checks and print any problems found.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    # Has to be set before the QApplication is created
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    gui = Gui()
+    gui.build_main_window()
+    gui.main_window.show()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        gui.create_or_open_database(
+            str(pathlib.Path(temp_dir) / "widgetcheck.rksm")
+        )
+        checker = WidgetCheck(gui)
+        try:
+            checker.check_person_editor()
+            checker.check_grid_layout()
+        finally:
+            gui.close_database()
+            gui.main_window.close()
+    for problem in checker.problems:
+        print(problem)
+    if checker.problems:
+        return 1
+    print("All widgets OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,16 @@
 Manager go in the gui.pages module.
 
 """
-import functools
 import datetime
 
 from PySide2.QtWidgets import (QTabWidget, QWidget, QGridLayout, QLabel,
                                QLineEdit, QTextEdit, QPushButton, QComboBox,
-                               QTimeEdit, QDateTimeEdit, QHBoxLayout)
+                               QTimeEdit, QDateTimeEdit, QHBoxLayout,
+                               QTableView, QHeaderView, QAbstractItemView,
+                               QFrame, QStyledItemDelegate, QStyleOptionButton,
+                               QStyle, QApplication)
+from PySide2.QtCore import (Qt, QEvent, QTimer, QAbstractTableModel,
+                            QModelIndex, Signal)
 
 from ..functions import get_nested_attr
 
@@ -18,14 +22,66 @@ class TabHolder(QTabWidget):
     A QTabWidget with some extra methods. Used as the central widget of our
     main window.
 
+    Also schedules page refreshes. Pages that need to be reloaded are marked
+    as stale with mark_stale(), and are reloaded by calling their reload()
+    method once control returns to the event loop, so that a burst of changes
+    only causes one reload. Pages that aren't in the current tab stay stale
+    until their tab is switched to.
+
     """
     def __init__(self):
         super().__init__()
         self.setMovable(True)
         self.setTabsClosable(True)
         self.tabCloseRequested.connect(self.close_tab)
+        self.currentChanged.connect(self._refresh_stale)
         self._tab_ids = {}
         self._tab_ids_inverse = {}
+        # Page widgets waiting to be reloaded
+        self._stale = set()
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(0)
+        self._refresh_timer.timeout.connect(self._refresh_stale)
+
+    def mark_stale(self, widget):
+        """
+        Mark a page as needing to be reloaded. It'll be reloaded after control
+        returns to the event loop if it's in the current tab, or when its tab
+        is switched to otherwise.
+
+        Args:
+            widget: The page widget. Must have a reload() method.
+
+        """
+        self._stale.add(widget)
+        self._refresh_timer.start()
+
+    def is_stale(self, widget):
+        """
+        Check whether a page is waiting to be reloaded.
+
+        Args:
+            widget: The page widget.
+
+        Returns:
+            True if the page has been marked as stale and hasn't been reloaded
+            yet, otherwise False.
+
+        """
+        return widget in self._stale
+
+    # Reload the current tab's page if it's stale. Called after
+    # mark_stale(), and whenever the current tab changes.
+    #
+    # Args:
+    #   index: Unused index of the current tab, passed by the currentChanged
+    #       signal.
+    def _refresh_stale(self, index=None):
+        widget = self.currentWidget()
+        if widget in self._stale:
+            self._stale.discard(widget)
+            widget.reload()
 
     # Establish a new tab ID
     #
@@ -102,11 +158,13 @@ class TabHolder(QTabWidget):
             index = self.indexOf(widget)
         tab_id = self._tab_ids_inverse[widget]
         self._del_tab_id(tab_id)
+        self._stale.discard(widget)
         self.removeTab(index)
         widget.deleteLater()
 
     def close_all_tabs(self):
         """Close all tabs and delete all page widgets."""
+        self._stale.clear()
         self.clear()
         for widget in self._tab_ids.values():
             widget.deleteLater()
@@ -361,7 +419,88 @@ class GridLayout(QGridLayout):
     """
     A QGridLayout with methods for inserting and removing rows of widgets.
 
+    Keeps an index of which widgets are in which rows, so that finding the
+    widgets in a row, or the row that a widget is in, doesn't mean walking
+    every item in the layout, and inserting or removing a row only moves the
+    widgets below it. QGridLayout itself still searches all of its items
+    whenever a widget is removed, including to move it, so those steps get
+    slower as the layout grows. Widgets have to be added and removed with
+    addWidget() and removeWidget() for the index to stay accurate.
+
     """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Widgets in each occupied row, keyed by row index. Each row is a
+        # dictionary mapping widgets to (column, rowspan, colspan) tuples.
+        self._rows = {}
+        # Row index of each widget
+        self._widget_rows = {}
+
+    def addWidget(self, widget, *args):
+        """
+        Add a widget to the layout, and to the row index. Overrides
+        QGridLayout.addWidget(), and takes the same arguments.
+
+        Args:
+            widget: The widget to add.
+            args: Optional row, column, rowspan, colspan, and alignment, as
+                for QGridLayout.addWidget(). If unspecified, the widget is
+                placed wherever QGridLayout puts it.
+
+        """
+        super().addWidget(widget, *args)
+        if len(args) >= 4:
+            row, column, rowspan, colspan = args[:4]
+        elif len(args) >= 2:
+            row, column = args[:2]
+            rowspan, colspan = 1, 1
+        else:
+            row, column, rowspan, colspan = self.getItemPosition(
+                self.indexOf(widget)
+            )
+        self._unindex(widget)
+        self._rows.setdefault(row, {})[widget] = (column, rowspan, colspan)
+        self._widget_rows[widget] = row
+
+    def removeWidget(self, widget):
+        """
+        Remove a widget from the layout, and from the row index. Overrides
+        QGridLayout.removeWidget().
+
+        Args:
+            widget: The widget to remove.
+
+        """
+        super().removeWidget(widget)
+        self._unindex(widget)
+
+    # Remove a widget from the row index, if it's there.
+    #
+    # Args:
+    #   widget: The widget to remove.
+    def _unindex(self, widget):
+        row = self._widget_rows.pop(widget, None)
+        if row is not None:
+            widgets = self._rows[row]
+            del widgets[widget]
+            if not widgets:
+                del self._rows[row]
+
+    # Get the indexes of the occupied rows within a range, in order. Only
+    # looks at the rows in the range, unless the range is bigger than the
+    # number of occupied rows.
+    #
+    # Args:
+    #   first: The index of the first row of the range.
+    #   last: The index of the last row of the range.
+    #
+    # Returns:
+    #   A list of row indexes.
+    def _rows_in_range(self, first, last):
+        if last - first + 1 <= len(self._rows):
+            return [r for r in range(first, last + 1) if r in self._rows]
+        return sorted(r for r in self._rows if first <= r <= last)
+
     def get_widget_coordinates(self, widget):
         """
         Get the grid coordinates of a single widget managed by this layout.
@@ -373,25 +512,22 @@ class GridLayout(QGridLayout):
             A (row, column, rowspan, colspan) tuple.
 
         """
-        layout_index = self.indexOf(widget)
-        return self.getItemPosition(layout_index)
+        row = self._widget_rows[widget]
+        return (row,) + self._rows[row][widget]
 
     def get_all_widget_coordinates(self):
         """
         Get the coordinates of all widgets managed by this layout.
 
         Returns:
-            A list of (widget, row, column, rowspan, colspan) tuples.
+            A list of (widget, row, column, rowspan, colspan) tuples, in row
+            order.
 
         """
         coordinates = []
-        for i in range(self.count()):
-            widget = self.itemAt(i).widget()
-            if not widget:
-                # TODO: Handle child layouts too?
-                continue
-            row, column, rowspan, colspan = self.getItemPosition(i)
-            coordinates.append((widget, row, column, rowspan, colspan))
+        for row in sorted(self._rows):
+            for widget, (column, rowspan, colspan) in self._rows[row].items():
+                coordinates.append((widget, row, column, rowspan, colspan))
         return coordinates
 
     def get_widget_coordinates_in_rect(self, row, column, height, width):
@@ -408,13 +544,12 @@ class GridLayout(QGridLayout):
             A list of (widget, row, column, rowspan, colspan) tuples.
 
         """
-        end_row = row + height - 1
         end_col = column + width - 1
         coordinates = []
-        for coordinate in self.get_all_widget_coordinates():
-            _, r, c, _, _ = coordinate
-            if (row <= r <= end_row) and (column <= c <= end_col):
-                coordinates.append(coordinate)
+        for r in self._rows_in_range(row, row + height - 1):
+            for widget, (c, rowspan, colspan) in self._rows[r].items():
+                if column <= c <= end_col:
+                    coordinates.append((widget, r, c, rowspan, colspan))
         return coordinates
 
     def remove_widgets_in_rect(self, row, column, height, width):
@@ -507,6 +642,191 @@ class GridLayout(QGridLayout):
         return removed_widgets
 
 
+class ListEditModel(QAbstractTableModel):
+    """
+    Model holding the items of a ListEdit, one item per row. What's shown in
+    each cell comes from the format_row function passed in by the widget, so
+    the model doesn't need to know what the items are.
+
+    Args:
+        format_row: Function that takes a row index and an item, and returns
+            a tuple of (text, is_button) pairs, one for each column.
+        column_count: The number of columns.
+
+    """
+    # Role for whether a cell should be drawn as a button. See ButtonDelegate.
+    button_role = Qt.UserRole
+
+    def __init__(self, format_row, column_count):
+        super().__init__()
+        self.items = []
+        self._format_row = format_row
+        self._column_count = column_count
+
+    def rowCount(self, index):
+        return len(self.items)
+
+    def columnCount(self, index):
+        return self._column_count
+
+    def data(self, index, role):
+        if role == Qt.DisplayRole or role == self.button_role:
+            row = index.row()
+            text, is_button = self._format_row(row, self.items[row])[
+                index.column()
+            ]
+            return text if role == Qt.DisplayRole else is_button
+        return None
+
+    def set_items(self, items):
+        """
+        Replace all of the model's items.
+
+        Args:
+            items: Sequence of new items.
+
+        """
+        self.beginResetModel()
+        self.items = list(items)
+        self.endResetModel()
+
+    def append(self, item):
+        """
+        Add an item to the end of the model.
+
+        Args:
+            item: The item to add.
+
+        """
+        row = len(self.items)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.items.append(item)
+        self.endInsertRows()
+
+    def pop(self, index):
+        """
+        Remove and return the item at the specified index.
+
+        Args:
+            index: The index of the item to remove.
+
+        Returns:
+            The item.
+
+        """
+        self.beginRemoveRows(QModelIndex(), index, index)
+        item = self.items.pop(index)
+        self.endRemoveRows()
+        return item
+
+    def set_item(self, index, item):
+        """
+        Replace the item at the specified index.
+
+        Args:
+            index: The index of the item to replace.
+            item: The new item.
+
+        """
+        self.items[index] = item
+        self.refresh(index, index)
+
+    def refresh(self, first=0, last=None):
+        """
+        Tell the view to redraw a range of rows, such as after something that
+        format_row() depends on has changed.
+
+        Args:
+            first: Optional index of the first row to redraw. Defaults to 0.
+            last: Optional index of the last row to redraw. Defaults to the
+                last row.
+
+        """
+        if last is None:
+            last = len(self.items) - 1
+        if first <= last:
+            self.dataChanged.emit(self.index(first, 0),
+                                  self.index(last, self._column_count - 1))
+
+
+class ButtonDelegate(QStyledItemDelegate):
+    """
+    Item delegate that draws a cell as a push button if its
+    ListEditModel.button_role data is True, and emits the clicked signal when
+    the button is clicked, or when the space bar is pressed while it's the
+    current cell. Other cells are drawn as usual. Drawing the buttons rather
+    than creating a QPushButton for each one keeps long lists cheap to build.
+
+    """
+    # Arguments will be the row and column of the button that was clicked
+    clicked = Signal(int, int)
+
+    def paint(self, painter, option, index):
+        if not index.data(ListEditModel.button_role):
+            super().paint(painter, option, index)
+            return
+        self._get_style(option).drawControl(QStyle.CE_PushButton,
+                                            self._button_option(option, index),
+                                            painter, option.widget)
+
+    def sizeHint(self, option, index):
+        if not index.data(ListEditModel.button_role):
+            return super().sizeHint(option, index)
+        button = self._button_option(option, index)
+        text_size = option.fontMetrics.size(Qt.TextShowMnemonic, button.text)
+        return self._get_style(option).sizeFromContents(
+            QStyle.CT_PushButton, button, text_size, option.widget,
+        )
+
+    def editorEvent(self, event, model, option, index):
+        if not index.data(ListEditModel.button_role):
+            return super().editorEvent(event, model, option, index)
+        event_type = event.type()
+        if event_type == QEvent.MouseButtonRelease:
+            if (event.button() == Qt.LeftButton
+                    and option.rect.contains(event.pos())):
+                self.clicked.emit(index.row(), index.column())
+            return True
+        if event_type in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick):
+            # Don't let the view treat these as clicks on an ordinary cell
+            return True
+        if (event_type == QEvent.KeyPress
+                and event.key() in (Qt.Key_Space, Qt.Key_Select)):
+            self.clicked.emit(index.row(), index.column())
+            return True
+        return False
+
+    # Get the style to draw buttons with.
+    #
+    # Args:
+    #   option: The QStyleOptionViewItem passed in by the view.
+    #
+    # Returns:
+    #   The view's QStyle, or the application's if there's no view.
+    def _get_style(self, option):
+        if option.widget:
+            return option.widget.style()
+        return QApplication.style()
+
+    # Build the style options for drawing a button.
+    #
+    # Args:
+    #   option: The QStyleOptionViewItem passed in by the view.
+    #   index: The QModelIndex of the button's cell.
+    #
+    # Returns:
+    #   A QStyleOptionButton.
+    def _button_option(self, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect
+        button.fontMetrics = option.fontMetrics
+        button.text = index.data()
+        button.state = QStyle.State_Enabled | QStyle.State_Raised
+        if option.state & QStyle.State_HasFocus:
+            button.state |= QStyle.State_HasFocus
+        return button
+
+
 class ListEdit(QWidget):
     """
     A widget for editing a list of string values. Each displayed string has a
@@ -514,6 +834,12 @@ class ListEdit(QWidget):
     for adding new strings. Removing a string will place it in the text box to
     be edited and re-added if desired.
 
+    The strings are held by a ListEditModel and displayed by a QTableView,
+    with the buttons drawn by a ButtonDelegate, so setting the value of the
+    widget takes time proportional to the length of the list. Subclasses can
+    change what's displayed by overriding format_row() and setting the
+    column_count and stretch_column attributes.
+
     """
     # TODO: Focus the text box and highlight the text whenever it's populated
     # with a removed string?
@@ -521,25 +847,59 @@ class ListEdit(QWidget):
     # text box doesn't have focus. Indicates to the user that the text won't be
     # saved unless they actually add it to the list.
     empty_value = []
+    # Number of columns in the list. The last one holds the remove buttons.
+    column_count = 2
+    # Column that takes up any extra width. The others are sized to fit their
+    # contents.
+    stretch_column = 0
+    # Maximum number of rows to show before the list starts scrolling
+    max_visible_rows = 10
 
     def __init__(self):
         super().__init__()
-        # We have to track this ourselves, because QGridLayout.rowCount() never
-        # shrinks
-        self.num_items = 0
         self.before_append_callback = None
         self.layout = GridLayout()
-        self._text_box = QLineEdit()
-
-        # Add button callback. Appends the text in the text box to the list and
-        # clears the text box.
-        def add():
-            self.append(self._text_box.text())
-            self._text_box.setText("")
+        self._text_box = LineEdit()
         add_button = QPushButton("+")
-        add_button.clicked.connect(add)
-
+        add_button.clicked.connect(self.add)
         self.build_text_box_row(self._text_box, add_button)
+
+        self.model = ListEditModel(self.format_row, self.column_count)
+        delegate = ButtonDelegate(self)
+        # Queued so that the model isn't changed while the view is still
+        # handling the click
+        delegate.clicked.connect(self.button_clicked, Qt.QueuedConnection)
+        view = QTableView()
+        view.setModel(self.model)
+        view.setItemDelegate(delegate)
+        view.setFrameShape(QFrame.NoFrame)
+        view.setShowGrid(False)
+        view.setWordWrap(False)
+        view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        view.setSelectionMode(QAbstractItemView.NoSelection)
+        view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        view.viewport().setAutoFillBackground(False)
+        header = view.horizontalHeader()
+        header.hide()
+        for column in range(self.column_count):
+            if column == self.stretch_column:
+                header.setSectionResizeMode(column, QHeaderView.Stretch)
+            else:
+                header.setSectionResizeMode(column,
+                                            QHeaderView.ResizeToContents)
+        # Fixed row heights let the view lay out any number of rows without
+        # measuring them
+        header = view.verticalHeader()
+        header.hide()
+        header.setSectionResizeMode(QHeaderView.Fixed)
+        header.setDefaultSectionSize(add_button.sizeHint().height())
+        self.view = view
+        self.model.modelReset.connect(self._fit_to_rows)
+        self.model.rowsInserted.connect(self._fit_to_rows)
+        self.model.rowsRemoved.connect(self._fit_to_rows)
+        self._fit_to_rows()
+        # The list goes above the text box row, across all of its columns
+        self.layout.insert_row(0, ((view, 0, self.layout.columnCount()),))
         self.setLayout(self.layout)
 
     def build_text_box_row(self, text_box, add_button):
@@ -558,22 +918,74 @@ class ListEdit(QWidget):
             (add_button, 1, 1),  # Column 1, span 1
         ))
 
-    def build_label_row(self, index, label, remove_button):
+    def format_row(self, index, text):
         """
-        Insert a new label and remove button into the layout at the specified
-        row index. Shouldn't be called by external code, but can be overridden
-        by subclasses to change placement behavior.
+        Get what to display in each column of a row of the list. Shouldn't be
+        called by external code, but can be overridden by subclasses to change
+        what's displayed.
 
         Args:
-            index: The index of the row to insert the widgets at.
-            label: The label widget.
-            remove_button: The remove button widget.
+            index: The index of the row.
+            text: The string in the row.
+
+        Returns:
+            A tuple of (text, is_button) pairs, one for each column.
 
         """
-        self.layout.insert_row(index, (
-            (label, 0, 1),  # Column 0, span 1
-            (remove_button, 1, 1),  # Column 1, span 1
-        ))
+        return ((text, False), ("-", True))
+
+    def button_clicked(self, index, column):
+        """
+        Handle a click on one of the buttons in the list. Shouldn't be called
+        by external code, but can be overridden by subclasses that add other
+        buttons.
+
+        Args:
+            index: The index of the row that the button is in.
+            column: The column that the button is in.
+
+        """
+        if column == self.column_count - 1:
+            self.remove(index)
+
+    def add(self):
+        """
+        Append the text in the text box to the list and clear the text box.
+        Called when the add button is clicked.
+
+        """
+        self.append(self._text_box.text())
+        self._text_box.setText("")
+
+    def remove(self, index):
+        """
+        Remove the string at the specified index from the list and put it in
+        the text box. Called when a remove button is clicked.
+
+        Args:
+            index: The index of the string to remove.
+
+        """
+        self._text_box.setText(self.pop(index))
+
+    def check_item(self, text):
+        """
+        Check whether a string can be added to the list. Can be overridden by
+        subclasses that hold other kinds of items.
+
+        Args:
+            text: The string to check.
+
+        Returns:
+            The string as it should be stored, or None if it can't be added.
+
+        """
+        return text or None
+
+    @property
+    def num_items(self):
+        """The number of strings in the list."""
+        return len(self.model.items)
 
     def append(self, text):
         """
@@ -583,23 +995,10 @@ class ListEdit(QWidget):
             text: The string to add.
 
         """
-        if (not text) or (text in self.value):
+        text = self.check_item(text)
+        if text is None or text in self.model.items:
             return
-
-        # Remove button callback. Removes the corresponding string from the
-        # list and puts it in the text box.
-        #
-        # Args:
-        #   button: The remove button widget that was clicked. Used to find out
-        #       which row to remove.
-        def remove(button):
-            row_index, _, _, _ = self.layout.get_widget_coordinates(button)
-            self._text_box.setText(self.pop(row_index))
-        remove_button = QPushButton("-")
-        remove_button.clicked.connect(functools.partial(remove, remove_button))
-
-        self.build_label_row(self.num_items, QLabel(text), remove_button)
-        self.num_items += 1
+        self.model.append(text)
 
     def get_item(self, index):
         """
@@ -612,7 +1011,7 @@ class ListEdit(QWidget):
             The string.
 
         """
-        return self.layout.itemAtPosition(index, 0).widget().text()
+        return self.model.items[index]
 
     def set_item(self, index, text):
         """
@@ -623,7 +1022,7 @@ class ListEdit(QWidget):
             text: The new string.
 
         """
-        self.layout.itemAtPosition(index, 0).widget().setText(text)
+        self.model.set_item(index, text)
 
     def pop(self, index):
         """
@@ -636,27 +1035,34 @@ class ListEdit(QWidget):
             The string.
 
         """
-        text = self.get_item(index)
-        removed_widgets = self.layout.remove_row(index)
-        for widget in removed_widgets:
-            widget.deleteLater()
-        self.num_items -= 1
-        return text
+        return self.model.pop(index)
 
     @property
     def value(self):
         """The widget's current list of strings."""
-        data = []
-        for i in range(self.num_items):
-            data.append(self.get_item(i))
-        return data
+        return list(self.model.items)
 
     @value.setter
     def value(self, value):
-        while self.num_items:
-            self.pop(0)
-        for text in value:
-            self.append(text)
+        # Same rules as append(), but checking for duplicates with a set, and
+        # replacing the model's items all at once
+        items = []
+        seen = set()
+        for item in value:
+            item = self.check_item(item)
+            if item is not None and item not in seen:
+                seen.add(item)
+                items.append(item)
+        self.model.set_items(items)
+
+    # Resize the view to fit its rows, up to max_visible_rows, and hide it
+    # while the list is empty, so that short lists don't take up any more
+    # space than they need to.
+    def _fit_to_rows(self):
+        rows = min(self.num_items, self.max_visible_rows)
+        view = self.view
+        view.setFixedHeight(rows * view.verticalHeader().defaultSectionSize())
+        view.setVisible(rows > 0)
 
 
 class PrimaryItemListEdit(ListEdit):
@@ -667,6 +1073,8 @@ class PrimaryItemListEdit(ListEdit):
     string.
 
     """
+    column_count = 3
+
     def build_text_box_row(self, text_box, add_button):
         """
         Place the text box and add button into the layout, giving the text box
@@ -683,41 +1091,55 @@ class PrimaryItemListEdit(ListEdit):
             (add_button, 2, 1),  # Column 2, span 1
         ))
 
-    def build_label_row(self, index, label, remove_button):
+    def format_row(self, index, text):
         """
-        Insert a new label, make primary button (or primary label), and remove
-        button into the layout at the specified row index. Overrides
-        ListEdit.build_label_row(). Shouldn't be called by external code.
+        Get what to display in each column of a row of the list, with a
+        "(Primary)" label in the first row and a make primary button in the
+        others. Overrides ListEdit.format_row(). Shouldn't be called by
+        external code.
 
         Args:
-            index: The index of the row to insert the widgets at.
-            label: The label widget.
-            remove_button: The remove button widget.
+            index: The index of the row.
+            text: The string in the row.
+
+        Returns:
+            A tuple of (text, is_button) pairs, one for each column.
 
         """
         if index == 0:
-            primary_widget = QLabel("(Primary)")
+            primary = ("(Primary)", False)
         else:
-            # Make primary button callback. Swaps the corresponding string with
-            # the current primary string.
-            #
-            # Args:
-            #   button: The make primary button widget that was clicked. Used
-            #       to find out which string to swap.
-            def make_primary(button):
-                row_index, _, _, _ = self.layout.get_widget_coordinates(button)
-                new_primary = self.get_item(row_index)
-                old_primary = self.get_item(0)
-                self.set_item(0, new_primary)
-                self.set_item(row_index, old_primary)
-            primary_widget = QPushButton("Make Primary")
-            primary_widget.clicked.connect(functools.partial(make_primary,
-                                                             primary_widget))
-        self.layout.insert_row(index, (
-            (label, 0, 1),  # Column 0, span 1
-            (primary_widget, 1, 1),  # Column 1, span 1
-            (remove_button, 2, 1),  # Column 2, span 1
-        ))
+            primary = ("Make Primary", True)
+        return ((text, False), primary, ("-", True))
+
+    def button_clicked(self, index, column):
+        """
+        Handle a click on one of the buttons in the list. Overrides
+        ListEdit.button_clicked(). Shouldn't be called by external code.
+
+        Args:
+            index: The index of the row that the button is in.
+            column: The column that the button is in.
+
+        """
+        if column == 1:
+            self.make_primary(index)
+        else:
+            super().button_clicked(index, column)
+
+    def make_primary(self, index):
+        """
+        Swap the string at the specified index with the current primary
+        string. Called when a make primary button is clicked.
+
+        Args:
+            index: The index of the string to make primary.
+
+        """
+        new_primary = self.get_item(index)
+        old_primary = self.get_item(0)
+        self.set_item(0, new_primary)
+        self.set_item(index, old_primary)
 
     def pop(self, index):
         """
@@ -730,13 +1152,10 @@ class PrimaryItemListEdit(ListEdit):
 
         """
         text = super().pop(index)
-        if index == 0 and self.num_items:
-            # First row was removed and there are still items left, so swap new
-            # first row's Make Primary button for a Primary label
-            primary_button = self.layout.itemAtPosition(0, 1).widget()
-            self.layout.removeWidget(primary_button)
-            primary_button.deleteLater()
-            self.layout.addWidget(QLabel("(Primary)"), 0, 1)
+        if index == 0:
+            # The new first row needs its Make Primary button swapped for a
+            # Primary label
+            self.model.refresh(0, 0)
         return text
 
 
@@ -836,142 +1255,115 @@ class MappedDoubleListLabel(MappedLabel):
         self.setText(self._value)
 
 
-class ComboListEdit(QWidget):
+class ComboListEdit(ListEdit):
     """
     A ListEdit for pairs of values. When inputting a new pair, the first value
     is chosen from a combo box, and the second is entered into the usual text
-    box.
+    box. The widget's value is a list of (integer, string) tuples. For
+    example:
+
+    value = [
+        # Widget items. The integers represent which combo box item the user
+        # selected.
+        (2, "Text entered by the user"),
+        (1, "More text entered by the user"),
+        (3, "Even more text entered by the user"),
+    ]
 
     """
     empty_value = list()
+    column_count = 3
+    stretch_column = 1
 
     def __init__(self):
-        super().__init__()
-        # We have to track this ourselves, because QGridLayout.rowCount() never
-        # shrinks
-        self.num_items = 0
         self._mapping = dict()
-        self.layout = GridLayout()
         self._combo_box = ComboBox()
-        self._text_box = LineEdit()
+        super().__init__()
 
-        # Add button callback. Appends the selected data in the combo box and
-        # the text in the text box to the list and resets both.
-        def add():
-            text = self._text_box.value
-            combo_value = self._combo_box.value
-            if combo_value is None or text == "":
-                return
-            self.append((combo_value, text))
-            self._combo_box.value = None
-            self._text_box.value = None
-        add_button = QPushButton("+")
-        add_button.clicked.connect(add)
+    def build_text_box_row(self, text_box, add_button):
+        """
+        Place the combo box, text box, and add button into the layout.
+        Overrides ListEdit.build_text_box_row(). Shouldn't be called by
+        external code.
+
+        Args:
+            text_box: The text box widget.
+            add_button: The add button widget.
 
+        """
         self.layout.insert_row(0, (
             (self._combo_box, 0, 1),  # Column 0, span 1
-            (self._text_box, 1, 1),  # Column 1, span 1
+            (text_box, 1, 1),  # Column 1, span 1
             (add_button, 2, 1),  # Column 2, span 1
         ))
-        self.setLayout(self.layout)
 
-    def append(self, item):
+    def format_row(self, index, item):
         """
-        Add a new item to the end of the list.
+        Get what to display in each column of a row of the list, with the
+        combo box text for the item's first value. Overrides
+        ListEdit.format_row(). Shouldn't be called by external code.
 
         Args:
-            item: An (integer, string) tuple to add.
+            index: The index of the row.
+            item: The (integer, string) tuple in the row.
+
+        Returns:
+            A tuple of (text, is_button) pairs, one for each column.
 
         """
         combo_data, text = item
-        if (not combo_data) or (not text) or (item in self.value):
-            return
-
-        # Remove button callback. Removes the corresponding item from the list
-        # and puts it in the combo box and text box.
-        #
-        # Args:
-        #   button: The remove button widget that was clicked. Used to find out
-        #       which row to remove.
-        def remove(button):
-            row_index, *_ = self.layout.get_widget_coordinates(button)
-            self._combo_box.value, self._text_box.value = self.pop(row_index)
-        remove_button = QPushButton("-")
-        remove_button.clicked.connect(functools.partial(remove, remove_button))
-
-        mapped_label = MappedLabel(self._mapping)
-        mapped_label.value = combo_data
-        self.layout.insert_row(self.num_items, (
-            (mapped_label, 0, 1),  # Column 0, span 1
-            (QLabel(text), 1, 1),  # Column 1, span 1
-            (remove_button, 2, 1),  # Column 2, span 1
-        ))
-        self.num_items += 1
+        return ((self._mapping.get(combo_data, ""), False), (text, False),
+                ("-", True))
 
-    def get_item(self, index):
+    def add(self):
         """
-        Get the item at the specified index.
-
-        Args:
-            index: The index of the item to get.
-
-        Returns:
-            The item at the specified index as an (integer, string) tuple.
+        Append the selected data in the combo box and the text in the text box
+        to the list and reset both, if both have been filled in. Overrides
+        ListEdit.add(). Called when the add button is clicked.
 
         """
-        combo_data = self.layout.itemAtPosition(index, 0).widget().value
-        text = self.layout.itemAtPosition(index, 1).widget().text()
-        return (combo_data, text)
+        text = self._text_box.value
+        combo_value = self._combo_box.value
+        if combo_value is None or text is None:
+            return
+        self.append((combo_value, text))
+        self._combo_box.value = None
+        self._text_box.value = None
 
-    def pop(self, index):
+    def remove(self, index):
         """
-        Remove and return the item at the specified index.
+        Remove the item at the specified index from the list and put it in
+        the combo box and text box. Overrides ListEdit.remove(). Called when a
+        remove button is clicked.
 
         Args:
             index: The index of the item to remove.
 
-        Returns:
-            The item as an (integer, string) tuple.
-
         """
-        item = self.get_item(index)
-        removed_widgets = self.layout.remove_row(index)
-        for widget in removed_widgets:
-            widget.deleteLater()
-        self.num_items -= 1
-        return item
+        self._combo_box.value, self._text_box.value = self.pop(index)
 
-    @property
-    def value(self):
+    def check_item(self, item):
         """
-        A list of the widget's items. For example:
+        Check whether an item can be added to the list. Overrides
+        ListEdit.check_item().
 
-        value = [
-            # Widget items. The integers represent which combo box item the
-            # user selected.
-            (2, "Text entered by the user"),
-            (1, "More text entered by the user"),
-            (3, "Even more text entered by the user"),
-        ]
+        Args:
+            item: The (integer, string) tuple to check.
 
-        """
-        items = []
-        for i in range(self.num_items):
-            items.append(self.get_item(i))
-        return items
+        Returns:
+            The item as a tuple, or None if either of its values is missing.
 
-    @value.setter
-    def value(self, value):
-        while self.num_items:
-            self.pop(0)
-        for item in value:
-            self.append(item)
+        """
+        combo_data, text = item
+        if (not combo_data) or (not text):
+            return None
+        return (combo_data, text)
 
     @property
     def extra_data(self):
         """
         The mapping dictionary as a list of item tuples. Setting this will
-        update the combo box and labels based on the new mapping. For example:
+        update the combo box and list based on the new mapping. For example:
 
         extra_data = [
             # Combo box items. The integers are item IDs, while the strings
@@ -987,6 +1379,5 @@ class ComboListEdit(QWidget):
     @extra_data.setter
     def extra_data(self, extra_data):
         self._mapping = dict(extra_data)
-        for i in range(self.num_items):
-            self.layout.itemAtPosition(i, 0).widget().mapping = self._mapping
+        self.model.refresh()
         self._combo_box.extra_data = extra_data
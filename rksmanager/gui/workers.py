@@ -0,0 +1,159 @@
+"""
+Background workers for running database queries without blocking the GUI.
+Results are delivered back to the GUI thread through Qt's queued signal
+connections.
+
+"""
+import itertools
+import traceback
+
+from PySide2.QtCore import QObject, QThread, Signal, Slot
+import shiboken2
+
+
+class DatabaseWorker(QObject):
+    """
+    Runs functions against a Database object. Meant to be moved into a
+    background thread by a DatabaseExecutor, rather than used directly.
+
+    Args:
+        db: The Database object to pass to the functions.
+
+    """
+    # Request ID and the function's return value
+    finished = Signal(int, object)
+    # Request ID and the exception that the function raised
+    failed = Signal(int, object)
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+
+    @Slot(int, object)
+    def run(self, request_id, function):
+        """
+        Call a function with this worker's Database object and emit the
+        result.
+
+        Args:
+            request_id: ID to emit along with the result.
+            function: Function that takes a Database object.
+
+        """
+        try:
+            result = function(self.db)
+        except Exception as e:
+            self.failed.emit(request_id, e)
+        else:
+            self.finished.emit(request_id, result)
+
+
+class DatabaseExecutor(QObject):
+    """
+    Runs functions against the database in a background thread, one at a time
+    in the order they were submitted, and passes their results to callbacks in
+    the GUI thread.
+
+    Args:
+        db: The Database object to pass to the functions. Its reads use their
+            own connections, so they don't hold up the GUI thread's queries.
+
+    """
+    _run = Signal(int, object)
+
+    def __init__(self, db):
+        super().__init__()
+        # Request ID -> (callback, error_callback, owner)
+        self._requests = {}
+        self._request_ids = itertools.count()
+        self._thread = QThread()
+        self._worker = DatabaseWorker(db)
+        self._worker.moveToThread(self._thread)
+        self._run.connect(self._worker.run)
+        self._worker.finished.connect(self._finished)
+        self._worker.failed.connect(self._failed)
+        self._thread.start()
+
+    def submit(self, function, callback, error_callback=None, owner=None):
+        """
+        Run a function in the background thread.
+
+        Args:
+            function: Function that takes a Database object and returns a
+                result. Runs in the background thread, so it mustn't touch any
+                widgets.
+            callback: Function that takes the result. Called in the GUI
+                thread.
+            error_callback: Optional function that takes the exception, if
+                the function raises one. Called in the GUI thread. The
+                exception's traceback is printed either way.
+            owner: Optional QObject (usually a widget) that the callbacks
+                belong to. If it's been deleted by the time the function
+                finishes, the callbacks won't be called.
+
+        Returns:
+            The ID of the request as an integer, which can be passed to
+            cancel().
+
+        """
+        request_id = next(self._request_ids)
+        self._requests[request_id] = (callback, error_callback, owner)
+        self._run.emit(request_id, function)
+        return request_id
+
+    def cancel(self, request_id):
+        """
+        Make sure that the callbacks for a request won't be called. The
+        function itself will still run if it hasn't already.
+
+        Args:
+            request_id: The ID returned by submit().
+
+        """
+        self._requests.pop(request_id, None)
+
+    def shutdown(self):
+        """
+        Cancel all requests and stop the background thread. Blocks until the
+        currently running function (if any) returns, so that the database can
+        be closed safely afterward. No other methods should be called after
+        this.
+
+        """
+        self._requests.clear()
+        self._thread.quit()
+        self._thread.wait()
+
+    # Get the callbacks for a finished request, unless it was cancelled or its
+    # owner has been deleted.
+    #
+    # Args:
+    #   request_id: The ID of the request.
+    #
+    # Returns:
+    #   A (callback, error_callback) tuple, or None.
+    def _pop_callbacks(self, request_id):
+        request = self._requests.pop(request_id, None)
+        if request is None:
+            return None
+        callback, error_callback, owner = request
+        if owner is not None and not shiboken2.isValid(owner):
+            return None
+        return callback, error_callback
+
+    @Slot(int, object)
+    def _finished(self, request_id, result):
+        callbacks = self._pop_callbacks(request_id)
+        if callbacks:
+            callback, _ = callbacks
+            callback(result)
+
+    @Slot(int, object)
+    def _failed(self, request_id, exception):
+        traceback.print_exception(type(exception), exception,
+                                  exception.__traceback__)
+        callbacks = self._pop_callbacks(request_id)
+        if callbacks:
+            _, error_callback = callbacks
+            if error_callback:
+                error_callback(exception)
@@ -0,0 +1,144 @@
+"""
+Import time regression check. Imports each of the modules that have to start
+quickly in a new Python process with -X importtime, and fails if any of them
+pulls in Qt or another heavy module, or takes too long to import.
+
+Run from the base project directory with:
+
+    python -m rksmanager.importcheck
+
+"""
+import sys
+import re
+import pathlib
+import subprocess
+
+# Modules that must not import Qt or anything else heavy, mapped to the
+# maximum number of milliseconds they're allowed to take to import, including
+# everything they import. The limits are a few times the usual import time, so
+# that they only catch real regressions rather than a slow machine.
+CHECKED_MODULES = {
+    "rksmanager.database": 100,
+    "rksmanager.cli": 150,
+    "rksmanager.prefixindex": 50,
+    "rksmanager.restrictions": 50,
+}
+
+# Modules (and their submodules) that the checked modules must not import
+FORBIDDEN_MODULES = {
+    "PySide2",
+    "shiboken2",
+    "rksmanager.gui",
+    "rksmanager.generator",
+    "rksmanager.benchmarks",
+    "asyncio",
+    "email",
+    "http",
+    "ssl",
+    "unittest",
+    "xml",
+}
+
+# Number of times to import each module. The fastest time is used, since the
+# slower ones mostly measure whatever else the machine was doing.
+RUNS = 3
+
+# A line of -X importtime output, such as:
+#   import time:       636 |      23626 | rksmanager.database
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| *(\S+)")
+
+
+def get_import_times(module):
+    """
+    Import a module in a new Python process and find out what it imported.
+
+    Args:
+        module: Name of the module to import.
+
+    Returns:
+        A dictionary mapping the name of every module that was imported to
+        the number of microseconds it took to import, including everything
+        it imported in turn.
+
+    Raises:
+        RuntimeError: If the module couldn't be imported.
+
+    """
+    base_project_dir = pathlib.Path(__file__).resolve().parents[1]
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=str(base_project_dir),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError("Couldn't import {}:\n{}"
+                           .format(module, process.stderr))
+    times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            times[match.group(3)] = int(match.group(2))
+    return times
+
+
+def is_forbidden(module):
+    """
+    Check whether a module is, or is a submodule of, one of the
+    FORBIDDEN_MODULES.
+
+    Args:
+        module: Name of the module.
+
+    Returns:
+        True if the module is forbidden, otherwise False.
+
+    """
+    parts = module.split(".")
+    return any(".".join(parts[:i]) in FORBIDDEN_MODULES
+               for i in range(1, len(parts) + 1))
+
+
+def check_imports():
+    """
+    Import each of the CHECKED_MODULES and check what they import and how
+    long they take.
+
+    Returns:
+        A list of problems found, as human-readable strings.
+
+    """
+    problems = []
+    for module, limit_ms in CHECKED_MODULES.items():
+        runs = [get_import_times(module) for _ in range(RUNS)]
+        forbidden = sorted(name for name in runs[0] if is_forbidden(name))
+        if forbidden:
+            problems.append("{} imports {}".format(module,
+                                                   ", ".join(forbidden)))
+        import_ms = min(times[module] for times in runs) / 1000
+        if import_ms > limit_ms:
+            problems.append("{} takes {:.1f} ms to import (limit {} ms)"
+                            .format(module, import_ms, limit_ms))
+    return problems
+
+
+def main():
+    """
+    Run the import check and print any problems found.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    problems = check_imports()
+    for problem in problems:
+        print(problem)
+    if problems:
+        return 1
+    print("All imports OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+"""
+Optional instrumentation for the Database class. Records how many times each
+public Database method is called, how many rows and SQL statements it deals
+with, and how long it takes, along with how long each individual SQL
+statement takes, and logs calls and statements that are slower than a
+threshold.
+
+Turned on with Database.enable_instrumentation(), and read with
+Database.stats().
+
+"""
+import re
+import math
+import time
+import datetime
+import threading
+import functools
+import collections
+import reprlib
+
+
+class LatencyHistogram:
+    """
+    Log-scale histogram of latencies. Used to estimate percentiles without
+    keeping every sample. Each bucket is about 9% wider than the one before
+    it, so estimates are within about 9% of the true value.
+
+    """
+    buckets_per_doubling = 8
+
+    def __init__(self):
+        # Bucket number -> number of samples
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """
+        Record a latency.
+
+        Args:
+            seconds: The latency in seconds.
+
+        """
+        microseconds = max(seconds * 1000000, 1.0)
+        bucket = int(math.log2(microseconds) * self.buckets_per_doubling)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """
+        Estimate a percentile of the recorded latencies.
+
+        Args:
+            percent: The percentile to estimate, such as 95.
+
+        Returns:
+            The estimated latency in seconds, or None if nothing has been
+            recorded.
+
+        """
+        if not self.count:
+            return None
+        rank = max(math.ceil(self.count * percent / 100), 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                break
+        # Report the top of the bucket, but no more than the slowest sample
+        upper = 2 ** ((bucket + 1) / self.buckets_per_doubling) / 1000000
+        return min(upper, self.max)
+
+
+class Instrumentation:
+    """
+    Collects statistics about Database method calls and the SQL statements
+    that they run. Safe to use from more than one thread.
+
+    A statement is timed from when SQLite starts running it (when the trace
+    callback is called) until the next statement starts or the method that
+    ran it returns, so its time includes fetching its rows and whatever the
+    method does with them before moving on.
+
+    Args:
+        slow_threshold_ms: Optional number of milliseconds that a call or
+            statement has to take to be logged as slow. Defaults to 100.
+        slow_log_filename: Optional name of a file to append slow calls and
+            statements to. If unspecified, they're only kept in memory.
+        slow_log_size: Optional number of slow calls, and of slow
+            statements, to keep in memory. Defaults to 100.
+
+    """
+    # Transaction control statements don't count as statements run by a
+    # method, and aren't timed
+    _ignored_statements = ("begin", "commit", "rollback")
+    # SQLite reports the statements run by triggers and virtual tables (such
+    # as full-text search indexes) with this prefix. They run inside the
+    # statement that caused them, so they're counted, but their time is left
+    # as part of that statement's.
+    _nested_statement_prefix = "--"
+    # Maximum number of statements to show for each slow call
+    slow_call_statements = 20
+
+    def __init__(self, slow_threshold_ms=100, slow_log_filename=None,
+                 slow_log_size=100):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.slow_log_filename = slow_log_filename
+        self._slow_calls = collections.deque(maxlen=slow_log_size)
+        self._slow_statements = collections.deque(maxlen=slow_log_size)
+        # Method name -> dictionary of counters and a LatencyHistogram
+        self._methods = {}
+        # Statement text -> dictionary of counters and a LatencyHistogram
+        self._statements = {}
+        self._lock = threading.Lock()
+        # Stack of the (name, statement list) pairs of the calls in progress
+        # in each thread, and the (text, start time, method name) of the
+        # statement being timed in each thread
+        self._local = threading.local()
+        # For showing the arguments of slow calls, which can be very long
+        self._repr = reprlib.Repr()
+        self._repr.maxlevel = 2
+        self._repr.maxlist = 3
+        self._repr.maxdict = 3
+        self._repr.maxstring = 40
+        self._repr.maxother = 40
+
+    def wrap(self, name, method):
+        """
+        Wrap a method so that its calls are recorded.
+
+        Args:
+            name: The name to record the calls under.
+            method: The bound method to wrap.
+
+        Returns:
+            The wrapped method.
+
+        """
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            calls = getattr(self._local, "calls", None)
+            if calls is None:
+                calls = self._local.calls = []
+            statements = []
+            calls.append((name, statements))
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = method(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                end = time.perf_counter()
+                seconds = end - start
+                self._finish_statement(end)
+                calls.pop()
+                self._record(name=name,
+                             seconds=seconds,
+                             rows=None if failed else _count_rows(result),
+                             statements=statements,
+                             arguments=(args, kwargs))
+        return wrapper
+
+    def trace(self, sql):
+        """
+        Record a SQL statement against every method call in progress in the
+        current thread, and start timing it. Meant to be passed to
+        Database.set_trace_callback().
+
+        Args:
+            sql: The text of the statement.
+
+        """
+        calls = getattr(self._local, "calls", None)
+        if not calls:
+            return
+        stripped = sql.lstrip().lower()
+        nested = stripped.startswith(self._nested_statement_prefix)
+        if not nested:
+            # Starting a statement means the previous one is done
+            now = time.perf_counter()
+            self._finish_statement(now)
+        if stripped.startswith(self._ignored_statements):
+            return
+        for _, statements in calls:
+            statements.append(sql)
+        if not nested:
+            self._local.statement = (sql, now, calls[-1][0])
+
+    # Stop timing the statement that's running in the current thread, if
+    # there is one, and add it to the statistics.
+    #
+    # Args:
+    #   now: The time it finished, from time.perf_counter().
+    def _finish_statement(self, now):
+        statement = getattr(self._local, "statement", None)
+        if statement is None:
+            return
+        self._local.statement = None
+        sql, start, method = statement
+        seconds = now - start
+        # The trace callback gets the statement with its parameters filled
+        # in, so take them back out to group executions of the same statement
+        # together
+        key = _LITERAL.sub("?", _flatten(sql))
+        with self._lock:
+            statement_stats = self._statements.get(key)
+            if statement_stats is None:
+                statement_stats = self._statements[key] = {
+                    "executions": 0,
+                    "histogram": LatencyHistogram(),
+                }
+            statement_stats["executions"] += 1
+            statement_stats["histogram"].add(seconds)
+        milliseconds = seconds * 1000
+        if milliseconds >= self.slow_threshold_ms:
+            slow_statement = {
+                "time": datetime.datetime.now(),
+                "method": method,
+                "ms": milliseconds,
+                "sql": _flatten(sql),
+            }
+            self._log_slow(
+                self._slow_statements, slow_statement,
+                ["{time:%Y-%m-%d %H:%M:%S} Statement in {method}() {ms:.1f}"
+                 " ms".format(**slow_statement),
+                 "    " + slow_statement["sql"]],
+            )
+
+    # Add a finished call to the statistics, and log it if it was slow.
+    #
+    # Args:
+    #   name: Name of the method.
+    #   seconds: How long the call took.
+    #   rows: Number of rows returned, or None if the call raised an
+    #       exception.
+    #   statements: List of the SQL statements that the call ran.
+    #   arguments: (args, kwargs) tuple of the arguments it was called with.
+    def _record(self, name, seconds, rows, statements, arguments):
+        with self._lock:
+            method_stats = self._methods.get(name)
+            if method_stats is None:
+                method_stats = self._methods[name] = {
+                    "calls": 0,
+                    "rows": 0,
+                    "statements": 0,
+                    "errors": 0,
+                    "histogram": LatencyHistogram(),
+                }
+            method_stats["calls"] += 1
+            method_stats["statements"] += len(statements)
+            if rows is None:
+                method_stats["errors"] += 1
+            else:
+                method_stats["rows"] += rows
+            method_stats["histogram"].add(seconds)
+        milliseconds = seconds * 1000
+        if milliseconds >= self.slow_threshold_ms:
+            args, kwargs = arguments
+            shown_arguments = [self._repr.repr(arg) for arg in args]
+            shown_arguments += ["{}={}".format(key, self._repr.repr(value))
+                                for key, value in kwargs.items()]
+            shown_statements = [
+                _flatten(sql)
+                for sql in statements[:self.slow_call_statements]
+            ]
+            if len(statements) > self.slow_call_statements:
+                shown_statements.append("... and {} more".format(
+                    len(statements) - self.slow_call_statements
+                ))
+            slow_call = {
+                "time": datetime.datetime.now(),
+                "method": name,
+                "ms": milliseconds,
+                "arguments": ", ".join(shown_arguments),
+                "statements": shown_statements,
+            }
+            lines = ["{time:%Y-%m-%d %H:%M:%S} {method}({arguments})"
+                     " {ms:.1f} ms".format(**slow_call)]
+            lines += ["    " + sql for sql in slow_call["statements"]]
+            self._log_slow(self._slow_calls, slow_call, lines)
+
+    # Keep a slow call or statement in memory, and write it to the slow log
+    # file if there is one.
+    #
+    # Args:
+    #   log: The deque to keep it in.
+    #   entry: Dictionary describing the call or statement. See
+    #       get_slow_calls() and get_slow_statements().
+    #   lines: List of lines describing it for the slow log file.
+    def _log_slow(self, log, entry, lines):
+        with self._lock:
+            log.append(entry)
+            if self.slow_log_filename:
+                with open(self.slow_log_filename, "a") as slow_log:
+                    slow_log.write("\n".join(lines) + "\n")
+
+    def get_method_stats(self):
+        """
+        Get the statistics for each method that has been called.
+
+        Returns:
+            A dictionary mapping method names to dictionaries with the
+            following keys:
+                calls: Number of calls.
+                rows: Total number of rows returned.
+                statements: Total number of SQL statements run.
+                errors: Number of calls that raised an exception.
+                total_ms: Total time taken, in milliseconds.
+                p50_ms, p95_ms, p99_ms: Estimated latency percentiles, in
+                    milliseconds.
+                max_ms: Latency of the slowest call, in milliseconds.
+
+        """
+        stats = {}
+        with self._lock:
+            for name, method_stats in self._methods.items():
+                histogram = method_stats["histogram"]
+                stats[name] = {
+                    "calls": method_stats["calls"],
+                    "rows": method_stats["rows"],
+                    "statements": method_stats["statements"],
+                    "errors": method_stats["errors"],
+                    "total_ms": histogram.total * 1000,
+                    "p50_ms": histogram.percentile(50) * 1000,
+                    "p95_ms": histogram.percentile(95) * 1000,
+                    "p99_ms": histogram.percentile(99) * 1000,
+                    "max_ms": histogram.max * 1000,
+                }
+        return stats
+
+    def get_slow_calls(self):
+        """
+        Get the most recent slow calls, oldest first.
+
+        Returns:
+            A list of dictionaries with the following keys:
+                time: When the call finished, as a datetime.
+                method: Name of the method.
+                ms: How long the call took, in milliseconds.
+                arguments: The call's arguments as a string, shortened if
+                    necessary.
+                statements: List of the SQL statements that the call ran,
+                    up to the number set by the slow_call_statements
+                    attribute.
+
+        """
+        with self._lock:
+            return list(self._slow_calls)
+
+    def get_statement_stats(self):
+        """
+        Get the statistics for each SQL statement that has been run by a
+        method call.
+
+        Returns:
+            A dictionary mapping the text of each statement, with its literal
+            values replaced with ? and its comments and extra whitespace
+            removed, to a dictionary with the following keys:
+                executions: Number of times it was run.
+                total_ms: Total time taken, in milliseconds.
+                p50_ms, p95_ms, p99_ms: Estimated latency percentiles, in
+                    milliseconds.
+                max_ms: Latency of the slowest execution, in milliseconds.
+
+        """
+        stats = {}
+        with self._lock:
+            for sql, statement_stats in self._statements.items():
+                histogram = statement_stats["histogram"]
+                stats[sql] = {
+                    "executions": statement_stats["executions"],
+                    "total_ms": histogram.total * 1000,
+                    "p50_ms": histogram.percentile(50) * 1000,
+                    "p95_ms": histogram.percentile(95) * 1000,
+                    "p99_ms": histogram.percentile(99) * 1000,
+                    "max_ms": histogram.max * 1000,
+                }
+        return stats
+
+    def get_slow_statements(self):
+        """
+        Get the most recent slow statements, oldest first.
+
+        Returns:
+            A list of dictionaries with the following keys:
+                time: When the statement finished, as a datetime.
+                method: Name of the method that ran it.
+                ms: How long it took, in milliseconds.
+                sql: The text of the statement, with its parameters filled
+                    in, and its comments and extra whitespace removed.
+
+        """
+        with self._lock:
+            return list(self._slow_statements)
+
+    def reset(self):
+        """
+        Throw away all of the statistics and slow calls and statements
+        recorded so far.
+
+        """
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._slow_calls.clear()
+            self._slow_statements.clear()
+
+
+# Comments that end before the end of a statement. Statements reported with
+# the nested statement prefix are a single comment line, and are left alone.
+_COMMENT = re.compile(r"--[^\n]*(?=\n)")
+# String, blob, number, and null literals. Parameters that are None are
+# filled in as an upper case NULL, which our own SQL doesn't use.
+_LITERAL = re.compile(r"[xX]?'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\bNULL\b")
+
+
+# Put a SQL statement on a single line for showing in statistics and logs.
+#
+# Args:
+#   sql: The text of the statement.
+#
+# Returns:
+#   The statement with its comments removed and its whitespace collapsed.
+def _flatten(sql):
+    return " ".join(_COMMENT.sub("", sql).split())
+
+
+# Count the rows in a Database method's return value.
+#
+# Args:
+#   result: The return value.
+#
+# Returns:
+#   The length of a list of rows, 1 for a single row, or 0 for anything else.
+def _count_rows(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, (tuple, dict)) or hasattr(result, "keys"):
+        return 1
+    return 0
@@ -0,0 +1,161 @@
+"""
+In-memory index for finding people by the start of any word of their names,
+aliases, or email addresses, fast enough to update the results on every
+keystroke. Used by the check-in page, where a volunteer has to find people as
+quickly as they can type. Doesn't import Qt.
+
+"""
+import re
+import bisect
+
+# Words are made up of the same characters as the words that
+# Database.search_people() passes to the full-text index
+_word_regex = re.compile(r"[^\W_]+")
+# Sorts after any character that can be in a word. Used to find the end of
+# the range of words that start with a prefix.
+_max_char = "\U0010ffff"
+
+
+# Join a set of words into a string with a space before each word.
+#
+# Args:
+#   words: Iterable of words.
+#
+# Returns:
+#   The joined string.
+def _join(words):
+    return "".join(" " + word for word in words)
+
+
+def split_words(text):
+    """
+    Split text into words, ignoring case and punctuation.
+
+    Args:
+        text: The text to split.
+
+    Returns:
+        A list of lowercase words.
+
+    """
+    return _word_regex.findall(text.casefold())
+
+
+class PrefixIndex:
+    """
+    Index of the words in pieces of text belonging to keys, such as person
+    IDs. search() finds the keys with a word starting with each word of a
+    query. The words are kept in a sorted list, so a search only has to look
+    at the words that start with part of the query, and adding, changing, or
+    removing a key only touches that key's words.
+
+    Keys must be hashable and comparable with each other, such as integers.
+
+    Args:
+        items: Optional iterable of (key, text) tuples to index. A key can
+            appear more than once, such as for each of a person's aliases.
+
+    """
+    def __init__(self, items=()):
+        # Set of words for each key
+        self._words = {}
+        for key, text in items:
+            self._words.setdefault(key, set()).update(split_words(text or ""))
+        # Sorted list of (word, key) tuples for every word of every key
+        self._entries = sorted((word, key)
+                               for key, words in self._words.items()
+                               for word in words)
+        # Each key's words joined into one string, with a space before each
+        # word, so that checking whether any of them starts with a prefix is
+        # a single substring search. See search().
+        self._joined = {key: _join(words)
+                        for key, words in self._words.items()}
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, key):
+        return key in self._words
+
+    def set(self, key, texts):
+        """
+        Add a key to the index, or replace the text of a key that's already
+        in it.
+
+        Args:
+            key: The key.
+            texts: Iterable of the key's pieces of text.
+
+        """
+        new_words = set()
+        for text in texts:
+            new_words.update(split_words(text or ""))
+        old_words = self._words.get(key, set())
+        for word in old_words - new_words:
+            del self._entries[bisect.bisect_left(self._entries, (word, key))]
+        for word in new_words - old_words:
+            bisect.insort(self._entries, (word, key))
+        self._words[key] = new_words
+        self._joined[key] = _join(new_words)
+
+    def remove(self, key):
+        """
+        Remove a key from the index, if it's there.
+
+        Args:
+            key: The key.
+
+        """
+        if key in self._words:
+            self.set(key, ())
+            del self._words[key]
+            del self._joined[key]
+
+    def search(self, query, limit=None):
+        """
+        Find the keys whose text has a word starting with each of the words
+        of a query.
+
+        Args:
+            query: The text to search for, as typed by the user.
+            limit: Optional maximum number of keys to return.
+
+        Returns:
+            A list of keys, ordered by the word that matched the query's most
+            selective word, so that shorter and alphabetically earlier
+            matches come first.
+
+        """
+        words = set(split_words(query))
+        if not words:
+            return []
+        # Go through the matches for whichever word has the fewest, and
+        # check each one against the others
+        ranges = {word: self._get_range(word) for word in words}
+        driver = min(words, key=lambda word: ranges[word][1] - ranges[word][0])
+        others = [" " + word for word in words - {driver}]
+        start, end = ranges[driver]
+        keys = []
+        seen = set()
+        for _, key in self._entries[start:end]:
+            if key in seen:
+                continue
+            seen.add(key)
+            joined = self._joined[key]
+            if all(word in joined for word in others):
+                keys.append(key)
+                if limit and len(keys) >= limit:
+                    break
+        return keys
+
+    # Find the entries for the words that start with a prefix.
+    #
+    # Args:
+    #   prefix: The prefix, in lowercase.
+    #
+    # Returns:
+    #   A (start, end) tuple of indexes into the sorted entries list.
+    def _get_range(self, prefix):
+        start = bisect.bisect_left(self._entries, (prefix,))
+        end = bisect.bisect_left(self._entries, (prefix + _max_char,), start)
+        return start, end
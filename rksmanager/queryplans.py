@@ -0,0 +1,309 @@
+"""
+Query plan regression check. Calls every public Database method against a
+scratch database, captures the SQL statements each one executes, and runs
+EXPLAIN QUERY PLAN on them. Fails if any statement scans a large table, unless
+the scan is expected (such as a method that lists every row of a table).
+
+Run from the base project directory with:
+
+    python -m rksmanager.queryplans
+
+"""
+import sys
+import re
+import pathlib
+import tempfile
+import datetime
+from decimal import Decimal
+
+from .database import Database
+
+# Lookup tables which will only ever have a handful of rows, so scanning them
+# is fine. Every other table is considered large.
+SMALL_TABLES = {
+    "other_contact_info_types",
+    "membership_types",
+    "membership_type_pricing_options",
+    "event_types",
+    "event_types_default_door_fees",
+    "legal_document_types",
+    "new_guest_info_sheets_default_fields",
+    "sqlite_master",
+}
+
+# Scans of large tables that are unavoidable, such as methods that return
+# every row of a table, keyed by method name
+EXPECTED_SCANS = {
+    "get_people": {"people"},
+    "get_events": {"events"},
+    "count_email_addresses": {"people_email_addresses"},
+    "count_phone_numbers": {"people_phone_numbers"},
+    "get_people_search_terms": {"people", "people_aliases",
+                                "people_email_addresses"},
+    "get_restrictions": {"people_bans", "people_sanctions"},
+}
+
+# Public methods that don't run any queries worth checking
+IGNORED_METHODS = {
+    "close",
+    "apply_migrations",
+    "get_sqlite_user_version",
+    "get_sqlite_schema_version",
+    "get_sql_cache_stats",
+    "set_trace_callback",
+    "checkpoint",
+    "pop_changes",
+    "invalidate_caches",
+    "get_lookup_cache_stats",
+    "poll_external_changes",
+    "enable_instrumentation",
+    "disable_instrumentation",
+    "stats",
+}
+
+
+def _person(contact_info_type_id, alias, name="Alice"):
+    return {
+        "first_name_or_nickname": name,
+        "pronouns": "she/her",
+        "notes": None,
+        "aliases": [alias],
+        "email_addresses": [name + "@example.com", name + "2@example.com"],
+        "other_contact_info": [(contact_info_type_id, name + "_" + alias)],
+    }
+
+
+def _event_type():
+    return {
+        "name": "Munch",
+        "default_start_time": datetime.time(19, 0),
+        "default_duration_minutes": 120,
+        "default_nonmember_door_fee": Decimal("10.00"),
+    }
+
+
+def _event(event_type_id):
+    return {
+        "name": "October Munch",
+        "event_type_id": event_type_id,
+        "begin_date_time": datetime.datetime(2020, 10, 1, 19, 0),
+        "end_date_time": datetime.datetime(2020, 10, 1, 21, 0),
+        "nonmember_door_fee": None,
+    }
+
+
+# Public Database methods to check, in the order they should be called, and
+# functions that return the arguments to call each one with. Each function is
+# passed a dictionary of the values most recently returned by each method.
+METHOD_CALLS = (
+    ("create_other_contact_info_type", lambda r: ("Fetlife",)),
+    ("save_person",
+     lambda r: (_person(r["create_other_contact_info_type"], "Al"),)),
+    ("save_person",
+     lambda r: (_person(r["create_other_contact_info_type"], "Ally"),
+                r["save_person"])),
+    ("save_people",
+     lambda r: ([_person(r["create_other_contact_info_type"], "Bo", "Bob"),
+                 dict(_person(r["create_other_contact_info_type"], "Al"),
+                      id=r["save_person"])],)),
+    ("bulk_insert",
+     lambda r: ([("people_warnings", [{"person_id": r["save_person"],
+                                       "warning_date": datetime.date.today(),
+                                       "notes": None}])],)),
+    ("get_person", lambda r: (r["save_person"],)),
+    ("get_people_details", lambda r: ([r["save_person"]] + r["save_people"],)),
+    ("get_people", lambda r: ()),
+    ("search_people", lambda r: ("ali exam",)),
+    ("get_people_search_terms", lambda r: ()),
+    ("get_people_search_terms", lambda r: (r["save_people"],)),
+    ("get_active_restrictions", lambda r: (datetime.date(2020, 1, 1),)),
+    ("get_restrictions", lambda r: ()),
+    ("get_restrictions", lambda r: ([1, 2], [3])),
+    ("get_other_contact_info_types", lambda r: ()),
+    ("get_other_contact_info_types_usage", lambda r: ()),
+    ("count_email_addresses", lambda r: ()),
+    ("count_phone_numbers", lambda r: ()),
+    ("create_membership_type", lambda r: ("Bronze",)),
+    ("get_membership_types", lambda r: ()),
+    ("get_membership_type", lambda r: (r["create_membership_type"],)),
+    ("save_membership_type_pricing_option",
+     lambda r: ({"membership_type_id": r["create_membership_type"],
+                 "length_months": 1,
+                 "price": Decimal("20.00")},)),
+    ("save_membership_type_pricing_option",
+     lambda r: ({"length_months": 3, "price": Decimal("55.00")},
+                r["save_membership_type_pricing_option"])),
+    ("get_membership_type_pricing_options",
+     lambda r: (r["create_membership_type"],)),
+    ("get_membership_type_pricing_option",
+     lambda r: (r["save_membership_type_pricing_option"],)),
+    ("save_event_type", lambda r: (_event_type(),)),
+    ("save_event_type", lambda r: (_event_type(), r["save_event_type"])),
+    ("get_event_types", lambda r: ()),
+    ("get_event_type", lambda r: (r["save_event_type"],)),
+    ("save_event", lambda r: (_event(r["save_event_type"]),)),
+    ("save_event",
+     lambda r: (_event(r["save_event_type"]), r["save_event"])),
+    ("get_events", lambda r: ()),
+    ("get_event", lambda r: (r["save_event"],)),
+    ("record_attendance", lambda r: (r["save_event"], r["save_person"])),
+    ("record_attendance", lambda r: (r["save_event"], r["save_person"])),
+    ("get_event_attendance", lambda r: (r["save_event"],)),
+    ("remove_attendance", lambda r: (r["save_event"], r["save_person"])),
+    ("bulk_insert",
+     lambda r: ([("people_memberships",
+                  [{"id": 1,
+                    "person_id": r["save_person"],
+                    "membership_type_id": r["create_membership_type"],
+                    "begin_date": datetime.date(2020, 1, 1),
+                    "end_date": datetime.date(2020, 12, 1)}])],)),
+    ("get_event_door_fees", lambda r: (r["save_event"],)),
+    ("get_person_memberships", lambda r: (r["save_person"],)),
+    ("record_door_transaction",
+     lambda r: (r["save_event"], r["save_person"], Decimal("10.00"),
+                [{"membership_id": 1,
+                  "amount": Decimal("20.00"),
+                  "new_end_date": datetime.date(2021, 1, 1)}])),
+    ("remove_door_transaction", lambda r: (r["record_door_transaction"],)),
+    # Again for a person whose attendance was already recorded
+    ("record_attendance", lambda r: (r["save_event"], r["save_person"])),
+    ("record_door_transaction",
+     lambda r: (r["save_event"], r["save_person"], Decimal("10.00"))),
+    ("remove_door_transaction", lambda r: (r["record_door_transaction"],)),
+)
+
+_table_alias_regex = re.compile(
+    r"\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?",
+    re.IGNORECASE,
+)
+_scan_regex = re.compile(r"^SCAN (\w+)")
+# Statements that FTS5 runs on its own shadow tables, which refer to them by
+# quoted schema and table names
+_fts_internal_regex = re.compile(
+    r"'main'\.'\w+_(?:config|data|idx|docsize|content)'"
+)
+_not_aliases = {"on", "where", "inner", "left", "cross", "join", "group",
+                "order", "limit", "using", "natural"}
+
+
+# Map the table names and aliases used in a SQL statement to table names.
+#
+# Args:
+#   sql: The SQL statement.
+#
+# Returns:
+#   A dictionary of names/aliases and the tables they refer to.
+def _table_aliases(sql):
+    aliases = {}
+    for table, alias in _table_alias_regex.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _not_aliases:
+            aliases[alias] = table
+    return aliases
+
+
+def get_table_scans(connection, sql):
+    """
+    Get the tables which a SQL statement would scan rather than search using
+    an index.
+
+    Args:
+        connection: The sqlite3 connection to explain the statement with.
+        sql: The SQL statement, with any parameters already filled in.
+
+    Returns:
+        A set of table names.
+
+    """
+    aliases = _table_aliases(sql)
+    scans = set()
+    for row in connection.execute("explain query plan " + sql):
+        detail = row[-1]
+        if "VIRTUAL TABLE" in detail:
+            continue
+        match = _scan_regex.match(detail)
+        if match:
+            name = match.group(1)
+            scans.add(aliases.get(name, name))
+    return scans
+
+
+def check_query_plans(db):
+    """
+    Call every public method of a Database and check the query plan of every
+    statement that they execute.
+
+    Args:
+        db: The Database object to check. Should be empty, since rows will be
+            inserted into it.
+
+    Returns:
+        A list of problem descriptions as strings. An empty list means that
+        everything passed.
+
+    """
+    problems = []
+    public_methods = {name for name in dir(Database)
+                      if not name.startswith("_")
+                      and callable(getattr(Database, name))}
+    checked_methods = {name for name, _ in METHOD_CALLS}
+    for name in sorted(public_methods - checked_methods - IGNORED_METHODS):
+        problems.append("{}: not covered by the query plan check"
+                        .format(name))
+
+    statements = []
+    # Any connection will do for explaining the statements
+    connection = db._connection
+    db.set_trace_callback(statements.append)
+    results = {}
+    try:
+        for name, get_args in METHOD_CALLS:
+            del statements[:]
+            results[name] = getattr(db, name)(*get_args(results))
+            # Don't capture our own explain statements
+            executed = list(statements)
+            for sql in executed:
+                if not sql.lstrip().lower().startswith(
+                        ("select", "insert", "update", "delete", "with")):
+                    # Includes the begin and rollback statements of reads
+                    continue
+                if _fts_internal_regex.search(sql):
+                    continue
+                scans = get_table_scans(connection, sql)
+                scans -= SMALL_TABLES
+                scans -= EXPECTED_SCANS.get(name, set())
+                for table in sorted(scans):
+                    problems.append("{}: scans {} in statement: {}".format(
+                        name, table, " ".join(sql.split()),
+                    ))
+    finally:
+        db.set_trace_callback(None)
+    return problems
+
+
+def main():
+    """
+    Run the query plan check against a new scratch database and print the
+    results.
+
+    Returns:
+        The exit status as an integer.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = Database(str(pathlib.Path(temp_dir) / "queryplans.rksm"))
+        try:
+            problems = check_query_plans(db)
+        finally:
+            db.close()
+    for problem in problems:
+        print(problem)
+    if problems:
+        print("{} query plan problem(s) found.".format(len(problems)))
+        return 1
+    print("All query plans OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
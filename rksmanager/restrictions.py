@@ -0,0 +1,200 @@
+"""
+In-memory index of people's bans and sanctions, for flagging restricted
+people wherever they're looked up in the GUI without running a query for
+each one. Doesn't import Qt.
+
+"""
+import datetime
+
+# Kinds of restriction, most serious first
+KINDS = ("ban", "sanction")
+
+
+class RestrictionIndex:
+    """
+    Index of the date ranges of people's bans and sanctions. Each person's
+    restrictions are kept together, so checking one person only looks at
+    their own few date ranges. status() also keeps the strongest restriction
+    of every person who is restricted on a given date, so that annotating a
+    row costs a single dictionary lookup. Changing a restriction only updates
+    the person it belongs to.
+
+    Args:
+        rows: Optional iterable of restrictions to index, as returned by
+            Database.get_restrictions().
+
+    """
+    def __init__(self, rows=()):
+        # Each restriction, as a Row object, keyed by (kind, id)
+        self._restrictions = {}
+        # Set of (kind, id) keys for each person
+        self._people = {}
+        # Date that _active was built for, and the strongest restriction of
+        # each person who is restricted on that date. Built when first
+        # needed. See status().
+        self._active_date = None
+        self._active = {}
+        self.update(rows)
+
+    def __len__(self):
+        return len(self._restrictions)
+
+    def update(self, rows, ban_ids=(), sanction_ids=()):
+        """
+        Add restrictions to the index, replacing any that have the same kind
+        and ID, and remove restrictions that are no longer in the database.
+
+        Args:
+            rows: Iterable of restrictions, as returned by
+                Database.get_restrictions().
+            ban_ids: Sequence of the IDs of the bans that rows was fetched
+                for, or None if rows includes every ban. Bans with these IDs
+                that aren't in rows are removed from the index.
+            sanction_ids: Same as ban_ids, for sanctions.
+
+        Returns:
+            A set of the IDs of the people whose restrictions changed.
+
+        """
+        removed = set()
+        for kind, ids in (("ban", ban_ids), ("sanction", sanction_ids)):
+            if ids is None:
+                removed.update(key for key in self._restrictions
+                               if key[0] == kind)
+            else:
+                removed.update((kind, id_) for id_ in ids
+                               if (kind, id_) in self._restrictions)
+        changed_people = set()
+        for key in removed:
+            person_id = self._restrictions.pop(key)["person_id"]
+            self._people[person_id].discard(key)
+            changed_people.add(person_id)
+        for row in rows:
+            key = (row["kind"], row["id"])
+            old_row = self._restrictions.get(key)
+            if old_row is not None:
+                self._people[old_row["person_id"]].discard(key)
+                changed_people.add(old_row["person_id"])
+            self._restrictions[key] = row
+            self._people.setdefault(row["person_id"], set()).add(key)
+            changed_people.add(row["person_id"])
+        for person_id in changed_people:
+            if not self._people.get(person_id, True):
+                del self._people[person_id]
+            if self._active_date is not None:
+                self._update_active(person_id)
+        return changed_people
+
+    def get(self, person_id, date=None):
+        """
+        Get a person's restrictions that are in effect on a given date.
+
+        Args:
+            person_id: The ID of the person.
+            date: Optional date object. Defaults to today.
+
+        Returns:
+            A list of restrictions, as Row objects in the format returned by
+            Database.get_restrictions(), bans first, and the longest lasting
+            first within each kind.
+
+        """
+        if date is None:
+            date = datetime.date.today()
+        active = [self._restrictions[key]
+                  for key in self._people.get(person_id, ())
+                  if _is_active(self._restrictions[key], date)]
+        active.sort(key=_severity)
+        return active
+
+    def status(self, person_id, date=None):
+        """
+        Get the strongest restriction on a person on a given date, such as
+        for flagging them in a list of people. Fast enough to call for every
+        row of a list, since the restrictions in effect on the date are only
+        worked out once.
+
+        Args:
+            person_id: The ID of the person.
+            date: Optional date object. Defaults to today.
+
+        Returns:
+            A Row object in the format returned by
+            Database.get_restrictions(), or None if the person isn't
+            restricted.
+
+        """
+        if date is None:
+            date = datetime.date.today()
+        if date != self._active_date:
+            self._active_date = date
+            self._active = {}
+            for person_id_ in self._people:
+                self._update_active(person_id_)
+        return self._active.get(person_id)
+
+    # Recalculate a person's strongest restriction on the date that the
+    # status() lookup table was built for.
+    #
+    # Args:
+    #   person_id: The ID of the person.
+    def _update_active(self, person_id):
+        active = self.get(person_id, self._active_date)
+        if active:
+            self._active[person_id] = active[0]
+        else:
+            self._active.pop(person_id, None)
+
+
+def describe(restriction):
+    """
+    Describe a restriction in a few words, for showing next to a person's
+    name.
+
+    Args:
+        restriction: A Row object in the format returned by
+            Database.get_restrictions(), or None.
+
+    Returns:
+        A string such as "Banned until 2027-01-31", or an empty string if
+        restriction is None.
+
+    """
+    if restriction is None:
+        return ""
+    description = "Banned" if restriction["kind"] == "ban" else "Sanctioned"
+    if restriction["end_date"] is None:
+        return description + " permanently"
+    return "{} until {}".format(description,
+                                restriction["end_date"].isoformat())
+
+
+# Check whether a restriction is in effect on a date.
+#
+# Args:
+#   restriction: A Row object in the format returned by
+#       Database.get_restrictions().
+#   date: The date.
+#
+# Returns:
+#   True if the restriction is in effect, otherwise False.
+def _is_active(restriction, date):
+    end_date = restriction["end_date"]
+    return (restriction["begin_date"] <= date
+            and (end_date is None or end_date >= date))
+
+
+# Sort key for putting a person's restrictions in order of severity: bans
+# before sanctions, then permanent ones, then the ones that end last.
+#
+# Args:
+#   restriction: A Row object in the format returned by
+#       Database.get_restrictions().
+#
+# Returns:
+#   The sort key.
+def _severity(restriction):
+    end_date = restriction["end_date"]
+    return (KINDS.index(restriction["kind"]),
+            end_date is not None,
+            -(end_date or datetime.date.min).toordinal())